@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -96,18 +97,89 @@ WSGI_APPLICATION = 'hsmis.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# Connection details default to the local development database and can be
+# overridden with DB_NAME, DB_HOST, DB_PORT, DB_USER and DB_PASSWORD.
+# DB_CONN_MODE selects how connections are managed:
+#
+#   persistent  (default) each worker keeps its connection for DB_CONN_MAX_AGE
+#               seconds (default 60, 0 closes it after every request) and
+#               checks it with a cheap query before reusing it, unless
+#               DB_CONN_HEALTH_CHECKS=false.
+#   pool        psycopg's built-in pool (needs psycopg[pool]); each process
+#               holds DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE connections and waits
+#               at most DB_POOL_TIMEOUT seconds for a free one. Connections go
+#               back to the pool after every request.
+#   pgbouncer   for a local pgbouncer in transaction pooling mode; point
+#               DB_HOST/DB_PORT at pgbouncer (usually port 6432). Connections
+#               to pgbouncer are kept like in persistent mode, and server-side
+#               cursors are disabled because they do not survive pgbouncer
+#               moving the session between server connections.
+#
+# Compare the modes with `python manage.py benchmark_connections`.
+
+
+def env_bool(name, default):
+    return os.environ.get(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+DB_CONN_MODE = os.environ.get('DB_CONN_MODE', 'persistent')
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'hsmis11',
-        'HOST': 'localhost',
-        'USER': 'postgres',
-        'PASSWORD': '1234',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'hsmis11'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', '1234'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
 
+if DB_CONN_MODE == 'pool':
+    # Pooled connections are returned to the pool instead of being kept per request
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+elif DB_CONN_MODE == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+elif DB_CONN_MODE != 'persistent':
+    raise ValueError(f"DB_CONN_MODE must be persistent, pool or pgbouncer, not {DB_CONN_MODE!r}")
+
+
+# Cache
+# Local memory by default; set REDIS_URL to share the cache (and its
+# invalidation) between worker processes.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a cached units/minerals/vehicle-types/scales response is kept
+REFERENCE_CACHE_TIMEOUT = 300
+
+# Seconds the user behind a JWT is cached by CachedJWTAuthentication;
+# saving or deleting the user drops the entry immediately
+JWT_USER_CACHE_TIMEOUT = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -156,7 +228,7 @@ REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
     
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'test1.authentication.CachedJWTAuthentication',
     ],
     # 'DEFAULT_PERMISSION_CLASSES': [
     #     'rest_framework.permissions.IsAuthenticated',
@@ -212,6 +212,57 @@ class BalanceAdmin(admin.ModelAdmin):
     search_fields = ['purchase__id']
 
 
+@admin.register(models.BalanceMovement)
+class BalanceMovementAdmin(admin.ModelAdmin):
+    list_display = [
+        'id',
+        'company',
+        'mineral',
+        'delta',
+        'source_model',
+        'source_id',
+        'created_at',
+    ]
+    list_filter = ['source_model']
+    search_fields = ['source_id']
+
+    # The journal is append-only and written only with the balance changes
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(models.DailySummary)
+class DailySummaryAdmin(admin.ModelAdmin):
+    list_display = [
+        'day',
+        'scale',
+        'mineral',
+        'company',
+        'weight_count',
+        'net_weight',
+        'purchase_count',
+        'purchased_amount',
+        'updated_at',
+    ]
+    list_filter = ['day']
+
+    # Maintained by the purchase and weight write paths
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 
 @admin.register(models.Momp)
 class MompAdmin(admin.ModelAdmin):
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class Test1Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'test1'
+
+    def ready(self):
+        from . import authentication, reference_cache
+        reference_cache.connect_signals()
+        authentication.connect_signals()
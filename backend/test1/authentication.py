@@ -0,0 +1,97 @@
+# authentication.py - JWT authentication with the token's user cached between requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_save
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def user_cache_key(user_id):
+    return f'test1:jwt-user-fields:{user_id}'
+
+
+def cached_user_entry(user):
+    """Cache entry of a user: its column values except the password, plus the password fingerprint"""
+    return {
+        'fields': {
+            field.attname: getattr(user, field.attname)
+            for field in user._meta.concrete_fields
+            if field.attname != 'password'
+        },
+        # The value simplejwt puts in the revoke claim, not the hash itself
+        'password_fingerprint': get_md5_hash_password(user.password),
+    }
+
+
+def load_cached_user(entry):
+    """User instance from a cache entry, with the password deferred so save() never writes it"""
+    user_model = get_user_model()
+    names = [field.attname for field in user_model._meta.concrete_fields]
+    values = [entry['fields'].get(name, DEFERRED) for name in names]
+    return user_model.from_db(router.db_for_read(user_model), names, values)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that loads the token's user from the cache.
+
+    The user row is read from the database once per JWT_USER_CACHE_TIMEOUT
+    seconds and cached by id without its password hash; the token's revoke
+    claim is checked against a cached fingerprint of it instead. Saving or
+    deleting the user, or changing it with a queryset update(), drops the
+    entry, so deactivation and password changes apply on the next request.
+    Raw SQL writes bypass this and apply once the entry expires.
+
+    The cached user is rebuilt as a User instance, so views can still assign
+    it to foreign keys, and permission lookups (has_perm) query the database
+    as before.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        key = user_cache_key(user_id)
+        entry = cache.get(key)
+        if entry is None:
+            user = super().get_user(validated_token)
+            cache.set(key, cached_user_entry(user), getattr(settings, 'JWT_USER_CACHE_TIMEOUT', 60))
+            return user
+
+        user = load_cached_user(entry)
+        # Same checks as JWTAuthentication.get_user, against the cached row
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != entry['password_fingerprint']:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+def invalidate_cached_users(user_ids):
+    """Drop the users' cache entries now and again once the transaction commits"""
+    keys = [user_cache_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    # A request reading the old rows before the commit could have cached them again
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_cached_users([instance.pk])
+
+
+def connect_signals():
+    user_model = get_user_model()
+    post_save.connect(invalidate_cached_user, sender=user_model, dispatch_uid='jwt_user_cache_save')
+    post_delete.connect(invalidate_cached_user, sender=user_model, dispatch_uid='jwt_user_cache_delete')
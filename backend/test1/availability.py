@@ -0,0 +1,121 @@
+# availability.py - "can this weight be added?" checks against the balance ledger
+from django.db.models import F, FilteredRelation, Q
+
+from .models import Purchase
+
+
+def to_int(value):
+    """Parse an id or amount from request data, None when missing or invalid"""
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def get_purchase_balances(pairs):
+    """
+    Company and active balance for each (purchase_id, mineral_id) pair.
+
+    Purchase -> company -> balance is resolved in one query: the balance is a
+    LEFT JOIN filtered on the requested minerals, so purchases without a
+    balance still come back (with no amount). Returns
+    {purchase_id: {'company_id', 'mineral_amount', 'balances': {mineral_id: amount}}}.
+    """
+    purchase_ids = {purchase_id for purchase_id, _ in pairs}
+    mineral_ids = {mineral_id for _, mineral_id in pairs}
+    if not purchase_ids:
+        return {}
+
+    rows = Purchase.get_active_objects().filter(pk__in=purchase_ids).annotate(
+        active_balance=FilteredRelation(
+            'company__company_balances',
+            condition=Q(
+                company__company_balances__deleted_at__isnull=True,
+                company__company_balances__mineral_id__in=mineral_ids,
+            ),
+        )
+    ).values(
+        'pk', 'company_id', 'mineral_amount',
+        balance_mineral_id=F('active_balance__mineral_id'),
+        balance_amount=F('active_balance__remaining_mineral_amount'),
+    )
+
+    purchases = {}
+    for row in rows:
+        purchase = purchases.setdefault(row['pk'], {
+            'company_id': row['company_id'],
+            'mineral_amount': row['mineral_amount'],
+            'balances': {},
+        })
+        if row['balance_mineral_id'] is not None:
+            purchase['balances'][row['balance_mineral_id']] = row['balance_amount']
+    return purchases
+
+
+def check_tickets(tickets):
+    """
+    Check a list of {"purchase", "mineral", "mineral_net_weight"} tickets.
+
+    Tickets are checked in order against a running balance, so two tickets
+    drawing on the same company/mineral cannot both pass on the same stock.
+    Returns one result dict per ticket.
+    """
+    parsed = [
+        (to_int(ticket.get('purchase')), to_int(ticket.get('mineral')), to_int(ticket.get('mineral_net_weight', 0)))
+        for ticket in tickets
+    ]
+    purchases = get_purchase_balances(
+        [(purchase_id, mineral_id) for purchase_id, mineral_id, _ in parsed if purchase_id and mineral_id]
+    )
+
+    running = {}
+    results = []
+    for purchase_id, mineral_id, weight_amount in parsed:
+        result = {
+            'purchase': purchase_id,
+            'mineral': mineral_id,
+            'requested_weight': weight_amount,
+        }
+        purchase = purchases.get(purchase_id)
+
+        if not purchase_id or not mineral_id:
+            result['error'] = 'Purchase and mineral are required'
+        elif weight_amount is None:
+            result['error'] = 'mineral_net_weight must be a number'
+        elif purchase is None:
+            result['error'] = 'Purchase not found'
+        elif not purchase['company_id']:
+            result['error'] = 'No company associated with this purchase'
+        elif mineral_id not in purchase['balances']:
+            result['error'] = 'No active balance for this company and mineral'
+
+        if 'error' in result:
+            result['can_add'] = False
+            results.append(result)
+            continue
+
+        key = (purchase['company_id'], mineral_id)
+        current_balance = running.get(key, purchase['balances'].get(mineral_id) or 0)
+        can_add = weight_amount <= current_balance
+        if can_add:
+            running[key] = current_balance - weight_amount
+
+        result.update({
+            'company': purchase['company_id'],
+            'purchase_mineral_amount': purchase['mineral_amount'],
+            'current_balance': current_balance,
+            'can_add': can_add,
+            'remaining_after': current_balance - weight_amount if can_add else current_balance,
+        })
+        results.append(result)
+
+    return results
+
+
+def check_ticket(purchase_id, mineral_id, weight_amount):
+    """Single-ticket form of check_tickets"""
+    return check_tickets([{
+        'purchase': purchase_id,
+        'mineral': mineral_id,
+        'mineral_net_weight': weight_amount,
+    }])[0]
@@ -0,0 +1,251 @@
+# balances.py - set-based balance maintenance
+import time
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import Balance, BalanceMovement, Company, Mineral, Purchase, Weight
+
+
+def get_purchase_totals():
+    """Sum active purchase amounts per (company, mineral) in one grouped query"""
+    rows = Purchase.get_active_objects().filter(
+        company__isnull=False,
+        mineral__isnull=False,
+        company__deleted_at__isnull=True,
+        mineral__deleted_at__isnull=True,
+    ).values('company_id', 'mineral_id').annotate(
+        total=Sum('mineral_amount')
+    ).order_by()
+
+    return {(row['company_id'], row['mineral_id']): row['total'] or 0 for row in rows}
+
+
+def get_weight_totals():
+    """Sum active weight net amounts per (company, mineral) in one grouped query"""
+    rows = Weight.get_active_objects().filter(
+        purchase__company__isnull=False,
+        mineral__isnull=False,
+        purchase__company__deleted_at__isnull=True,
+        mineral__deleted_at__isnull=True,
+    ).values(
+        'mineral_id', company_id=F('purchase__company_id')
+    ).annotate(
+        total=Sum('mineral_net_weight')
+    ).order_by()
+
+    return {(row['company_id'], row['mineral_id']): row['total'] or 0 for row in rows}
+
+
+def recalculate_balances(batch_size=1000, dry_run=False):
+    """
+    Rebuild every (company, mineral) balance from active purchases and weights.
+
+    Totals come from two grouped aggregates and are written back with a single
+    bulk upsert on the company/mineral unique key, so the number of queries does
+    not depend on how many companies or minerals exist. Active balances with no
+    transactions left are set to zero rather than deleted, so later purchases
+    for the pair update the same row. Returns timing and row count statistics.
+    """
+    started = time.perf_counter()
+
+    purchase_totals = get_purchase_totals()
+    weight_totals = get_weight_totals()
+    aggregated_at = time.perf_counter()
+
+    # amount and whether the row is active, for every existing balance
+    current = {
+        (company_id, mineral_id): (amount, deleted_at is None)
+        for company_id, mineral_id, amount, deleted_at in Balance.objects.values_list(
+            'company_id', 'mineral_id', 'remaining_mineral_amount', 'deleted_at'
+        )
+    }
+    emptied = {pair for pair, (_, active) in current.items() if active} - set(purchase_totals) - set(weight_totals)
+    pairs = set(purchase_totals) | set(weight_totals) | emptied
+    company_types = dict(
+        Company.objects.filter(
+            id__in={company_id for company_id, _ in pairs}
+        ).values_list('id', 'company_type')
+    )
+
+    today = timezone.now().date()
+    balances = [
+        Balance(
+            company_id=company_id,
+            mineral_id=mineral_id,
+            remaining_mineral_amount=purchase_totals.get((company_id, mineral_id), 0)
+            - weight_totals.get((company_id, mineral_id), 0),
+            company_type=company_types.get(company_id) or '',
+            count_90days=90,
+            update_at=today,
+        )
+        for company_id, mineral_id in sorted(pairs)
+    ]
+
+    # Journal the correction of every balance the rebuild changes
+    previous = {pair: amount for pair, (amount, _) in current.items()}
+    movements = [
+        BalanceMovement(
+            company_id=balance.company_id,
+            mineral_id=balance.mineral_id,
+            delta=balance.remaining_mineral_amount - previous.get((balance.company_id, balance.mineral_id), 0),
+            source_model='recalculate',
+        )
+        for balance in balances
+        if balance.remaining_mineral_amount != previous.get((balance.company_id, balance.mineral_id), 0)
+    ]
+
+    stats = {
+        'purchase_groups': len(purchase_totals),
+        'weight_groups': len(weight_totals),
+        'balances_written': len(balances),
+        'balances_zeroed': len(emptied),
+        'balances_corrected': len(movements),
+        'purchases_flagged': 0,
+        'weights_flagged': 0,
+        'dry_run': dry_run,
+    }
+
+    if not dry_run:
+        with transaction.atomic():
+            Balance.objects.bulk_create(
+                balances,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['company', 'mineral'],
+                update_fields=[
+                    'remaining_mineral_amount',
+                    'company_type',
+                    'count_90days',
+                    'update_at',
+                    'deleted_at',
+                ],
+            )
+            BalanceMovement.objects.bulk_create(movements, batch_size=batch_size)
+
+            stats['purchases_flagged'] = Purchase.get_active_objects().filter(
+                company__isnull=False,
+                mineral__isnull=False,
+                company__deleted_at__isnull=True,
+                mineral__deleted_at__isnull=True,
+            ).update(balance_updated=True)
+
+            stats['weights_flagged'] = Weight.get_active_objects().filter(
+                purchase__company__isnull=False,
+                mineral__isnull=False,
+                purchase__company__deleted_at__isnull=True,
+                mineral__deleted_at__isnull=True,
+            ).update(balance_updated=True)
+
+    finished = time.perf_counter()
+    stats['aggregate_ms'] = round((aggregated_at - started) * 1000, 2)
+    stats['write_ms'] = round((finished - aggregated_at) * 1000, 2)
+    stats['total_ms'] = round((finished - started) * 1000, 2)
+
+    return stats
+
+
+def current_balance_subquery(company_ref='company', mineral_ref='mineral'):
+    """
+    Correlated subquery returning the active balance for each row's company/mineral.
+
+    Annotating a list queryset with this resolves every row's balance inside the
+    page query itself instead of one lookup per serialized object.
+    """
+    return Subquery(
+        Balance.objects.filter(
+            company=OuterRef(company_ref),
+            mineral=OuterRef(mineral_ref),
+            deleted_at__isnull=True,
+        ).values('remaining_mineral_amount')[:1]
+    )
+
+
+def get_mineral_totals(company_id=None, scale_id=None, date_from=None, date_to=None):
+    """
+    Purchased, weighed and remaining amounts for every active mineral.
+
+    Each source table is aggregated once, grouped by mineral. Date filters
+    apply to purchase and weight create_at; the remaining balance is always
+    the current one, narrowed only by company.
+    """
+    purchases = Purchase.get_active_objects().filter(mineral__isnull=False)
+    weights = Weight.get_active_objects().filter(mineral__isnull=False)
+    balances = Balance.get_active_objects()
+
+    if company_id:
+        purchases = purchases.filter(company_id=company_id)
+        weights = weights.filter(purchase__company_id=company_id)
+        balances = balances.filter(company_id=company_id)
+    if scale_id:
+        purchases = purchases.filter(scale_id=scale_id)
+        weights = weights.filter(scale_id=scale_id)
+    if date_from:
+        purchases = purchases.filter(create_at__gte=date_from)
+        weights = weights.filter(create_at__gte=date_from)
+    if date_to:
+        purchases = purchases.filter(create_at__lte=date_to)
+        weights = weights.filter(create_at__lte=date_to)
+
+    purchase_rows = {
+        row['mineral_id']: row
+        for row in purchases.values('mineral_id').annotate(
+            purchased_amount=Sum('mineral_amount'),
+            purchased_total_price=Sum('mineral_total_price'),
+            avg_unit_price=Avg('unit_price'),
+            purchase_count=Count('id'),
+            company_count=Count('company', distinct=True),
+            latest_purchase_date=Max('create_at'),
+        ).order_by()
+    }
+    weight_rows = {
+        row['mineral_id']: row
+        for row in weights.values('mineral_id').annotate(
+            weighed_net_weight=Sum('mineral_net_weight'),
+            weighed_second_weight=Sum('second_weight'),
+            weight_count=Count('id'),
+            vehicle_count=Count('vehicle', distinct=True),
+            scale_count=Count('scale', distinct=True),
+            latest_weight_date=Max('create_at'),
+        ).order_by()
+    }
+    balance_rows = {
+        row['mineral_id']: row
+        for row in balances.values('mineral_id').annotate(
+            remaining_balance=Sum('remaining_mineral_amount'),
+            balance_count=Count('id'),
+            positive_balances=Count('id', filter=Q(remaining_mineral_amount__gt=0)),
+            zero_balances=Count('id', filter=Q(remaining_mineral_amount=0)),
+            negative_balances=Count('id', filter=Q(remaining_mineral_amount__lt=0)),
+        ).order_by()
+    }
+
+    totals = []
+    for mineral_id, name in Mineral.get_active_objects().order_by('name', 'id').values_list('id', 'name'):
+        purchase_row = purchase_rows.get(mineral_id, {})
+        weight_row = weight_rows.get(mineral_id, {})
+        balance_row = balance_rows.get(mineral_id, {})
+        totals.append({
+            'mineral_id': mineral_id,
+            'mineral_name': name,
+            'purchased_amount': purchase_row.get('purchased_amount') or 0,
+            'purchased_total_price': purchase_row.get('purchased_total_price') or 0,
+            'avg_unit_price': round(purchase_row.get('avg_unit_price') or 0, 2),
+            'purchase_count': purchase_row.get('purchase_count', 0),
+            'company_count': purchase_row.get('company_count', 0),
+            'latest_purchase_date': purchase_row.get('latest_purchase_date'),
+            'weighed_net_weight': weight_row.get('weighed_net_weight') or 0,
+            'weighed_second_weight': weight_row.get('weighed_second_weight') or 0,
+            'weight_count': weight_row.get('weight_count', 0),
+            'vehicle_count': weight_row.get('vehicle_count', 0),
+            'scale_count': weight_row.get('scale_count', 0),
+            'latest_weight_date': weight_row.get('latest_weight_date'),
+            'remaining_balance': balance_row.get('remaining_balance') or 0,
+            'balance_count': balance_row.get('balance_count', 0),
+            'positive_balances': balance_row.get('positive_balances', 0),
+            'zero_balances': balance_row.get('zero_balances', 0),
+            'negative_balances': balance_row.get('negative_balances', 0),
+        })
+
+    return totals
@@ -0,0 +1,419 @@
+# bulk.py - batch ingestion that bypasses the per-record save() paths
+import csv
+import io
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+from rest_framework.exceptions import ValidationError
+
+from .models import Balance, BalanceMovement, Company, DailySummary, Maktoob, Mineral, Purchase, Scale, Unit, Vehicle, Weight
+from .serializers import PurchaseImportRowSerializer, WeightTicketSerializer
+
+WEIGHT_RELATED_MODELS = {
+    'purchase': Purchase,
+    'mineral': Mineral,
+    'vehicle': Vehicle,
+    'scale': Scale,
+    'unit': Unit,
+}
+
+
+# Field construction is the expensive part of a ModelSerializer, so one
+# instance of each is built once and reused to validate every row
+WEIGHT_TICKET_SERIALIZER = WeightTicketSerializer()
+PURCHASE_IMPORT_SERIALIZER = PurchaseImportRowSerializer()
+
+
+def validate_row(serializer, row):
+    """Validate one row with a shared serializer, returning (data, errors)"""
+    try:
+        return serializer.run_validation(row), None
+    except ValidationError as e:
+        return None, e.detail
+
+
+def load_related_ids(rows, related_models):
+    """Fetch the active ids for every foreign key column of the batch, one query per model"""
+    existing = {}
+    for field, model in related_models.items():
+        ids = {row[field] for row in rows if row.get(field)}
+        existing[field] = set(
+            model.get_active_objects().filter(pk__in=ids).values_list('pk', flat=True)
+        ) if ids else set()
+    return existing
+
+
+def lock_balances(keys):
+    """Load and lock the active balances for a set of (company_id, mineral_id) keys"""
+    if not keys:
+        return {}
+
+    rows = Balance.objects.select_for_update().filter(
+        company_id__in={company_id for company_id, _ in keys},
+        mineral_id__in={mineral_id for _, mineral_id in keys},
+        deleted_at__isnull=True,
+    ).values_list('company_id', 'mineral_id', 'remaining_mineral_amount')
+
+    return {
+        (company_id, mineral_id): amount
+        for company_id, mineral_id, amount in rows
+        if (company_id, mineral_id) in keys
+    }
+
+
+def apply_balance_deltas(deltas, movements):
+    """
+    Apply one summed delta per (company_id, mineral_id) key.
+
+    movements are the per-record BalanceMovement rows behind those sums and
+    are journaled with a single bulk insert.
+    """
+    BalanceMovement.objects.bulk_create(movements)
+    for (company_id, mineral_id), delta in deltas.items():
+        if delta:
+            Balance.apply_delta(company_id, mineral_id, delta, journal=False)
+
+
+def balance_movement(company_id, mineral_id, delta, source):
+    return BalanceMovement(**BalanceMovement.describe(company_id, mineral_id, delta, source))
+
+
+def bulk_insert(model, pending, atomic):
+    """
+    Insert (index, instance) pairs with bulk_create.
+
+    In partial mode a failing batch is retried row by row, each row in its own
+    savepoint, so one bad row does not discard the others. Returns the inserted
+    pairs and a {index: message} dict of rows that failed.
+    """
+    instances = [instance for _, instance in pending]
+
+    if atomic:
+        model.objects.bulk_create(instances)
+        return pending, {}
+
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create(instances)
+        return pending, {}
+    except DatabaseError:
+        inserted, failed = [], {}
+        for index, instance in pending:
+            instance.pk = None
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create([instance])
+                inserted.append((index, instance))
+            except DatabaseError as e:
+                failed[index] = str(e)
+        return inserted, failed
+
+
+def row_error(index, errors):
+    return {'index': index, 'status': 'error', 'errors': errors}
+
+
+def ingest_weight_tickets(tickets, user=None, atomic=True):
+    """
+    Validate and insert a batch of weighbridge tickets.
+
+    Tickets are field-validated individually, their foreign keys are resolved
+    with one query per related model, and balances are checked against locked
+    balance rows in memory, in ticket order. Valid tickets are inserted with
+    bulk_create and every (company, mineral) balance is then moved once by the
+    summed net weight, and the daily summaries by one grouped aggregate.
+    With atomic=True any invalid ticket rejects the whole batch; otherwise
+    valid tickets are kept and invalid ones reported.
+    """
+    started = time.perf_counter()
+    results = [None] * len(tickets)
+    rows = []
+
+    for index, ticket in enumerate(tickets):
+        data, errors = validate_row(WEIGHT_TICKET_SERIALIZER, ticket)
+        if errors:
+            results[index] = row_error(index, errors)
+        else:
+            rows.append((index, data))
+
+    with transaction.atomic():
+        existing = load_related_ids([data for _, data in rows], WEIGHT_RELATED_MODELS)
+        purchase_companies = dict(
+            Purchase.objects.filter(pk__in=existing['purchase']).values_list('pk', 'company_id')
+        )
+
+        keys = {
+            (purchase_companies.get(data.get('purchase')), data.get('mineral'))
+            for _, data in rows
+        }
+        available = lock_balances({key for key in keys if key[0] and key[1]})
+        taken_bill_numbers = Weight.get_existing_bill_numbers(data.get('bill_number') for _, data in rows)
+
+        pending = []
+        for index, data in rows:
+            errors = {}
+            for field in WEIGHT_RELATED_MODELS:
+                value = data.get(field)
+                if value and value not in existing[field]:
+                    errors[field] = [f'Invalid pk "{value}" - object does not exist.']
+
+            # Same rule as WeightSerializer.validate_bill_number, including earlier tickets of the batch
+            bill_number = data.get('bill_number')
+            if bill_number in taken_bill_numbers:
+                errors['bill_number'] = [f'A weight with bill number {bill_number} already exists.']
+
+            purchase_id = data.get('purchase')
+            mineral_id = data.get('mineral')
+            net_weight = data.get('mineral_net_weight') or 0
+            key = (purchase_companies.get(purchase_id), mineral_id)
+
+            # Same rule as WeightSerializer.validate, against the running balance
+            if not errors and purchase_id and mineral_id and net_weight > 0:
+                current_balance = available.get(key, 0)
+                if net_weight > current_balance:
+                    errors['mineral_net_weight'] = [
+                        f'Insufficient mineral balance. Available: {current_balance}, Required: {net_weight}'
+                    ]
+
+            if errors:
+                results[index] = row_error(index, errors)
+                continue
+
+            counts_towards_balance = bool(key[0] and mineral_id and net_weight)
+            if counts_towards_balance:
+                available[key] = available.get(key, 0) - net_weight
+
+            weight = Weight(
+                **{field: value for field, value in data.items() if field not in WEIGHT_RELATED_MODELS},
+                **{f'{field}_id': data.get(field) for field in WEIGHT_RELATED_MODELS},
+                user=user,
+                balance_updated=counts_towards_balance,
+            )
+            pending.append((index, weight))
+            if bill_number:
+                taken_bill_numbers.add(bill_number)
+
+        error_count = sum(1 for result in results if result is not None)
+        if atomic and error_count:
+            inserted = []
+        else:
+            inserted, failed = bulk_insert(Weight, pending, atomic)
+            for index, message in failed.items():
+                results[index] = row_error(index, {'non_field_errors': [message]})
+
+            deltas = defaultdict(int)
+            movements = []
+            for _, weight in inserted:
+                if weight.balance_updated:
+                    key = (purchase_companies[weight.purchase_id], weight.mineral_id)
+                    deltas[key] -= weight.mineral_net_weight
+                    movements.append(balance_movement(*key, -weight.mineral_net_weight, weight))
+            apply_balance_deltas(deltas, movements)
+            DailySummary.apply(Weight.objects.filter(pk__in=[weight.pk for _, weight in inserted]))
+
+    for index, weight in inserted:
+        results[index] = {'index': index, 'status': 'created', 'id': weight.pk}
+
+    if atomic and error_count:
+        for index, weight in pending:
+            results[index] = {'index': index, 'status': 'skipped'}
+
+    return {
+        'results': results,
+        'created_count': len(inserted),
+        'error_count': sum(1 for result in results if result['status'] == 'error'),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def read_spreadsheet_rows(file, filename):
+    """Yield one dict per data row of a CSV or XLSX upload, keyed by the header row"""
+    if filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError('openpyxl is required to import .xlsx files')
+
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+            for values in rows:
+                if any(value not in (None, '') for value in values):
+                    yield dict(zip(header, values))
+        finally:
+            workbook.close()
+        return
+
+    if filename.lower().endswith('.csv'):
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        for row in csv.DictReader(text):
+            # Empty cells mean "no value", as they do in spreadsheets
+            yield {key.strip(): (value if value != '' else None) for key, value in row.items() if key}
+        return
+
+    raise ValueError('Only .csv and .xlsx files can be imported')
+
+
+class PurchaseImportLookups:
+    """
+    Name/number -> id lookups for purchase import rows.
+
+    Minerals, scales and units are small and loaded once. Companies and
+    maktoobs are loaded per chunk for the keys that chunk introduces, so each
+    distinct TIN or maktoob number costs at most one query for the whole file.
+    """
+
+    def __init__(self):
+        self.minerals = self.load_named(Mineral, 'name')
+        self.scales = self.load_named(Scale, 'name')
+        self.units = self.load_named(Unit, 'name')
+        self.companies = {}
+        self.maktoobs = {}
+
+    def load_named(self, model, name_field):
+        lookup = {}
+        for pk, name in model.get_active_objects().values_list('pk', name_field):
+            lookup[str(pk)] = pk
+            lookup.setdefault(str(name).strip().lower(), pk)
+        return lookup
+
+    def preload(self, rows):
+        tins = {row['TIN_number'] for row in rows} - set(self.companies)
+        if tins:
+            self.companies.update({tin: None for tin in tins})
+            self.companies.update(
+                Company.get_active_objects().filter(TIN_number__in=tins).values_list('TIN_number', 'pk')
+            )
+
+        numbers = {row['maktoob_number'] for row in rows if row.get('maktoob_number') is not None} - set(self.maktoobs)
+        if numbers:
+            self.maktoobs.update({number: None for number in numbers})
+            # First active maktoob wins when numbers repeat
+            for number, pk in Maktoob.get_active_objects().filter(
+                maktoob_number__in=numbers
+            ).order_by('-pk').values_list('maktoob_number', 'pk'):
+                self.maktoobs[number] = pk
+
+    def find(self, lookup, value):
+        if value in (None, ''):
+            return None
+        return lookup.get(str(value).strip().lower())
+
+
+def import_purchases(rows, user=None, chunk_size=1000, atomic=True, max_errors=100):
+    """
+    Import purchase rows (dicts from read_spreadsheet_rows) in chunks.
+
+    Each chunk is validated, resolved through PurchaseImportLookups and written
+    with one bulk_create. Balances are credited once per (company, mineral)
+    after all chunks are written. With atomic=True any invalid row rolls back
+    the whole import; otherwise invalid rows are skipped, and a chunk the
+    database rejects is retried row by row through bulk_insert. Only the
+    first max_errors row errors are returned.
+    """
+    started = time.perf_counter()
+    lookups = PurchaseImportLookups()
+    deltas = defaultdict(int)
+    errors = []
+    stats = {'rows': 0, 'created_count': 0, 'error_count': 0}
+
+    rows = iter(rows)
+    row_number = 1  # header row
+
+    with transaction.atomic():
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            valid = []
+            for row in chunk:
+                row_number += 1
+                data, row_errors = validate_row(PURCHASE_IMPORT_SERIALIZER, row)
+                if row_errors:
+                    errors.append({'row': row_number, 'errors': row_errors})
+                else:
+                    valid.append((row_number, data))
+
+            lookups.preload([data for _, data in valid])
+
+            pending = []
+            for number, data in valid:
+                company_id = lookups.companies.get(data['TIN_number'])
+                mineral_id = lookups.find(lookups.minerals, data['mineral'])
+                maktoob_number = data.get('maktoob_number')
+                maktoob_id = lookups.maktoobs.get(maktoob_number) if maktoob_number is not None else None
+                scale_id = lookups.find(lookups.scales, data.get('scale'))
+                unit_id = lookups.find(lookups.units, data.get('unit'))
+
+                row_errors = {}
+                if company_id is None:
+                    row_errors['TIN_number'] = [f'No active company with TIN number "{data["TIN_number"]}"']
+                if mineral_id is None:
+                    row_errors['mineral'] = [f'Unknown mineral "{data["mineral"]}"']
+                if maktoob_number is not None and maktoob_id is None:
+                    row_errors['maktoob_number'] = [f'Unknown maktoob number "{maktoob_number}"']
+                if data.get('scale') and scale_id is None:
+                    row_errors['scale'] = [f'Unknown scale "{data["scale"]}"']
+                if data.get('unit') and unit_id is None:
+                    row_errors['unit'] = [f'Unknown unit "{data["unit"]}"']
+
+                if row_errors:
+                    errors.append({'row': number, 'errors': row_errors})
+                    continue
+
+                amount = data['mineral_amount']
+                pending.append((number, Purchase(
+                    area=data['area'],
+                    mineral_amount=amount,
+                    unit_price=data['unit_price'],
+                    mineral_total_price=data['mineral_total_price'],
+                    royalty_receipt_number=data['royalty_receipt_number'],
+                    weighing_total_price=data['weighing_total_price'],
+                    haq_wazan_receipt_number=data['haq_wazan_receipt_number'],
+                    company_id=company_id,
+                    mineral_id=mineral_id,
+                    maktoob_id=maktoob_id,
+                    scale_id=scale_id,
+                    unit_id=unit_id,
+                    user=user,
+                    balance_updated=bool(amount),
+                )))
+
+            stats['rows'] += len(chunk)
+            if atomic and errors:
+                stats['error_count'] = len(errors)
+                continue
+
+            inserted, failed = bulk_insert(Purchase, pending, atomic)
+            for number, message in failed.items():
+                errors.append({'row': number, 'errors': {'non_field_errors': [message]}})
+            stats['error_count'] = len(errors)
+
+            purchases = [purchase for _, purchase in inserted]
+            for purchase in purchases:
+                if purchase.balance_updated:
+                    deltas[(purchase.company_id, purchase.mineral_id)] += purchase.mineral_amount
+            DailySummary.apply(Purchase.objects.filter(pk__in=[purchase.pk for purchase in purchases]))
+            BalanceMovement.objects.bulk_create([
+                balance_movement(purchase.company_id, purchase.mineral_id, purchase.mineral_amount, purchase)
+                for purchase in purchases
+                if purchase.balance_updated
+            ])
+            stats['created_count'] += len(purchases)
+
+        if atomic and errors:
+            transaction.set_rollback(True)
+            stats['created_count'] = 0
+        else:
+            # Movements were journaled chunk by chunk above
+            apply_balance_deltas(deltas, [])
+            stats['balances_credited'] = len(deltas)
+
+    stats['errors'] = errors[:max_errors]
+    stats['atomic'] = atomic
+    stats['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return stats
@@ -0,0 +1,200 @@
+# checkpoints.py - point-in-time balances from the movement journal and daily checkpoints
+import datetime
+import time
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import BalanceCheckpoint, BalanceMovement
+
+
+def day_end(day):
+    """Start of the day after day in the current time zone, the bound of 'at the end of day'"""
+    return timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+
+
+def get_movements(company_id=None, mineral_id=None):
+    """Journaled movements, optionally of one company and/or mineral"""
+    movements = BalanceMovement.objects.all()
+    if company_id:
+        movements = movements.filter(company_id=company_id)
+    if mineral_id:
+        movements = movements.filter(mineral_id=mineral_id)
+    return movements
+
+
+def get_range_totals(lower, upper, company_id=None, mineral_id=None):
+    """
+    Sum of the movement deltas per (company_id, mineral_id) recorded after the
+    end of day lower and up to the end of day upper.
+
+    lower=None means from the first movement. One grouped aggregate over a
+    created_at range.
+    """
+    movements = get_movements(company_id, mineral_id).filter(created_at__lt=day_end(upper))
+    if lower is not None:
+        movements = movements.filter(created_at__gte=day_end(lower))
+
+    return {
+        (company_id, mineral_id): total or 0
+        for company_id, mineral_id, total in movements.values_list(
+            'company_id', 'mineral_id'
+        ).annotate(total=Sum('delta')).order_by()
+    }
+
+
+def get_latest_checkpoints(day, company_id=None, mineral_id=None):
+    """Checkpoints of the newest checkpoint day on or before day, keyed by (company_id, mineral_id)"""
+    checkpoints = BalanceCheckpoint.objects.filter(day__lte=day)
+    horizon = checkpoints.aggregate(day=Max('day'))['day']
+    if horizon is None:
+        return None, {}
+
+    checkpoints = checkpoints.filter(day=horizon)
+    if company_id:
+        checkpoints = checkpoints.filter(company_id=company_id)
+    if mineral_id:
+        checkpoints = checkpoints.filter(mineral_id=mineral_id)
+
+    return horizon, {
+        (company_id, mineral_id): amount
+        for company_id, mineral_id, amount in checkpoints.values_list('company_id', 'mineral_id', 'amount')
+    }
+
+
+def get_balances_as_of(day, company_id=None, mineral_id=None):
+    """
+    Company-mineral balances at the end of day, as the movement journal recorded them.
+
+    Starts from the newest checkpoint day on or before day and adds the
+    movements recorded after it with one grouped range aggregate.
+    Checkpoints are written for every pair at once, so a pair without a
+    checkpoint on that day had no movements up to it. Without checkpoints
+    the whole journal up to day is aggregated. Returns
+    {(company_id, mineral_id): {...}}.
+    """
+    horizon, totals = get_latest_checkpoints(day, company_id, mineral_id)
+
+    if horizon is None or horizon < day:
+        for key, total in get_range_totals(horizon, day, company_id, mineral_id).items():
+            totals[key] = totals.get(key, 0) + total
+
+    return {
+        key: {
+            'company_id': key[0],
+            'mineral_id': key[1],
+            'as_of': day,
+            'balance': amount,
+            'checkpoint_day': horizon,
+        }
+        for key, amount in sorted(totals.items())
+    }
+
+
+def get_balance_as_of(company_id, mineral_id, day):
+    """Single company-mineral form of get_balances_as_of"""
+    return get_balances_as_of(day, company_id, mineral_id).get((company_id, mineral_id), {
+        'company_id': company_id,
+        'mineral_id': mineral_id,
+        'as_of': day,
+        'balance': 0,
+        'checkpoint_day': None,
+    })
+
+
+def get_period_balances(date_from, date_to, company_id=None, mineral_id=None):
+    """
+    Opening, change and closing balance of every pair with movements from the
+    start of date_from to the end of date_to.
+
+    date_from=None starts at the first movement. The change is one grouped
+    range aggregate and the closing balance comes from get_balances_as_of;
+    the opening balance is their difference. Returns
+    {(company_id, mineral_id): {...}}.
+    """
+    lower = date_from - datetime.timedelta(days=1) if date_from else None
+    changes = get_range_totals(lower, date_to, company_id, mineral_id)
+    closing = get_balances_as_of(date_to, company_id, mineral_id)
+
+    return {
+        key: {
+            'opening_balance': closing[key]['balance'] - change,
+            'period_change': change,
+            'closing_balance': closing[key]['balance'],
+        }
+        for key, change in changes.items()
+    }
+
+
+def get_balance_series(company_id, mineral_id, date_from, date_to):
+    """
+    Daily closing balance of a company-mineral pair from date_from to date_to.
+
+    The opening balance comes from get_balance_as_of; the movements in the
+    range are summed per day in one grouped aggregate, split into credits
+    and debits, and the running balance is accumulated over the days in order.
+    """
+    opening = get_balance_as_of(company_id, mineral_id, date_from - datetime.timedelta(days=1))['balance']
+
+    zero = Value(0, output_field=IntegerField())
+    daily = get_movements(company_id, mineral_id).filter(
+        created_at__gte=day_end(date_from - datetime.timedelta(days=1)),
+        created_at__lt=day_end(date_to),
+    ).annotate(day=TruncDate('created_at')).values('day').annotate(
+        credited=Sum(Case(When(delta__gt=0, then='delta'), default=zero)),
+        debited=Sum(Case(When(delta__lt=0, then='delta'), default=zero)),
+    ).values_list('day', 'credited', 'debited').order_by()
+    movements = {day: (credited or 0, -(debited or 0)) for day, credited, debited in daily}
+
+    series = []
+    balance = opening
+    day = date_from
+    while day <= date_to:
+        credited, debited = movements.get(day, (0, 0))
+        balance += credited - debited
+        series.append({'date': day, 'credited': credited, 'debited': debited, 'balance': balance})
+        day += datetime.timedelta(days=1)
+
+    return {'opening_balance': opening, 'closing_balance': balance, 'days': series}
+
+
+def build_checkpoints(day=None):
+    """
+    Write a checkpoint for every company-mineral pair at the end of day.
+
+    Defaults to yesterday; today is still changing and is never checkpointed.
+    Amounts are computed incrementally from the previous checkpoints and
+    upserted on the (company, mineral, day) key. Returns statistics.
+    """
+    started = time.perf_counter()
+    today = timezone.localdate()
+    day = day or today - datetime.timedelta(days=1)
+    if day >= today:
+        raise ValueError('Checkpoints can only be built for days before today')
+
+    balances = get_balances_as_of(day)
+    with transaction.atomic():
+        BalanceCheckpoint.objects.bulk_create(
+            [
+                BalanceCheckpoint(
+                    company_id=row['company_id'],
+                    mineral_id=row['mineral_id'],
+                    day=day,
+                    amount=row['balance'],
+                )
+                for row in balances.values()
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['company', 'mineral', 'day'],
+            update_fields=['amount'],
+        )
+
+    return {
+        'day': day,
+        'checkpoints_written': len(balances),
+        'latest_checkpoint_day': BalanceCheckpoint.objects.aggregate(day=Max('day'))['day'],
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -0,0 +1,85 @@
+# deleted_counts.py - recycle bin counters
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Value
+
+CACHE_KEY = 'test1:deleted_counts'
+CACHE_KEY_WITH_ACTIVE = 'test1:deleted_counts:active'
+
+
+def get_count_models():
+    """Soft-deletable models shown in the recycle bin, in display order"""
+    from .models import Company, Vehicle, Maktoob, Purchase, Unit, Mineral, VehicleType, Scale, Weight, Balance, Momp
+
+    return [
+        ('companies', 'Company', Company),
+        ('vehicles', 'Vehicle', Vehicle),
+        ('maktoobs', 'Maktoob', Maktoob),
+        ('purchases', 'Purchase', Purchase),
+        ('units', 'Unit', Unit),
+        ('minerals', 'Mineral', Mineral),
+        ('vehicle_types', 'Vehicle Type', VehicleType),
+        ('scales', 'Scale', Scale),
+        ('weights', 'Weight', Weight),
+        ('balances', 'Balance', Balance),
+        ('momps', 'MOMP', Momp),
+    ]
+
+
+def count_all(include_active=False):
+    """
+    Count deleted (and optionally active) rows of every model in one round-trip.
+
+    Each model contributes one aggregate SELECT and the SELECTs are combined
+    with UNION ALL. Deleted-only counts filter on deleted_at so each branch can
+    be answered from the deleted_at index.
+    """
+    models = get_count_models()
+    querysets = []
+
+    for key, _, model in models:
+        queryset = model.objects.order_by().annotate(model_key=Value(key))
+        if include_active:
+            queryset = queryset.values('model_key').annotate(
+                deleted=Count('pk', filter=Q(deleted_at__isnull=False)),
+                active=Count('pk', filter=Q(deleted_at__isnull=True)),
+            )
+        else:
+            queryset = queryset.filter(deleted_at__isnull=False).values('model_key').annotate(
+                deleted=Count('pk'),
+                active=Value(0),
+            )
+        querysets.append(queryset.values_list('model_key', 'deleted', 'active'))
+
+    rows = querysets[0].union(*querysets[1:], all=True)
+    totals = {model_key: (deleted, active) for model_key, deleted, active in rows}
+
+    counts = {}
+    for key, model_name, _ in models:
+        deleted, active = totals.get(key, (0, 0))
+        counts[key] = {
+            'count': deleted or 0,
+            'model_name': model_name,
+        }
+        if include_active:
+            counts[key]['active_count'] = active or 0
+
+    return counts
+
+
+def get_deleted_counts(include_active=False):
+    """Cached wrapper around count_all, invalidated by soft delete and restore"""
+    cache_key = CACHE_KEY_WITH_ACTIVE if include_active else CACHE_KEY
+    counts = cache.get(cache_key)
+
+    if counts is None:
+        counts = count_all(include_active=include_active)
+        cache.set(cache_key, counts, getattr(settings, 'DELETED_COUNTS_CACHE_TIMEOUT', 30))
+
+    return counts
+
+
+def invalidate_deleted_counts():
+    """Drop cached counts once the current transaction (if any) commits"""
+    transaction.on_commit(lambda: cache.delete_many([CACHE_KEY, CACHE_KEY_WITH_ACTIVE]))
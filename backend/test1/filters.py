@@ -0,0 +1,68 @@
+# filters.py - query parameter filtering for the list endpoints
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+def resolve_field(model, path):
+    """Return the model field at the end of a `__` separated lookup path"""
+    field = None
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        model = field.related_model
+    return field
+
+
+class FieldFilterBackend(BaseFilterBackend):
+    """
+    Declarative equality and date range filtering.
+
+    Views list the query parameters they accept:
+
+        filter_fields = {'mineral': 'mineral', 'company': 'purchase__company'}
+        date_filter_field = 'create_at'
+
+    Each parameter maps to a lookup path and is converted with that model
+    field's to_python(), so ?mineral=3 filters on the mineral_id column and
+    ?status=x is rejected with a 400 instead of matching nothing. The date
+    field adds ?date_from= / ?date_to= (inclusive). Every declared path
+    must start with the leading column of an active_index() on the model
+    (for a joined path, the foreign key it joins through), which the tests
+    check for each view.
+    """
+    date_from_param = 'date_from'
+    date_to_param = 'date_to'
+
+    def get_lookups(self, request, model, view):
+        params = request.query_params
+        specs = [(param, path, '') for param, path in getattr(view, 'filter_fields', {}).items()]
+
+        date_field = getattr(view, 'date_filter_field', None)
+        if date_field:
+            specs += [
+                (self.date_from_param, date_field, '__gte'),
+                (self.date_to_param, date_field, '__lte'),
+            ]
+
+        lookups = {}
+        errors = {}
+        for param, path, suffix in specs:
+            value = params.get(param)
+            if value in (None, ''):
+                continue
+            try:
+                lookups[path + suffix] = resolve_field(model, path).to_python(value)
+            except (DjangoValidationError, ValueError, TypeError):
+                errors[param] = f'Invalid value: {value}'
+
+        if errors:
+            raise ValidationError({
+                'status': 'error',
+                'message': 'Invalid filter parameters',
+                'errors': errors,
+            })
+        return lookups
+
+    def filter_queryset(self, request, queryset, view):
+        lookups = self.get_lookups(request, queryset.model, view)
+        return queryset.filter(**lookups) if lookups else queryset
@@ -0,0 +1,167 @@
+# history.py - paginated purchase/weight transaction feed for a company's balance
+import base64
+import binascii
+import datetime
+import json
+
+from django.db import connection
+from django.db.models import F, IntegerField, Q, Sum, Value
+
+from .models import DailySummary, Purchase, Weight
+
+PURCHASE, WEIGHT = 0, 1
+
+HISTORY_COLUMNS = [
+    'entry_date', 'entry_kind', 'entry_id', 'entry_mineral_id', 'entry_mineral_name',
+    'entry_amount', 'entry_signed_amount', 'entry_detail',
+]
+
+
+def encode_cursor(row, balances):
+    """Cursor after row, carrying the per-mineral running balances below it"""
+    raw = json.dumps({
+        'date': row['entry_date'].isoformat(),
+        'kind': row['entry_kind'],
+        'id': row['entry_id'],
+        'balances': sorted(balances.items(), key=lambda item: (item[0] is None, item[0] or 0)),
+    })
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(encoded):
+    """(date, kind, id, balances) of the last row served; raises ValueError when malformed"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        return (
+            datetime.date.fromisoformat(data['date']),
+            int(data['kind']),
+            int(data['id']),
+            {mineral_id: int(amount) for mineral_id, amount in data['balances']},
+        )
+    except (TypeError, KeyError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(str(e))
+
+
+def before_cursor(kind, cursor):
+    """Rows of one branch that come after the cursor in (create_at, kind, id) descending order"""
+    entry_date, cursor_kind, entry_id = cursor[:3]
+    if kind < cursor_kind:
+        return Q(create_at__lte=entry_date)
+    if kind > cursor_kind:
+        return Q(create_at__lt=entry_date)
+    return Q(create_at__lt=entry_date) | Q(create_at=entry_date, id__lt=entry_id)
+
+
+def get_history_branches(company_id, mineral_id=None):
+    """Active purchases and weights of a company as two queries with identical columns"""
+    purchases = Purchase.get_active_objects().filter(company_id=company_id)
+    weights = Weight.get_active_objects().filter(purchase__company_id=company_id)
+    if mineral_id:
+        purchases = purchases.filter(mineral_id=mineral_id)
+        weights = weights.filter(mineral_id=mineral_id)
+
+    purchases = purchases.annotate(
+        entry_date=F('create_at'),
+        entry_kind=Value(PURCHASE, output_field=IntegerField()),
+        entry_id=F('id'),
+        entry_mineral_id=F('mineral_id'),
+        entry_mineral_name=F('mineral__name'),
+        entry_amount=F('mineral_amount'),
+        entry_signed_amount=F('mineral_amount'),
+        entry_detail=F('area'),
+    )
+    weights = weights.annotate(
+        entry_date=F('create_at'),
+        entry_kind=Value(WEIGHT, output_field=IntegerField()),
+        entry_id=F('id'),
+        entry_mineral_id=F('mineral_id'),
+        entry_mineral_name=F('mineral__name'),
+        entry_amount=F('mineral_net_weight'),
+        entry_signed_amount=-F('mineral_net_weight'),
+        entry_detail=F('bill_number'),
+    )
+    return (
+        purchases.order_by().values_list(*HISTORY_COLUMNS),
+        weights.order_by().values_list(*HISTORY_COLUMNS),
+    )
+
+
+def get_transaction_history(company_id, mineral_id=None, cursor=None, page_size=50, balances=None):
+    """
+    One page of a company's purchases and weights, newest first.
+
+    Rows are ordered by (create_at, kind, id), kind breaking ties between a
+    purchase and a weight sharing an id, and paged with a keyset cursor on
+    that key. Each table contributes at most page_size + 1 rows past the
+    cursor and one UNION ALL query merges them, so a page never reads the
+    rows of the pages before or after it.
+
+    running_balance is the per-mineral total after each row. It is walked
+    down from balances: the cursor carries them from page to page, and the
+    first page starts from the current totals (get_history_totals).
+    Returns (rows, has_more, balances), balances being those to carry into
+    the next cursor.
+    """
+    branches = []
+    for kind, queryset in zip((PURCHASE, WEIGHT), get_history_branches(company_id, mineral_id)):
+        if cursor is not None:
+            queryset = queryset.filter(before_cursor(kind, cursor))
+        branch_sql, branch_params = queryset.order_by('-create_at', '-id')[:page_size + 1].query.sql_with_params()
+        branches.append((f'SELECT * FROM ({branch_sql}) branch_{kind}', branch_params))
+
+    sql = f'''
+        SELECT * FROM ({' UNION ALL '.join(branch_sql for branch_sql, _ in branches)}) feed
+        ORDER BY feed.entry_date DESC, feed.entry_kind DESC, feed.entry_id DESC
+        LIMIT %s
+    '''
+    params = [param for _, branch_params in branches for param in branch_params] + [page_size + 1]
+
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        names = [column[0] for column in db_cursor.description]
+        rows = [dict(zip(names, values)) for values in db_cursor.fetchall()]
+
+    balances = dict(cursor[3] if cursor is not None else balances or {})
+    for row in rows[:page_size]:
+        # SQLite hands dates back as strings from a raw query
+        if isinstance(row['entry_date'], str):
+            row['entry_date'] = datetime.date.fromisoformat(row['entry_date'])
+        row['running_balance'] = balances.get(row['entry_mineral_id'], 0)
+        balances[row['entry_mineral_id']] = row['running_balance'] - row['entry_signed_amount']
+
+    return rows[:page_size], len(rows) > page_size, balances
+
+
+def get_history_totals(company_id, mineral_id=None):
+    """
+    Added / subtracted / net totals per mineral plus the purchase and weight
+    counts, from the company's daily summary rows instead of its tickets.
+    """
+    summaries = DailySummary.objects.filter(company_id=company_id)
+    if mineral_id:
+        summaries = summaries.filter(mineral_id=mineral_id)
+
+    rows = summaries.values('mineral_id', 'mineral__name').annotate(
+        total_added=Sum('purchased_amount'),
+        total_subtracted=Sum('net_weight'),
+        purchases=Sum('purchase_count'),
+        weights=Sum('weight_count'),
+    ).order_by()
+
+    minerals = []
+    for row in sorted(rows, key=lambda row: (row['mineral_id'] is None, row['mineral_id'] or 0)):
+        total_added = row['total_added'] or 0
+        total_subtracted = row['total_subtracted'] or 0
+        minerals.append({
+            'mineral_name': row['mineral__name'] or 'Unknown',
+            'mineral_id': row['mineral_id'],
+            'current_balance': total_added - total_subtracted,
+            'total_added': total_added,
+            'total_subtracted': total_subtracted,
+        })
+
+    return {
+        'minerals': minerals,
+        'total_purchases': sum(row['purchases'] or 0 for row in rows),
+        'total_weights': sum(row['weights'] or 0 for row in rows),
+    }
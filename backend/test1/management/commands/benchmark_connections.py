@@ -0,0 +1,131 @@
+import io
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from rest_framework_simplejwt.tokens import RefreshToken
+
+DEFAULT_ENDPOINTS = [
+    '/api/units/',
+    '/api/minerals/',
+    '/api/scales/',
+    '/api/vehicle-types/',
+    '/api/companies/',
+    '/api/vehicles/',
+    '/api/purchases/',
+    '/api/weights/',
+    '/api/balances/',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure requests per second on the list endpoints through the full WSGI '
+        'request cycle, including opening and closing database connections. '
+        'With --baseline the endpoints are first run with a new connection per '
+        'request (CONN_MAX_AGE=0, bypassing the pool in pool mode). Run it under different DB_CONN_MODE settings '
+        'to compare persistent connections, the psycopg pool and pgbouncer.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+        parser.add_argument('--endpoint', action='append', help='Path to benchmark, repeatable (defaults to the list endpoints)')
+        parser.add_argument('--username', help='User to authenticate as (defaults to the first active user)')
+        parser.add_argument('--host', default='localhost', help='Host header sent with each request')
+        parser.add_argument('--baseline', action='store_true', help='Also run with a new connection per request first')
+
+    def get_token(self, username):
+        users = get_user_model().objects.filter(is_active=True).order_by('pk')
+        if username:
+            users = users.filter(username=username)
+        user = users.first()
+        if user is None:
+            raise CommandError('No active user to authenticate the benchmark requests as')
+        return str(RefreshToken.for_user(user).access_token)
+
+    def run_endpoint(self, handler, path, environ, count):
+        """Average requests per second and the number of connections opened for count requests"""
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(status)
+
+        statuses = []
+        connection_created.connect(count_connection)
+        try:
+            started = time.perf_counter()
+            for _ in range(count):
+                path_info, _, query = path.partition('?')
+                response = handler({**environ, 'PATH_INFO': path_info, 'QUERY_STRING': query, 'wsgi.input': io.BytesIO()}, start_response)
+                b''.join(response)
+                response.close()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count_connection)
+
+        failed = [status for status in statuses if not status.startswith('200')]
+        if failed:
+            raise CommandError(f'{path} answered {failed[0]}')
+        return count / elapsed, elapsed * 1000 / count, len(opened)
+
+    def run_all(self, handler, endpoints, environ, count, label):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        total_requests, total_seconds = 0, 0
+        for path in endpoints:
+            per_second, average_ms, opened = self.run_endpoint(handler, path, environ, count)
+            total_requests += count
+            total_seconds += count / per_second
+            self.stdout.write(f'  {path:<24} {per_second:9.1f} req/s {average_ms:8.2f} ms/req {opened:6d} connections opened')
+        self.stdout.write(f'  {"all endpoints":<24} {total_requests / total_seconds:9.1f} req/s\n')
+
+    def handle(self, *args, **options):
+        count = max(options['requests'], 1)
+        endpoints = options['endpoint'] or DEFAULT_ENDPOINTS
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'SCRIPT_NAME': '',
+            'SERVER_NAME': options['host'],
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': options['host'],
+            'HTTP_AUTHORIZATION': f"Bearer {self.get_token(options['username'])}",
+            'wsgi.url_scheme': 'http',
+            'wsgi.errors': self.stderr,
+        }
+        handler = WSGIHandler()
+        settings_dict = connection.settings_dict
+
+        self.stdout.write(
+            f"mode={getattr(settings, 'DB_CONN_MODE', 'persistent')} "
+            f"conn_max_age={settings_dict.get('CONN_MAX_AGE')} "
+            f"health_checks={settings_dict.get('CONN_HEALTH_CHECKS')} "
+            f"pool={'pool' in settings_dict.get('OPTIONS', {})} requests={count}\n"
+        )
+
+        # Warm up caches and imports so the first endpoint is not penalised
+        self.run_endpoint(handler, endpoints[0], environ, 1)
+
+        if options['baseline']:
+            configured_max_age = settings_dict['CONN_MAX_AGE']
+            # Hand the warm-up connection back before taking the pool away, so
+            # the baseline opens a real connection for every request
+            connection.close()
+            pool_options = settings_dict['OPTIONS'].pop('pool', None)
+            settings_dict['CONN_MAX_AGE'] = 0
+            try:
+                self.run_all(handler, endpoints, environ, count, 'New connection per request (CONN_MAX_AGE=0, no pool)')
+            finally:
+                connection.close()
+                settings_dict['CONN_MAX_AGE'] = configured_max_age
+                if pool_options is not None:
+                    settings_dict['OPTIONS']['pool'] = pool_options
+
+        self.run_all(handler, endpoints, environ, count, 'Configured connection management')
+        connection.close()
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from test1.deleted_counts import count_all
+from test1.models import Balance, Maktoob, Purchase, Vehicle, Weight
+
+
+class Command(BaseCommand):
+    help = (
+        'Print query plans and timings for the hot soft-delete access paths. '
+        'Run it once with migrations applied up to 0027 and again after 0028 '
+        'to compare plans before and after the partial indexes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help='Company id to look up (defaults to the first purchase company)')
+        parser.add_argument('--mineral', type=int, help='Mineral id to look up (defaults to the first purchase mineral)')
+        parser.add_argument('--repeat', type=int, default=20, help='Executions per query for the timing column')
+        parser.add_argument('--no-plans', action='store_true', help='Only print timings')
+
+    def get_sample_ids(self, options):
+        sample = Purchase.objects.filter(
+            company__isnull=False, mineral__isnull=False
+        ).values('company_id', 'mineral_id').first() or {}
+
+        return (
+            options['company'] or sample.get('company_id') or 1,
+            options['mineral'] or sample.get('mineral_id') or 1,
+        )
+
+    def get_queries(self, company_id, mineral_id):
+        vehicle_type_id = Vehicle.objects.values_list('vehicle_type_id', flat=True).first() or 1
+
+        return [
+            ('active balance for company+mineral', Balance.objects.filter(
+                company_id=company_id, mineral_id=mineral_id, deleted_at__isnull=True)),
+            ('active purchases for company+mineral', Purchase.get_active_objects().filter(
+                company_id=company_id, mineral_id=mineral_id)),
+            ('active weights for company', Weight.objects.filter(
+                purchase__company_id=company_id, deleted_at__isnull=True)),
+            ('active weights for mineral', Weight.get_active_objects().filter(mineral_id=mineral_id)),
+            ('active maktoobs for company', Maktoob.get_active_objects().filter(company_id=company_id)),
+            ('active vehicles for vehicle type', Vehicle.get_active_objects().filter(vehicle_type_id=vehicle_type_id)),
+            ('deleted weights', Weight.get_deleted_objects()),
+            ('deleted purchases', Purchase.get_deleted_objects()),
+        ]
+
+    def time_queryset(self, queryset, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.values_list('pk', flat=True)[:100])
+        return (time.perf_counter() - started) * 1000 / repeat
+
+    def handle(self, *args, **options):
+        repeat = max(options['repeat'], 1)
+        company_id, mineral_id = self.get_sample_ids(options)
+        self.stdout.write(f'company={company_id} mineral={mineral_id} repeat={repeat}\n')
+
+        for label, queryset in self.get_queries(company_id, mineral_id):
+            average_ms = self.time_queryset(queryset, repeat)
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{label}: {average_ms:.3f} ms'))
+            if not options['no_plans']:
+                self.stdout.write(queryset.explain())
+            self.stdout.write('')
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            count_all()
+        average_ms = (time.perf_counter() - started) * 1000 / repeat
+        self.stdout.write(self.style.MIGRATE_HEADING(f'recycle bin counts (UNION ALL): {average_ms:.3f} ms'))
@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from test1.checkpoints import build_checkpoints
+
+
+class Command(BaseCommand):
+    help = 'Write end-of-day balance checkpoints used by point-in-time balance queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--day',
+            type=datetime.date.fromisoformat,
+            help='Day to checkpoint (YYYY-MM-DD), defaults to yesterday',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            stats = build_checkpoints(options['day'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for key, value in stats.items():
+            self.stdout.write(f'{key}: {value}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {stats['checkpoints_written']} checkpoints for {stats['day']} in {stats['elapsed_ms']} ms"
+        ))
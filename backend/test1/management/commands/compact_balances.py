@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from test1.journal import compact_balances, get_balance_drift
+
+
+class Command(BaseCommand):
+    help = 'Fold the balance movement journal into the balance snapshots and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check-only',
+            action='store_true',
+            help='Only report balances that disagree with the journal',
+        )
+
+    def handle(self, *args, **options):
+        drift = get_balance_drift()
+        for row in drift:
+            self.stdout.write(self.style.WARNING(
+                f"Balance {row['id']} (company {row['company_id']}, mineral {row['mineral_id']}): "
+                f"stored {row['remaining_mineral_amount']}, journal {row['journal_amount']}, drift {row['drift']}"
+            ))
+
+        if options['check_only']:
+            self.stdout.write(f'{len(drift)} balances drifted from the journal')
+            return
+
+        stats = compact_balances()
+        for key, value in stats.items():
+            self.stdout.write(f'{key}: {value}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted {stats['balances_compacted']} balances in {stats['elapsed_ms']} ms"
+        ))
@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from test1.bulk import import_purchases, read_spreadsheet_rows
+
+
+class Command(BaseCommand):
+    help = 'Import purchases (royalty receipts) from a .csv or .xlsx file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the .csv or .xlsx file')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per bulk insert')
+        parser.add_argument('--partial', action='store_true', help='Skip invalid rows instead of rejecting the file')
+        parser.add_argument('--user', help='Username recorded as the creator of the purchases')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['user']} not found")
+
+        try:
+            with open(options['path'], 'rb') as file:
+                result = import_purchases(
+                    read_spreadsheet_rows(file, options['path']),
+                    user=user,
+                    chunk_size=options['chunk_size'],
+                    atomic=not options['partial'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+
+        summary = (
+            f"{result['created_count']} of {result['rows']} rows imported, "
+            f"{result['error_count']} invalid, {result['elapsed_ms']} ms"
+        )
+        if result['error_count'] and not options['partial']:
+            raise CommandError(f'Import rejected: {summary}')
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from test1.summaries import rebuild_daily_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily scale/mineral/company summaries from active purchases and weights'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date-from',
+            type=datetime.date.fromisoformat,
+            help='First day to rebuild (YYYY-MM-DD), defaults to the first record',
+        )
+        parser.add_argument(
+            '--date-to',
+            type=datetime.date.fromisoformat,
+            help='Last day to rebuild (YYYY-MM-DD), defaults to the last record',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stats = rebuild_daily_summaries(
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            batch_size=options['batch_size'],
+        )
+
+        for key, value in stats.items():
+            self.stdout.write(f'{key}: {value}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {stats['summaries_written']} daily summaries in {stats['total_ms']} ms"
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from test1.balances import recalculate_balances
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every company/mineral balance from active purchases and weights'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of balance rows per bulk upsert statement',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute the balances without writing them',
+        )
+
+    def handle(self, *args, **options):
+        stats = recalculate_balances(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+
+        for key, value in stats.items():
+            self.stdout.write(f'{key}: {value}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Recalculated {stats['balances_written']} balances in {stats['total_ms']} ms"
+        ))
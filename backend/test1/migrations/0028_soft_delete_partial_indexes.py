@@ -0,0 +1,161 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test1', '0027_remove_weight_transfor_type'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='balance',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='maktoob',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='mineral',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='momp',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='scale',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='unit',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='vehicle',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='vehicletype',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='weight',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='auditlog_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='balance',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='balance_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='company_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maktoob',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='maktoob_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maktoob',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['company'], name='maktoob_company_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mineral',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='mineral_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='momp',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='momp_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='purchase_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['company', 'mineral'], name='purchase_company_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['mineral'], name='purchase_mineral_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['maktoob'], name='purchase_maktoob_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['scale'], name='purchase_scale_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scale',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='scale_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='unit_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='vehicle_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['vehicle_type'], name='vehicle_type_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicletype',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='vehicletype_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weight',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='weight_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weight',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['purchase', 'mineral'], name='weight_purchase_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weight',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['mineral'], name='weight_mineral_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weight',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['vehicle'], name='weight_vehicle_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weight',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['scale'], name='weight_scale_active_idx'),
+        ),
+    ]
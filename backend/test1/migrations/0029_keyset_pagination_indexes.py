@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test1', '0028_soft_delete_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='maktoob',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['create_at', 'id'], name='maktoob_created_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['create_at', 'id'], name='purchase_created_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weight',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['create_at', 'id'], name='weight_created_active_idx'),
+        ),
+    ]
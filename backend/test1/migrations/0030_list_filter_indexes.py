@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test1', '0029_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['status'], name='company_status_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['company_type'], name='company_type_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['create_at', 'id'], name='company_created_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scale',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['status'], name='scale_status_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scale',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['create_at', 'id'], name='scale_created_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['status'], name='vehicle_status_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['create_at', 'id'], name='vehicle_created_active_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:23
+
+from django.core.management.base import CommandError
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_bill_numbers(apps, schema_editor):
+    """
+    Stop before adding the constraint while active weights share a bill number.
+
+    Bill numbers are printed on the physical bills, so they are not changed
+    here: the error lists every duplicated number with its weight ids for an
+    operator to correct (edit the wrong bill number or delete the duplicate
+    weight) before running migrate again.
+    """
+    Weight = apps.get_model('test1', 'Weight')
+    duplicates = list(
+        Weight.objects.filter(deleted_at__isnull=True).exclude(bill_number='')
+        .values('bill_number').annotate(total=Count('id')).filter(total__gt=1)
+        .values_list('bill_number', flat=True).order_by('bill_number')
+    )
+    if not duplicates:
+        return
+
+    weight_ids = {}
+    for pk, bill_number in Weight.objects.filter(
+        deleted_at__isnull=True, bill_number__in=duplicates,
+    ).values_list('id', 'bill_number').order_by('id'):
+        weight_ids.setdefault(bill_number, []).append(pk)
+
+    lines = [
+        f'  {bill_number}: weights {", ".join(map(str, weight_ids[bill_number]))}'
+        for bill_number in duplicates
+    ]
+    raise CommandError(
+        f'Active weights share {len(duplicates)} bill number(s). '
+        'Correct or delete the duplicates, then run migrate again:\n' + '\n'.join(lines)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test1', '0030_list_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_bill_numbers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='weight',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True), models.Q(('bill_number', ''), _negated=True)), fields=('bill_number',), name='weight_bill_number_active_uniq'),
+        ),
+    ]
@@ -0,0 +1,128 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:35
+
+import datetime
+from collections import defaultdict
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def start_of(day):
+    """Aware start of a day in the current time zone, now when the day is unknown"""
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min)) if day else timezone.now()
+
+
+def open_journal(apps, schema_editor):
+    """
+    Seed the journal with the existing balance history and snapshot it.
+
+    Every active purchase gets a credit and every active weight a debit,
+    dated on the record's create_at, so point-in-time lookups see the
+    history as it happened. Where a balance does not add up to its records
+    (manual edits, drift) an 'opening' movement for the difference is
+    dated on the balance's last change; pairs without a balance row are
+    brought back to zero the same way. Each pair's journal then sums to its
+    remaining amount, which becomes the snapshot.
+    """
+    Balance = apps.get_model('test1', 'Balance')
+    BalanceMovement = apps.get_model('test1', 'BalanceMovement')
+    Purchase = apps.get_model('test1', 'Purchase')
+    Weight = apps.get_model('test1', 'Weight')
+    now = timezone.now()
+
+    totals = defaultdict(int)
+    pending = []
+
+    def add(company_id, mineral_id, delta, source_model, source_id, created_at):
+        totals[company_id, mineral_id] += delta
+        pending.append(BalanceMovement(
+            company_id=company_id,
+            mineral_id=mineral_id,
+            delta=delta,
+            source_model=source_model,
+            source_id=source_id,
+            created_at=created_at,
+        ))
+        if len(pending) >= 1000:
+            BalanceMovement.objects.bulk_create(pending)
+            pending.clear()
+
+    purchases = Purchase.objects.filter(
+        deleted_at__isnull=True, company__isnull=False, mineral__isnull=False,
+    ).exclude(mineral_amount=0).order_by('create_at', 'id')
+    for pk, company_id, mineral_id, amount, create_at in purchases.values_list(
+        'id', 'company_id', 'mineral_id', 'mineral_amount', 'create_at',
+    ).iterator():
+        add(company_id, mineral_id, amount, 'Purchase', pk, start_of(create_at))
+
+    weights = Weight.objects.filter(
+        deleted_at__isnull=True, purchase__company__isnull=False, mineral__isnull=False,
+    ).exclude(mineral_net_weight=0).order_by('create_at', 'id')
+    for pk, company_id, mineral_id, amount, create_at in weights.values_list(
+        'id', 'purchase__company_id', 'mineral_id', 'mineral_net_weight', 'create_at',
+    ).iterator():
+        add(company_id, mineral_id, -amount, 'Weight', pk, start_of(create_at))
+
+    balances = {
+        (company_id, mineral_id): (amount, update_at or create_at)
+        for company_id, mineral_id, amount, update_at, create_at in Balance.objects.values_list(
+            'company_id', 'mineral_id', 'remaining_mineral_amount', 'update_at', 'create_at',
+        )
+    }
+    for pair in sorted(set(balances) | set(totals)):
+        amount, changed_on = balances.get(pair, (0, None))
+        if amount != totals[pair]:
+            add(*pair, amount - totals[pair], 'opening', None, start_of(changed_on))
+    BalanceMovement.objects.bulk_create(pending)
+
+    last_id = BalanceMovement.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    Balance.objects.update(
+        snapshot_amount=models.F('remaining_mineral_amount'),
+        snapshot_movement_id=last_id,
+        snapshot_at=now,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test1', '0031_weight_bill_number_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balance',
+            name='snapshot_amount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='balance',
+            name='snapshot_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='balance',
+            name='snapshot_movement_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='BalanceMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('source_model', models.CharField(blank=True, max_length=50)),
+                ('source_id', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_movements', to='test1.company')),
+                ('mineral', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_movements', to='test1.mineral')),
+            ],
+            options={
+                'verbose_name': 'Balance Movement',
+                'verbose_name_plural': 'Balance Movements',
+                'indexes': [models.Index(fields=['company', 'mineral', 'id'], name='movement_balance_idx'), models.Index(fields=['company', 'mineral', 'created_at'], name='movement_balance_time_idx'), models.Index(fields=['source_model', 'source_id'], name='movement_source_idx')],
+            },
+        ),
+        migrations.RunPython(open_journal, migrations.RunPython.noop),
+    ]
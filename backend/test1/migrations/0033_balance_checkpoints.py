@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test1', '0032_balance_movement_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('amount', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to='test1.company')),
+                ('mineral', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to='test1.mineral')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='balance_checkpoint_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('company', 'mineral', 'day'), name='balance_checkpoint_uniq')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='balancemovement',
+            index=models.Index(fields=['created_at'], name='movement_created_idx'),
+        ),
+    ]
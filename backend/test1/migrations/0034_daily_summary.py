@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:46
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def fill_summaries(apps, schema_editor):
+    """Summarise the active purchases and weights already recorded"""
+    Purchase = apps.get_model('test1', 'Purchase')
+    Weight = apps.get_model('test1', 'Weight')
+    DailySummary = apps.get_model('test1', 'DailySummary')
+
+    purchases = Purchase.objects.filter(deleted_at__isnull=True).values(
+        'create_at', 'scale_id', 'mineral_id', 'company_id',
+    ).annotate(
+        purchase_count=Count('id'),
+        purchased_amount=Sum('mineral_amount'),
+        purchased_total_price=Sum('mineral_total_price'),
+    ).order_by()
+    weights = Weight.objects.filter(deleted_at__isnull=True).values(
+        'create_at', 'scale_id', 'mineral_id', company_id=F('purchase__company_id'),
+    ).annotate(
+        weight_count=Count('id'),
+        net_weight=Sum('mineral_net_weight'),
+        second_weight=Sum('second_weight'),
+        control_weight=Sum('control_weight'),
+    ).order_by()
+
+    rows = {}
+    for group in [*purchases, *weights]:
+        key = (group.pop('create_at'), group.pop('scale_id'), group.pop('mineral_id'), group.pop('company_id'))
+        rows.setdefault(key, {}).update({field: value or 0 for field, value in group.items()})
+
+    DailySummary.objects.bulk_create([
+        DailySummary(day=day, scale_id=scale_id, mineral_id=mineral_id, company_id=company_id, **totals)
+        for (day, scale_id, mineral_id, company_id), totals in rows.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test1', '0033_balance_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('weight_count', models.IntegerField(default=0)),
+                ('net_weight', models.BigIntegerField(default=0)),
+                ('second_weight', models.BigIntegerField(default=0)),
+                ('control_weight', models.BigIntegerField(default=0)),
+                ('purchase_count', models.IntegerField(default=0)),
+                ('purchased_amount', models.BigIntegerField(default=0)),
+                ('purchased_total_price', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='test1.company')),
+                ('mineral', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='test1.mineral')),
+                ('scale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='test1.scale')),
+            ],
+            options={
+                'verbose_name': 'Daily Summary',
+                'verbose_name_plural': 'Daily Summaries',
+                'indexes': [models.Index(fields=['mineral', 'day'], name='daily_summary_mineral_idx'), models.Index(fields=['company', 'day'], name='daily_summary_company_idx')],
+                'constraints': [models.UniqueConstraint(models.F('day'), django.db.models.functions.comparison.Coalesce('scale', 0), django.db.models.functions.comparison.Coalesce('mineral', 0), django.db.models.functions.comparison.Coalesce('company', 0), name='daily_summary_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
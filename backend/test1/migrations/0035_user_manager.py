@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:13
+
+import test1.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test1', '0034_daily_summary'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', test1.models.UserManager()),
+            ],
+        ),
+    ]
@@ -1,18 +1,61 @@
 # models.py - FIXED VERSION
+from collections import Counter
+
 from django.contrib import admin
 from django.db import models
-from django.contrib.auth.models import AbstractUser  
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
-from django.db.models import Q
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Count, Q, F, Sum
+from django.db.models.functions import Coalesce
+
+from .deleted_counts import invalidate_deleted_counts
+from .reference_cache import invalidate_reference_cache
+
+
+def active_index(*fields, name):
+    """Index over rows that are not soft-deleted, matching get_active_objects()"""
+    return models.Index(fields=list(fields), name=name, condition=Q(deleted_at__isnull=True))
+
+
+def set_deleted_at(queryset, deleted_at):
+    """
+    Soft delete (deleted_at set) or restore (None) the rows of queryset with one UPDATE.
+    
+    queryset must select only the rows changing state; for purchases and
+    weights their daily summaries are moved first. Restoring weights raises
+    BillNumberConflict, before any write, if a bill number would be reused.
+    """
+    if queryset.model is Weight and deleted_at is None:
+        Weight.check_restore_bill_numbers(queryset)
+    if queryset.model in (Purchase, Weight):
+        DailySummary.apply(queryset, -1 if deleted_at else 1)
+    return queryset.update(deleted_at=deleted_at)
+
+
+class BillNumberConflict(ValueError):
+    """Restoring weights would give an active bill number to a second weight"""
+    
+    def __init__(self, bill_numbers):
+        self.bill_numbers = bill_numbers
+        super().__init__(f"Bill numbers already used by active weights: {', '.join(bill_numbers)}")
+
 
 class SoftDeleteModel(models.Model):
     """Abstract base model for soft delete functionality"""
-    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         abstract = True
+        indexes = [
+            # Only the recycle bin looks rows up by deleted_at, and only deleted ones
+            models.Index(
+                fields=['deleted_at'],
+                name='%(class)s_deleted_idx',
+                condition=Q(deleted_at__isnull=False),
+            ),
+        ]
     
     def soft_delete(self):
         """Soft delete the instance"""
@@ -21,6 +64,8 @@ class SoftDeleteModel(models.Model):
         
         # Call cascade soft delete
         self.cascade_soft_delete()
+        invalidate_deleted_counts()
+        invalidate_reference_cache()
     
     def cascade_soft_delete(self):
         """Override this method in child classes to handle cascade delete"""
@@ -33,6 +78,8 @@ class SoftDeleteModel(models.Model):
         
         # Call cascade restore
         self.cascade_restore()
+        invalidate_deleted_counts()
+        invalidate_reference_cache()
     
     def cascade_restore(self):
         """Override this method in child classes to handle cascade restore"""
@@ -74,9 +121,24 @@ class DeletedRelationship(models.Model):
     def __str__(self):
         return f"{self.model_name}.{self.model_id} -> {self.related_model}.{self.related_id}"
 
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Queryset updates send no post_save, so drop the cached JWT users they change"""
+        from .authentication import invalidate_cached_users
+
+        user_ids = list(self.values_list('pk', flat=True))
+        updated = super().update(**kwargs)
+        invalidate_cached_users(user_ids)
+        return updated
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
+
 class User(AbstractUser):
     email = models.EmailField(unique=True)
 
+    objects = UserManager()
+
 class Userprofile(models.Model):
     phone = models.CharField(max_length=255)
     birth_date = models.DateField(null=True, blank=True)
@@ -134,18 +196,18 @@ class Mineral(SoftDeleteModel):
         """Soft delete related purchases and weights"""
         from django.utils import timezone
         # Soft delete related purchases
-        Purchase.objects.filter(mineral=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        set_deleted_at(Purchase.objects.filter(mineral=self, deleted_at__isnull=True), timezone.now())
         
         # Soft delete related weights
-        Weight.objects.filter(mineral=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        set_deleted_at(Weight.objects.filter(mineral=self, deleted_at__isnull=True), timezone.now())
     
     def cascade_restore(self):
         """Restore related purchases and weights"""
         # Restore related purchases
-        Purchase.objects.filter(mineral=self, deleted_at__isnull=False).update(deleted_at=None)
+        set_deleted_at(Purchase.objects.filter(mineral=self, deleted_at__isnull=False), None)
         
         # Restore related weights
-        Weight.objects.filter(mineral=self, deleted_at__isnull=False).update(deleted_at=None)
+        set_deleted_at(Weight.objects.filter(mineral=self, deleted_at__isnull=False), None)
 
 class VehicleType(SoftDeleteModel):
     truck_name = models.CharField(max_length=255)
@@ -184,19 +246,25 @@ class Vehicle(SoftDeleteModel):
     def __str__(self):
         return f"{self.car_name} - {self.plate_number}"
 
-    class Meta:
+    class Meta(SoftDeleteModel.Meta):
         permissions = [
             ('cancel_vehicle' , 'Can cancel vehicle')
         ]
+        indexes = SoftDeleteModel.Meta.indexes + [
+            # Vehicle list filtered by vehicle_type, VehicleType cascades
+            active_index('vehicle_type', name='vehicle_type_active_idx'),
+            active_index('status', name='vehicle_status_active_idx'),
+            active_index('create_at', 'id', name='vehicle_created_active_idx'),
+        ]
     
     def cascade_soft_delete(self):
         """Soft delete related weights"""
         from django.utils import timezone
-        Weight.objects.filter(vehicle=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        set_deleted_at(Weight.objects.filter(vehicle=self, deleted_at__isnull=True), timezone.now())
     
     def cascade_restore(self):
         """Restore related weights"""
-        Weight.objects.filter(vehicle=self, deleted_at__isnull=False).update(deleted_at=None)
+        set_deleted_at(Weight.objects.filter(vehicle=self, deleted_at__isnull=False), None)
     
     def get_company_count(self):
         """Get count of active companies this vehicle is linked to"""
@@ -221,6 +289,13 @@ class Company(SoftDeleteModel):
     
     def __str__(self):
         return self.company_name
+
+    class Meta(SoftDeleteModel.Meta):
+        indexes = SoftDeleteModel.Meta.indexes + [
+            active_index('status', name='company_status_active_idx'),
+            active_index('company_type', name='company_type_active_idx'),
+            active_index('create_at', 'id', name='company_created_active_idx'),
+        ]
     
     def cascade_soft_delete(self):
         """Soft delete related maktoobs, purchases, and vehicles in the many-to-many"""
@@ -230,37 +305,62 @@ class Company(SoftDeleteModel):
         Maktoob.objects.filter(company=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
         
         # Soft delete related purchases
-        Purchase.objects.filter(company=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        set_deleted_at(Purchase.objects.filter(company=self, deleted_at__isnull=True), timezone.now())
         
         # Soft delete related weights (through purchases)
-        Weight.objects.filter(purchase__company=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        set_deleted_at(Weight.objects.filter(purchase__company=self, deleted_at__isnull=True), timezone.now())
         
         # Track and soft delete related vehicles
-        company_vehicles = list(self.vehicle.all())
+        self.cascade_soft_delete_vehicles(timezone.now())
+        
+        # Clear the many-to-many relationship
+        self.vehicle.clear()
+        
+        # Soft delete related balances
+        Balance.objects.filter(company=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+    
+    def cascade_soft_delete_vehicles(self, deleted_at):
+        """
+        Record the company's vehicle links and soft delete vehicles left without an active company.
         
-        # Store the vehicle relationships before clearing
-        for vehicle in company_vehicles:
-            # Track this relationship
-            DeletedRelationship.objects.create(
+        Runs a fixed number of queries whatever the fleet size: one read of
+        the links, one bulk insert of tracking rows, one annotated query for
+        vehicles whose only active company is this one, and one UPDATE each
+        for those vehicles and their weights.
+        """
+        vehicle_ids = list(self.vehicle.values_list('id', flat=True))
+        if not vehicle_ids:
+            return []
+        
+        DeletedRelationship.objects.bulk_create([
+            DeletedRelationship(
                 model_name='Company',
                 model_id=self.id,
                 related_model='Vehicle',
-                related_id=vehicle.id,
+                related_id=vehicle_id,
                 relationship_type='many_to_many',
             )
-            
-            # Count how many companies this vehicle is linked to (excluding deleted companies)
-            company_count = vehicle.companies.filter(deleted_at__isnull=True).count()
-            
-            # If this is the only active company for this vehicle, soft delete the vehicle
-            if company_count <= 1:
-                vehicle.soft_delete()
+            for vehicle_id in vehicle_ids
+        ])
         
-        # Clear the many-to-many relationship
-        self.vehicle.clear()
+        orphaned_ids = list(
+            Vehicle.objects.filter(
+                id__in=vehicle_ids,
+                deleted_at__isnull=True,
+            ).annotate(
+                other_active_companies=Count(
+                    'companies',
+                    filter=Q(companies__deleted_at__isnull=True) & ~Q(companies__id=self.id),
+                )
+            ).filter(other_active_companies=0).values_list('id', flat=True)
+        )
         
-        # Soft delete related balances
-        Balance.objects.filter(company=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        if orphaned_ids:
+            Vehicle.objects.filter(id__in=orphaned_ids).update(deleted_at=deleted_at)
+            # Same effect as Vehicle.cascade_soft_delete for each of them
+            set_deleted_at(Weight.objects.filter(vehicle_id__in=orphaned_ids, deleted_at__isnull=True), deleted_at)
+        
+        return orphaned_ids
     
     def cascade_restore(self):
         """Restore related maktoobs, purchases, and vehicles"""
@@ -268,41 +368,87 @@ class Company(SoftDeleteModel):
         Maktoob.objects.filter(company=self, deleted_at__isnull=False).update(deleted_at=None)
         
         # Restore related purchases
-        Purchase.objects.filter(company=self, deleted_at__isnull=False).update(deleted_at=None)
+        set_deleted_at(Purchase.objects.filter(company=self, deleted_at__isnull=False), None)
         
         # Restore related weights
-        Weight.objects.filter(purchase__company=self, deleted_at__isnull=False).update(deleted_at=None)
+        set_deleted_at(Weight.objects.filter(purchase__company=self, deleted_at__isnull=False), None)
         
         # Restore related balances
         Balance.objects.filter(company=self, deleted_at__isnull=False).update(deleted_at=None)
         
         # Restore vehicles using the tracking
-        deleted_relationships = DeletedRelationship.objects.filter(
+        self.cascade_restore_vehicles()
+    
+    def cascade_restore_vehicles(self):
+        """Re-link tracked vehicles and restore those left without another active company"""
+        return Company.restore_tracked_vehicles([self.id])
+    
+    @classmethod
+    def restore_tracked_vehicles(cls, company_ids):
+        """
+        Re-link the tracked vehicles of a set of companies being restored.
+        
+        Set-based counterpart of cascade_soft_delete_vehicles: the links are
+        re-added with one bulk insert into the through table, deleted vehicles
+        held by no other active company are restored with their weights in
+        one UPDATE each, and the tracking rows are removed with a single
+        DELETE. Vehicles that were hard deleted in the meantime are skipped.
+        Returns the restored vehicles as id / name / plate_number dicts.
+        """
+        tracked = DeletedRelationship.objects.filter(
             model_name='Company',
-            model_id=self.id,
+            model_id__in=company_ids,
             related_model='Vehicle',
         )
+        links = set(tracked.values_list('model_id', 'related_id'))
+        if not links:
+            return []
         
-        for relationship in deleted_relationships:
-            try:
-                vehicle = Vehicle.objects.get(id=relationship.related_id)
-                
-                # Add the vehicle back to the relationship
-                self.vehicle.add(vehicle)
-                
-                # If the vehicle was soft-deleted and this was its only company, restore it
-                if vehicle.is_deleted:
-                    # Check if it's safe to restore (no other active companies)
-                    active_company_count = vehicle.companies.filter(deleted_at__isnull=True).count()
-                    if active_company_count == 0:
-                        vehicle.restore()
-                
-                # Delete the tracking record
-                relationship.delete()
-                
-            except Vehicle.DoesNotExist:
-                # Vehicle might have been hard deleted, skip it
-                pass
+        vehicle_ids = set(Vehicle.objects.filter(
+            id__in={vehicle_id for _, vehicle_id in links},
+        ).values_list('id', flat=True))
+        
+        # Add the vehicles back to the relationship
+        through = cls.vehicle.through
+        through.objects.bulk_create(
+            [
+                through(company_id=company_id, vehicle_id=vehicle_id)
+                for company_id, vehicle_id in links
+                if vehicle_id in vehicle_ids
+            ],
+            ignore_conflicts=True,
+        )
+        
+        # Only restore deleted vehicles that no other active company still holds
+        restored = [
+            {'id': row['id'], 'name': row['car_name'], 'plate_number': row['plate_number']}
+            for row in Vehicle.get_deleted_objects().filter(
+                id__in=vehicle_ids,
+            ).annotate(
+                other_active_companies=Count(
+                    'companies',
+                    filter=Q(companies__deleted_at__isnull=True) & ~Q(companies__id__in=company_ids),
+                )
+            ).filter(other_active_companies=0).values('id', 'car_name', 'plate_number')
+        ]
+        restored_ids = [vehicle['id'] for vehicle in restored]
+        
+        if restored_ids:
+            Vehicle.objects.filter(id__in=restored_ids).update(deleted_at=None)
+            # Same effect as Vehicle.cascade_restore for each of them
+            set_deleted_at(Weight.objects.filter(vehicle_id__in=restored_ids, deleted_at__isnull=False), None)
+        
+        # Delete the tracking records
+        tracked.delete()
+        
+        return restored
+    
+    def restore_with_vehicles(self):
+        """Restore the company and return the vehicles restored along with it"""
+        with transaction.atomic():
+            restored = self.cascade_restore_vehicles()
+            self.restore()
+        return restored
     
     def get_related_vehicles_info(self):
         """Get information about related vehicles"""
@@ -340,15 +486,21 @@ class Scale(SoftDeleteModel):
     
     def __str__(self):
         return f"{self.name} - {self.location}"
+
+    class Meta(SoftDeleteModel.Meta):
+        indexes = SoftDeleteModel.Meta.indexes + [
+            active_index('status', name='scale_status_active_idx'),
+            active_index('create_at', 'id', name='scale_created_active_idx'),
+        ]
     
     def cascade_soft_delete(self):
         """Soft delete related purchases, weights, and momps"""
         from django.utils import timezone
         # Soft delete related purchases
-        Purchase.objects.filter(scale=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        set_deleted_at(Purchase.objects.filter(scale=self, deleted_at__isnull=True), timezone.now())
         
         # Soft delete related weights
-        Weight.objects.filter(scale=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        set_deleted_at(Weight.objects.filter(scale=self, deleted_at__isnull=True), timezone.now())
         
         # Soft delete related momps
         Momp.objects.filter(scale=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
@@ -356,10 +508,10 @@ class Scale(SoftDeleteModel):
     def cascade_restore(self):
         """Restore related purchases, weights, and momps"""
         # Restore related purchases
-        Purchase.objects.filter(scale=self, deleted_at__isnull=False).update(deleted_at=None)
+        set_deleted_at(Purchase.objects.filter(scale=self, deleted_at__isnull=False), None)
         
         # Restore related weights
-        Weight.objects.filter(scale=self, deleted_at__isnull=False).update(deleted_at=None)
+        set_deleted_at(Weight.objects.filter(scale=self, deleted_at__isnull=False), None)
         
         # Restore related momps
         Momp.objects.filter(scale=self, deleted_at__isnull=False).update(deleted_at=None)
@@ -377,17 +529,24 @@ class Maktoob(SoftDeleteModel):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='user_maktoobs')
     company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True, blank=True, related_name='company_maktoobs')
     
+    class Meta(SoftDeleteModel.Meta):
+        indexes = SoftDeleteModel.Meta.indexes + [
+            # Maktoob list filtered by company, Company cascades
+            active_index('company', name='maktoob_company_active_idx'),
+            active_index('create_at', 'id', name='maktoob_created_active_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.maktoob_type} - {self.maktoob_number}"
     
     def cascade_soft_delete(self):
         """Soft delete related purchases"""
         from django.utils import timezone
-        Purchase.objects.filter(maktoob=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        set_deleted_at(Purchase.objects.filter(maktoob=self, deleted_at__isnull=True), timezone.now())
     
     def cascade_restore(self):
         """Restore related purchases"""
-        Purchase.objects.filter(maktoob=self, deleted_at__isnull=False).update(deleted_at=None)
+        set_deleted_at(Purchase.objects.filter(maktoob=self, deleted_at__isnull=False), None)
 
 
 
@@ -409,6 +568,18 @@ class Purchase(SoftDeleteModel):
     scale = models.ForeignKey(Scale, on_delete=models.SET_NULL, null=True, blank=True, related_name='scale_purchases')
     unit = models.ForeignKey(Unit, on_delete=models.SET_NULL, null=True, blank=True, related_name='unit_purchases')
     
+    class Meta(SoftDeleteModel.Meta):
+        indexes = SoftDeleteModel.Meta.indexes + [
+            # Active purchases of a company (and mineral): balances, availability,
+            # Company cascades and the purchase__company side of weight lookups
+            active_index('company', 'mineral', name='purchase_company_active_idx'),
+            # Purchase list filters (?mineral=, ?maktoob=, ?scale=) and the cascades
+            active_index('mineral', name='purchase_mineral_active_idx'),
+            active_index('maktoob', name='purchase_maktoob_active_idx'),
+            active_index('scale', name='purchase_scale_active_idx'),
+            active_index('create_at', 'id', name='purchase_created_active_idx'),
+        ]
+    
     def __str__(self):
         return f"Purchase #{self.id} - {self.area}"
     
@@ -416,160 +587,114 @@ class Purchase(SoftDeleteModel):
         # Check if this is a new purchase (not updated)
         is_new = self.pk is None
         
-        # Call the original save method
-        super().save(*args, **kwargs)
+        if not is_new and kwargs.get('update_fields') is None:
+            # Move the record's daily summary totals along with the edit
+            with transaction.atomic():
+                active = Purchase.objects.filter(pk=self.pk, deleted_at__isnull=True)
+                previous_company_id = active.values_list('company_id', flat=True).first()
+                # Weights are summarised under their purchase's company
+                weights = Weight.objects.filter(purchase_id=self.pk, deleted_at__isnull=True)
+                moves_weights = previous_company_id != self.company_id
+                
+                DailySummary.apply(active, -1)
+                if moves_weights:
+                    DailySummary.apply(weights, -1)
+                super().save(*args, **kwargs)
+                DailySummary.apply(active)
+                if moves_weights:
+                    DailySummary.apply(weights)
+            return
+        
+        if not is_new:
+            super().save(*args, **kwargs)
+            return
         
-        # If this is a new purchase, update the balance
-        if is_new and self.company and self.mineral and self.mineral_amount:
-            self.update_balance()
+        with transaction.atomic():
+            counts_towards_balance = self.get_balance_key() is not None
+            if counts_towards_balance:
+                # Flag the purchase as accounted for in the same INSERT
+                self.balance_updated = True
+            super().save(*args, **kwargs)
+            if counts_towards_balance:
+                self.update_balance()
+            DailySummary.apply(Purchase.objects.filter(pk=self.pk))
+    
+    def get_balance_key(self):
+        """Return the (company_id, mineral_id) balance this purchase counts towards"""
+        if not self.company_id or not self.mineral_id or not self.mineral_amount:
+            return None
+        return self.company_id, self.mineral_id
     
-    # === MOVE THIS METHOD INSIDE THE CLASS ===
     def update_balance(self):
-        """Update the balance table when a purchase is created"""
+        """Add the purchase amount to its company-mineral balance"""
+        key = self.get_balance_key()
+        if key is None:
+            return False
+        
         try:
-            if not self.company or not self.mineral or not self.mineral_amount:
-                return
-            
-            # Get or create ONE balance record for this company-mineral combination
-            balance, created = Balance.objects.get_or_create(
-                company=self.company,
-                mineral=self.mineral,
-                deleted_at__isnull=True,
-                defaults={
-                    'remaining_mineral_amount': 0,
-                    'company_type': self.company.company_type,
-                }
-            )
-            
-            # Add the purchase amount to the balance
-            balance.remaining_mineral_amount += self.mineral_amount
-            balance.save()
-            
-            # Mark that this purchase has been accounted for in balance
-            self.balance_updated = True
-            self.save(update_fields=['balance_updated'])
-            
-            print(f"✅ Purchase {self.id}: Added {self.mineral_amount} to {self.company.company_name}'s {self.mineral.name} balance. New total: {balance.remaining_mineral_amount}")
-            
+            Balance.apply_delta(*key, self.mineral_amount, source=self)
         except Exception as e:
             print(f"❌ Error updating balance for purchase {self.id}: {str(e)}")
             # Re-raise the exception to prevent silent failures
             raise
+        return True
+    
+    def soft_delete(self):
+        """Soft delete, reversing the balance in the same write as deleted_at"""
+        with transaction.atomic():
+            self.reverse_balance_update()
+            DailySummary.apply(Purchase.objects.filter(pk=self.pk, deleted_at__isnull=True), -1)
+            self.deleted_at = timezone.now()
+            self.save(update_fields=['deleted_at', 'balance_updated'])
+            
+            self.cascade_soft_delete()
+            invalidate_deleted_counts()
     
     def cascade_soft_delete(self):
         """Soft delete related weights and reverse balance update"""
-        from django.utils import timezone
-        
-        # First, reverse the balance update
-        self.reverse_balance_update()
+        # No-op when soft_delete has already reversed the balance
+        if self.reverse_balance_update():
+            Purchase.objects.filter(pk=self.pk).update(balance_updated=False)
         
         # Then soft delete related weights
-        Weight.objects.filter(purchase=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        set_deleted_at(Weight.objects.filter(purchase=self, deleted_at__isnull=True), timezone.now())
     
     def reverse_balance_update(self):
-        """Reverse the balance update when purchase is deleted"""
+        """Subtract the purchase amount from the balance if it was added"""
+        key = self.get_balance_key()
+        if key is None or not self.balance_updated:
+            return False
+        
         try:
-            if not self.company or not self.mineral or not self.mineral_amount:
-                return
-                
-            # Find the balance for this company and mineral
-            balance = Balance.objects.filter(
-                company=self.company,
-                mineral=self.mineral,
-                deleted_at__isnull=True
-            ).first()
-            
-            if balance and self.balance_updated:
-                # Subtract the mineral amount from the balance
-                balance.remaining_mineral_amount -= self.mineral_amount
-                balance.save()
-                
-                print(f"🗑️ Purchase {self.id} deleted: Subtracted {self.mineral_amount} from {self.company.company_name}'s {self.mineral.name} balance. New total: {balance.remaining_mineral_amount}")
-                
+            Balance.apply_delta(*key, -self.mineral_amount, source=self)
         except Exception as e:
             print(f"❌ Error reversing balance for purchase {self.id}: {str(e)}")
-    
-    def cascade_restore(self):
-        """Restore related weights and reapply balance update"""
-        # Restore related weights
-        Weight.objects.filter(purchase=self, deleted_at__isnull=False).update(deleted_at=None)
-        
-        # Reapply balance update
-        self.update_balance()
-
-
-
-def update_balance(self):
-    """Update the balance table when a purchase is created"""
-    try:
-        if not self.company or not self.mineral or not self.mineral_amount:
-            return
-        
-        # Get or create ONE balance record for this company-mineral combination
-        balance, created = Balance.objects.get_or_create(
-            company=self.company,
-            mineral=self.mineral,
-            deleted_at__isnull=True,
-            defaults={
-                'remaining_mineral_amount': 0,
-                'company_type': self.company.company_type,
-            }
-        )
-        
-        # Add the purchase amount to the balance
-        balance.remaining_mineral_amount += self.mineral_amount
-        balance.save()
-        
-        # Mark that this purchase has been accounted for in balance
-        self.balance_updated = True
-        self.save(update_fields=['balance_updated'])
-        
-        print(f"✅ Purchase {self.id}: Added {self.mineral_amount} to {self.company.company_name}'s {self.mineral.name} balance. New total: {balance.remaining_mineral_amount}")
-        
-    except Exception as e:
-        print(f"❌ Error updating balance for purchase {self.id}: {str(e)}")
-        # Re-raise the exception to prevent silent failures
-        raise
-    def cascade_soft_delete(self):
-        """Soft delete related weights and reverse balance update"""
-        from django.utils import timezone
-        
-        # First, reverse the balance update
-        self.reverse_balance_update()
+            raise
         
-        # Then soft delete related weights
-        Weight.objects.filter(purchase=self, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        self.balance_updated = False
+        return True
     
-    def reverse_balance_update(self):
-        """Reverse the balance update when purchase is deleted"""
-        try:
-            if not self.company or not self.mineral or not self.mineral_amount:
-                return
-                
-            # Find the balance for this company and mineral
-            balance = Balance.objects.filter(
-                company=self.company,
-                mineral=self.mineral,
-                deleted_at__isnull=True
-            ).first()
+    def restore(self):
+        """Restore, re-adding the balance in the same write as deleted_at"""
+        with transaction.atomic():
+            self.deleted_at = None
+            if not self.balance_updated and self.update_balance():
+                self.balance_updated = True
+            DailySummary.apply(Purchase.objects.filter(pk=self.pk, deleted_at__isnull=False))
+            self.save(update_fields=['deleted_at', 'balance_updated'])
             
-            if balance and self.balance_updated:
-                # Subtract the mineral amount from the balance
-                balance.remaining_mineral_amount -= self.mineral_amount
-                balance.save()
-                
-                print(f"🗑️ Purchase {self.id} deleted: Subtracted {self.mineral_amount} from {self.company.company_name}'s {self.mineral.name} balance. New total: {balance.remaining_mineral_amount}")
-                
-        except Exception as e:
-            print(f"❌ Error reversing balance for purchase {self.id}: {str(e)}")
+            self.cascade_restore()
+            invalidate_deleted_counts()
     
     def cascade_restore(self):
         """Restore related weights and reapply balance update"""
         # Restore related weights
-        Weight.objects.filter(purchase=self, deleted_at__isnull=False).update(deleted_at=None)
+        set_deleted_at(Weight.objects.filter(purchase=self, deleted_at__isnull=False), None)
         
-        # Reapply balance update
-        self.update_balance()
+        # No-op when restore has already reapplied the balance
+        if not self.balance_updated and self.update_balance():
+            self.balance_updated = True
+            Purchase.objects.filter(pk=self.pk).update(balance_updated=True)
 
 class Weight(SoftDeleteModel):
     second_weight = models.IntegerField()  
@@ -588,93 +713,151 @@ class Weight(SoftDeleteModel):
     purchase = models.ForeignKey(Purchase, on_delete=models.SET_NULL, null=True, blank=True, related_name='purchase_weights')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='user_weights')
     
+    class Meta(SoftDeleteModel.Meta):
+        indexes = SoftDeleteModel.Meta.indexes + [
+            # Weight.objects.filter(purchase__company=...) joins through purchase_id;
+            # also Purchase cascades and per purchase+mineral weighed totals
+            active_index('purchase', 'mineral', name='weight_purchase_active_idx'),
+            # Weight list filters (?mineral=, ?vehicle=, ?scale=) and the cascades
+            active_index('mineral', name='weight_mineral_active_idx'),
+            active_index('vehicle', name='weight_vehicle_active_idx'),
+            active_index('scale', name='weight_scale_active_idx'),
+            active_index('create_at', 'id', name='weight_created_active_idx'),
+        ]
+        constraints = [
+            # One active weight per bill number; also the index behind the lookups
+            models.UniqueConstraint(
+                fields=['bill_number'],
+                condition=Q(deleted_at__isnull=True) & ~Q(bill_number=''),
+                name='weight_bill_number_active_uniq',
+            ),
+        ]
+    
     def __str__(self):
         return f"Weight #{self.id}"
     
+    @classmethod
+    def get_existing_bill_numbers(cls, bill_numbers, exclude_pk=None):
+        """Subset of bill_numbers already used by an active weight, in one query"""
+        queryset = cls.objects.filter(bill_number__in=set(bill_numbers), deleted_at__isnull=True)
+        if exclude_pk is not None:
+            queryset = queryset.exclude(pk=exclude_pk)
+        return set(queryset.values_list('bill_number', flat=True))
+    
+    @classmethod
+    def check_restore_bill_numbers(cls, queryset):
+        """
+        Raise BillNumberConflict if restoring the deleted weights of queryset
+        would break weight_bill_number_active_uniq, i.e. a bill number is held
+        by an active weight or repeated among the weights being restored.
+        """
+        restoring = Counter(
+            queryset.filter(deleted_at__isnull=False).exclude(bill_number='').values_list('bill_number', flat=True)
+        )
+        conflicts = {bill_number for bill_number, count in restoring.items() if count > 1}
+        conflicts |= cls.get_existing_bill_numbers(restoring)
+        if conflicts:
+            raise BillNumberConflict(sorted(conflicts))
+    
     def save(self, *args, **kwargs):
         # Check if this is a new weight (not updated)
         is_new = self.pk is None
         
-        # Call the original save method
-        super().save(*args, **kwargs)
+        if not is_new and kwargs.get('update_fields') is None:
+            # Move the record's daily summary totals along with the edit
+            with transaction.atomic():
+                active = Weight.objects.filter(pk=self.pk, deleted_at__isnull=True)
+                DailySummary.apply(active, -1)
+                super().save(*args, **kwargs)
+                DailySummary.apply(active)
+            return
+        
+        if not is_new:
+            super().save(*args, **kwargs)
+            return
+        
+        with transaction.atomic():
+            counts_towards_balance = self.get_balance_key() is not None
+            if counts_towards_balance:
+                # Flag the weight as accounted for in the same INSERT
+                self.balance_updated = True
+            super().save(*args, **kwargs)
+            if counts_towards_balance:
+                self.update_balance()
+            DailySummary.apply(Weight.objects.filter(pk=self.pk))
+    
+    def get_balance_key(self):
+        """Return the (company_id, mineral_id) balance this weight draws from"""
+        if not self.purchase_id or not self.mineral_id or not self.mineral_net_weight:
+            return None
         
-        # If this is a new weight, update the balance
-        if is_new and self.purchase and self.mineral_net_weight and self.purchase.company and self.mineral:
-            self.update_balance()
+        company_id = self.purchase.company_id
+        if not company_id:
+            return None
+        return company_id, self.mineral_id
     
     def update_balance(self):
-        """Update the balance table when weight is created"""
+        """Subtract the net weight from its company-mineral balance"""
+        key = self.get_balance_key()
+        if key is None:
+            return False
+        
         try:
-            if not self.purchase or not self.mineral_net_weight:
-                return
-            
-            # Get or create ONE balance record for this company-mineral combination
-            balance, created = Balance.objects.get_or_create(
-                company=self.purchase.company,
-                mineral=self.mineral,
-                deleted_at__isnull=True,
-                defaults={
-                    'remaining_mineral_amount': 0,
-                    'company_type': self.purchase.company.company_type,
-                }
-            )
-            
-            # Subtract the net weight from the balance
-            balance.remaining_mineral_amount -= self.mineral_net_weight
-            balance.save()
-            
-            # Mark that this weight has been accounted for in balance
-            self.balance_updated = True
-            self.save(update_fields=['balance_updated'])
-            
-            print(f"⚖️ Weight {self.id}: Subtracted {self.mineral_net_weight} from {self.purchase.company.company_name}'s {self.mineral.name} balance. New total: {balance.remaining_mineral_amount}")
-            
+            Balance.apply_delta(*key, -self.mineral_net_weight, source=self)
         except Exception as e:
             print(f"❌ Error updating balance for weight {self.id}: {str(e)}")
+            raise
+        return True
+    
+    def soft_delete(self):
+        """Soft delete, reversing the balance in the same write as deleted_at"""
+        with transaction.atomic():
+            self.reverse_balance_update()
+            DailySummary.apply(Weight.objects.filter(pk=self.pk, deleted_at__isnull=True), -1)
+            self.deleted_at = timezone.now()
+            self.save(update_fields=['deleted_at', 'balance_updated'])
+            invalidate_deleted_counts()
     
     def cascade_soft_delete(self):
         """Soft delete and reverse balance update"""
-        from django.utils import timezone
-        
-        # First, reverse the balance update
+        # No-op when soft_delete has already reversed the balance
         self.reverse_balance_update()
         
         # Then mark as deleted
-        self.deleted_at = timezone.now()
-        self.save(update_fields=['deleted_at'])
+        DailySummary.apply(Weight.objects.filter(pk=self.pk, deleted_at__isnull=True), -1)
+        if self.deleted_at is None:
+            self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at', 'balance_updated'])
     
     def reverse_balance_update(self):
-        """Reverse the balance update when weight is deleted"""
+        """Add the net weight back to the balance if it was subtracted"""
+        key = self.get_balance_key()
+        if key is None or not self.balance_updated:
+            return False
+        
         try:
-            if not self.purchase or not self.mineral_net_weight:
-                return
-            
-            # Find the balance for this company and mineral
-            balance = Balance.objects.filter(
-                company=self.purchase.company,
-                mineral=self.mineral,
-                deleted_at__isnull=True
-            ).first()
-            
-            if balance and self.balance_updated:
-                # Add back the net weight to the balance
-                balance.remaining_mineral_amount += self.mineral_net_weight
-                balance.save()
-                
-                print(f"🗑️ Weight {self.id} deleted: Added back {self.mineral_net_weight} to {self.purchase.company.company_name}'s {self.mineral.name} balance. New total: {balance.remaining_mineral_amount}")
-            
+            Balance.apply_delta(*key, self.mineral_net_weight, source=self)
         except Exception as e:
             print(f"❌ Error reversing balance for weight {self.id}: {str(e)}")
+            raise
+        
+        self.balance_updated = False
+        return True
+    
+    def restore(self):
+        """Restore, reapplying the balance in the same write as deleted_at"""
+        with transaction.atomic():
+            self.cascade_restore()
+            invalidate_deleted_counts()
     
     def cascade_restore(self):
         """Restore and reapply balance update"""
-        # Restore the record
+        Weight.check_restore_bill_numbers(Weight.objects.filter(pk=self.pk))
         self.deleted_at = None
-        self.save(update_fields=['deleted_at'])
-        
-        # Reapply balance update
-        if self.mineral_net_weight:
-            self.update_balance()
+        if not self.balance_updated and self.update_balance():
+            self.balance_updated = True
+        DailySummary.apply(Weight.objects.filter(pk=self.pk, deleted_at__isnull=False))
+        self.save(update_fields=['deleted_at', 'balance_updated'])
 
 class Balance(SoftDeleteModel):
     remaining_mineral_amount = models.IntegerField(default=0)  
@@ -687,7 +870,13 @@ class Balance(SoftDeleteModel):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='company_balances')
     mineral = models.ForeignKey(Mineral, on_delete=models.CASCADE, related_name='mineral_balances')
     
-    class Meta:
+    # Compacted journal position: the amount after every movement up to snapshot_movement_id
+    snapshot_amount = models.IntegerField(default=0)
+    snapshot_movement_id = models.BigIntegerField(default=0)
+    snapshot_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta(SoftDeleteModel.Meta):
+        # company+mineral lookups are served by the unique_together index
         unique_together = ['company', 'mineral']
         verbose_name = "Balance"
         verbose_name_plural = "Balances"
@@ -702,6 +891,51 @@ class Balance(SoftDeleteModel):
         
         super().save(*args, **kwargs)
     
+    @classmethod
+    def apply_delta(cls, company_id, mineral_id, delta, source=None, journal=True):
+        """
+        Atomically add delta to the balance of a company-mineral pair.
+        
+        One INSERT ... ON CONFLICT (company_id, mineral_id) DO UPDATE, so
+        concurrent purchases and weights never lose each other's changes and
+        the first write for a pair creates its row. The unique key also covers
+        soft-deleted balances: such a row is revived and the delta added to
+        the amount it held.
+        
+        The change is also appended to the BalanceMovement journal, attributed
+        to source (the purchase or weight causing it). Bulk callers that
+        journal their own movements pass journal=False.
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        company_table = connection.ops.quote_name(Company._meta.db_table)
+        today = timezone.now().date()
+        
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} (
+                        company_id, mineral_id, remaining_mineral_amount, company_type, count_90days,
+                        create_at, update_at, snapshot_amount, snapshot_movement_id, deleted_at
+                    )
+                    VALUES (
+                        %s, %s, %s, COALESCE((SELECT company_type FROM {company_table} WHERE id = %s), ''), %s,
+                        %s, %s, 0, 0, NULL
+                    )
+                    ON CONFLICT (company_id, mineral_id) DO UPDATE SET
+                        remaining_mineral_amount = {table}.remaining_mineral_amount + EXCLUDED.remaining_mineral_amount,
+                        update_at = EXCLUDED.update_at,
+                        deleted_at = NULL
+                    """,
+                    [
+                        company_id, mineral_id, delta, company_id,
+                        cls._meta.get_field('count_90days').default, today, today,
+                    ],
+                )
+            
+            if journal:
+                BalanceMovement.objects.create(**BalanceMovement.describe(company_id, mineral_id, delta, source))
+    
     def get_balance_status(self):
         """Get the balance status"""
         if self.remaining_mineral_amount > 0:
@@ -711,6 +945,183 @@ class Balance(SoftDeleteModel):
         else:
             return "NEGATIVE"
 
+class BalanceMovement(models.Model):
+    """Append-only journal of every change to a company-mineral balance"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='balance_movements')
+    mineral = models.ForeignKey(Mineral, on_delete=models.CASCADE, related_name='balance_movements')
+    delta = models.IntegerField()
+    source_model = models.CharField(max_length=50, blank=True)  # 'Purchase', 'Weight', 'opening', 'recalculate', 'manual'
+    source_id = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'mineral', 'id'], name='movement_balance_idx'),
+            models.Index(fields=['company', 'mineral', 'created_at'], name='movement_balance_time_idx'),
+            models.Index(fields=['source_model', 'source_id'], name='movement_source_idx'),
+            # All-pairs day ranges for the balance checkpoints
+            models.Index(fields=['created_at'], name='movement_created_idx'),
+        ]
+        verbose_name = "Balance Movement"
+        verbose_name_plural = "Balance Movements"
+    
+    def __str__(self):
+        return f"{self.company_id}/{self.mineral_id}: {self.delta:+d} ({self.source_model} {self.source_id or ''})"
+    
+    @staticmethod
+    def describe(company_id, mineral_id, delta, source=None):
+        """Field values for a movement; source is a model instance or a label such as 'manual'"""
+        if isinstance(source, models.Model):
+            source_model, source_id = source.__class__.__name__, source.pk
+        else:
+            source_model, source_id = source or '', None
+        return {
+            'company_id': company_id,
+            'mineral_id': mineral_id,
+            'delta': delta,
+            'source_model': source_model,
+            'source_id': source_id,
+        }
+
+class BalanceCheckpoint(models.Model):
+    """
+    Journaled amount of a company-mineral balance at the end of a day.
+    
+    amount is the sum of the BalanceMovement deltas recorded up to the end of
+    day, so point-in-time balances start from the latest checkpoint on or
+    before the requested day and only add the movements after it. The
+    journal is append-only, so a checkpoint never goes stale.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    mineral = models.ForeignKey(Mineral, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    day = models.DateField()
+    amount = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'mineral', 'day'], name='balance_checkpoint_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='balance_checkpoint_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.company_id}/{self.mineral_id} @ {self.day}: {self.amount}"
+
+class DailySummary(models.Model):
+    """
+    Active weight tickets and purchases rolled up per day, scale, mineral and company.
+    
+    Kept in step with every create, edit, soft delete and restore through
+    apply(), so reports aggregate these rows instead of the tickets. Weights
+    are counted under the company of their purchase. The
+    rebuild_daily_summaries command recomputes them from scratch.
+    """
+    day = models.DateField()
+    scale = models.ForeignKey(Scale, on_delete=models.CASCADE, null=True, blank=True, related_name='daily_summaries')
+    mineral = models.ForeignKey(Mineral, on_delete=models.CASCADE, null=True, blank=True, related_name='daily_summaries')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True, related_name='daily_summaries')
+    
+    weight_count = models.IntegerField(default=0)
+    net_weight = models.BigIntegerField(default=0)
+    second_weight = models.BigIntegerField(default=0)
+    control_weight = models.BigIntegerField(default=0)
+    purchase_count = models.IntegerField(default=0)
+    purchased_amount = models.BigIntegerField(default=0)
+    purchased_total_price = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    WEIGHT_TOTALS = {
+        'weight_count': Count('id'),
+        'net_weight': Sum('mineral_net_weight'),
+        'second_weight': Sum('second_weight'),
+        'control_weight': Sum('control_weight'),
+    }
+    PURCHASE_TOTALS = {
+        'purchase_count': Count('id'),
+        'purchased_amount': Sum('mineral_amount'),
+        'purchased_total_price': Sum('mineral_total_price'),
+    }
+    
+    class Meta:
+        constraints = [
+            # A missing scale, mineral or company is one bucket, not distinct NULLs
+            models.UniqueConstraint(
+                'day', Coalesce('scale', 0), Coalesce('mineral', 0), Coalesce('company', 0),
+                name='daily_summary_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['mineral', 'day'], name='daily_summary_mineral_idx'),
+            models.Index(fields=['company', 'day'], name='daily_summary_company_idx'),
+        ]
+        verbose_name = "Daily Summary"
+        verbose_name_plural = "Daily Summaries"
+    
+    def __str__(self):
+        return f"{self.day} scale {self.scale_id} / mineral {self.mineral_id} / company {self.company_id}"
+    
+    @classmethod
+    def totals_of(cls, queryset):
+        """Summary totals of a Purchase or Weight queryset, grouped by summary key in one query"""
+        if queryset.model is Purchase:
+            return queryset.values('create_at', 'scale_id', 'mineral_id', 'company_id').annotate(
+                **cls.PURCHASE_TOTALS
+            ).order_by()
+        return queryset.values(
+            'create_at', 'scale_id', 'mineral_id', company_id=F('purchase__company_id')
+        ).annotate(**cls.WEIGHT_TOTALS).order_by()
+    
+    @classmethod
+    def apply(cls, queryset, sign=1):
+        """
+        Add (sign=1) or take off (sign=-1) the Purchase or Weight rows of queryset.
+        
+        Call it before changing deleted_at on the same queryset. Each summary
+        row is moved with one F() UPDATE, inserted when missing the same way
+        as Balance.apply_delta, and rows left empty are dropped. Returns the
+        number of summary rows touched.
+        """
+        groups = list(cls.totals_of(queryset))
+        if not groups:
+            return 0
+        
+        now = timezone.now()
+        keys = []
+        with transaction.atomic():
+            for group in groups:
+                key = {
+                    'day': group.pop('create_at'),
+                    'scale_id': group.pop('scale_id'),
+                    'mineral_id': group.pop('mineral_id'),
+                    'company_id': group.pop('company_id'),
+                }
+                keys.append(key)
+                totals = {field: (value or 0) * sign for field, value in group.items()}
+                
+                def increment():
+                    return cls.objects.filter(**key).update(
+                        updated_at=now,
+                        **{field: F(field) + value for field, value in totals.items()},
+                    )
+                
+                if not increment():
+                    try:
+                        with transaction.atomic():
+                            cls.objects.create(**key, **totals)
+                    except IntegrityError:
+                        if not increment():
+                            raise
+            
+            if sign < 0:
+                cls.objects.filter(
+                    day__in={key['day'] for key in keys},
+                    weight_count=0,
+                    purchase_count=0,
+                ).delete()
+        return len(keys)
+
 class Momp(SoftDeleteModel):
     E_name = models.CharField(max_length=255)
     momp = models.CharField(max_length=255)
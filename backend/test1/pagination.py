@@ -0,0 +1,135 @@
+# pagination.py - list pagination for the high-volume endpoints
+import base64
+import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def is_truthy(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination on (create_at, id), newest first.
+
+    The cursor carries the (create_at, id) of the last row served, so every
+    page is a range scan of the (create_at, id) index instead of an OFFSET.
+    The response keeps the page-number shape (count/next/previous/results);
+    pass ?count=false to skip the COUNT(*) and get "count": null.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, row, reverse):
+        raw = f"{'p' if reverse else 'n'}|{row.create_at.isoformat()}|{row.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            direction, create_at, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            if direction not in ('n', 'p'):
+                raise ValueError(direction)
+            return direction == 'p', datetime.date.fromisoformat(create_at), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        if is_truthy(request.query_params.get(self.count_query_param, 'true')):
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[0])
+
+        if cursor is None:
+            queryset = queryset.order_by('-create_at', '-pk')
+        elif reverse:
+            _, create_at, pk = cursor
+            queryset = queryset.filter(
+                Q(create_at__gt=create_at) | Q(create_at=create_at, pk__gt=pk)
+            ).order_by('create_at', 'pk')
+        else:
+            _, create_at, pk = cursor
+            queryset = queryset.filter(
+                Q(create_at__lt=create_at) | Q(create_at=create_at, pk__lt=pk)
+            ).order_by('-create_at', '-pk')
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Moving backwards, "more" means older pages exist beyond the first row
+        # served; a cursor always implies the page it came from exists.
+        self.has_next = bool(rows) and (reverse or has_more)
+        self.has_previous = bool(rows) and cursor is not None and (has_more or not reverse)
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1], False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[0], True))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return PageNumberPagination().get_paginated_response_schema(schema)
+
+
+class ListPagination(PageNumberPagination):
+    """
+    Page-number pagination that switches to KeysetPagination when the
+    request carries a ?cursor= parameter (empty for the first page).
+
+    Existing ?page=N clients keep working unchanged; clients paging through
+    the full history send ?cursor= and follow the next links.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,158 @@
+# recycle.py - set-based restore and permanent delete for the recycle bin
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from .bulk import apply_balance_deltas
+from .deleted_counts import invalidate_deleted_counts
+from .models import (
+    Balance, BalanceMovement, Company, DeletedRelationship, Maktoob, Mineral, Momp, Purchase,
+    Scale, Unit, Vehicle, VehicleType, Weight, set_deleted_at,
+)
+from .reference_cache import invalidate_reference_cache
+
+MODEL_MAP = {
+    'companies': Company,
+    'vehicles': Vehicle,
+    'maktoobs': Maktoob,
+    'purchases': Purchase,
+    'units': Unit,
+    'minerals': Mineral,
+    'vehicle-types': VehicleType,
+    'scales': Scale,
+    'weights': Weight,
+    'balances': Balance,
+    'momps': Momp,
+}
+
+# Rows brought back with each model, mirroring its cascade_restore():
+# (related model, lookup from the related model to the restored records)
+RESTORE_CASCADES = {
+    Unit: [(Mineral, 'unit')],
+    Mineral: [(Purchase, 'mineral'), (Weight, 'mineral')],
+    VehicleType: [(Vehicle, 'vehicle_type')],
+    Vehicle: [(Weight, 'vehicle')],
+    Company: [(Maktoob, 'company'), (Purchase, 'company'), (Weight, 'purchase__company'), (Balance, 'company')],
+    Scale: [(Purchase, 'scale'), (Weight, 'scale'), (Momp, 'scale')],
+    Maktoob: [(Purchase, 'maktoob')],
+    Purchase: [(Weight, 'purchase')],
+}
+
+
+def get_balance_rows(model, ids):
+    """
+    Balance contribution of each deleted Purchase / Weight record.
+
+    Returns (record_id, company_id, mineral_id, delta, balance_updated) with
+    the same sign convention as the models' update_balance(): purchases add
+    their amount, weights subtract their net weight.
+    """
+    if model is Purchase:
+        rows = model.objects.filter(id__in=ids).values_list(
+            'id', 'company_id', 'mineral_id', 'mineral_amount', 'balance_updated',
+        )
+        return [(pk, company, mineral, amount or 0, updated) for pk, company, mineral, amount, updated in rows]
+
+    rows = model.objects.filter(id__in=ids).values_list(
+        'id', 'purchase__company_id', 'mineral_id', 'mineral_net_weight', 'balance_updated',
+    )
+    return [(pk, company, mineral, -(amount or 0), updated) for pk, company, mineral, amount, updated in rows]
+
+
+def bulk_restore(model, record_ids):
+    """
+    Restore the deleted records of one model with a fixed number of queries.
+
+    Records are restored with one UPDATE, each cascade of the model's
+    cascade_restore() with one UPDATE per related model, and tracked company
+    vehicles are re-linked in bulk. Purchases and weights that are not
+    counted in their balance are re-added with one summed delta per
+    (company, mineral) pair instead of one balance write per record, and
+    daily summaries move with one grouped aggregate per restored model.
+    Returns the restore statistics.
+    """
+    started = time.perf_counter()
+    stats = {'model': model.__name__, 'requested': len(record_ids), 'cascaded': {}}
+
+    with transaction.atomic():
+        ids = list(model.get_deleted_objects().filter(id__in=record_ids).values_list('id', flat=True))
+        stats['restored_count'] = len(ids)
+
+        deltas = defaultdict(int)
+        movements = []
+        if ids and model in (Purchase, Weight):
+            for pk, company_id, mineral_id, delta, balance_updated in get_balance_rows(model, ids):
+                if company_id and mineral_id and delta and not balance_updated:
+                    deltas[(company_id, mineral_id)] += delta
+                    movements.append(BalanceMovement(
+                        company_id=company_id,
+                        mineral_id=mineral_id,
+                        delta=delta,
+                        source_model=model.__name__,
+                        source_id=pk,
+                    ))
+        applied_ids = [movement.source_id for movement in movements]
+
+        if ids:
+            set_deleted_at(model.objects.filter(id__in=ids), None)
+            if applied_ids:
+                model.objects.filter(id__in=applied_ids).update(balance_updated=True)
+
+            for related_model, lookup in RESTORE_CASCADES.get(model, []):
+                stats['cascaded'][related_model.__name__] = set_deleted_at(
+                    related_model.objects.filter(**{f'{lookup}__in': ids}, deleted_at__isnull=False),
+                    None,
+                )
+
+            if model is Company:
+                stats['restored_vehicles'] = len(Company.restore_tracked_vehicles(ids))
+
+            apply_balance_deltas(deltas, movements)
+
+        stats['balances_updated'] = len([delta for delta in deltas.values() if delta])
+        invalidate_deleted_counts()
+        invalidate_reference_cache()
+
+    stats['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return stats
+
+
+def bulk_permanent_delete(model, record_ids):
+    """
+    Hard delete the deleted records of one model.
+
+    Uses a single queryset delete, so Django's collector works per related
+    model rather than per record, and drops the relationship tracking rows
+    of the deleted records in one statement. Balances are left as they are:
+    records in the recycle bin have already been reversed by soft delete,
+    or belong to a company whose balances were soft deleted with it.
+    Returns the delete statistics.
+    """
+    started = time.perf_counter()
+    stats = {'model': model.__name__, 'requested': len(record_ids)}
+
+    with transaction.atomic():
+        ids = list(model.get_deleted_objects().filter(id__in=record_ids).values_list('id', flat=True))
+        stats['deleted_count'] = len(ids)
+
+        if ids:
+            _, per_model = model.objects.filter(id__in=ids).delete()
+            stats['cascaded'] = {
+                label.split('.')[-1]: count
+                for label, count in per_model.items()
+                if label != model._meta.label
+            }
+            DeletedRelationship.objects.filter(
+                Q(model_name=model.__name__, model_id__in=ids)
+                | Q(related_model=model.__name__, related_id__in=ids)
+            ).delete()
+        else:
+            stats['cascaded'] = {}
+
+        invalidate_deleted_counts()
+        invalidate_reference_cache()
+
+    stats['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return stats
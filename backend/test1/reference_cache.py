@@ -0,0 +1,126 @@
+# reference_cache.py - cached list/retrieve responses for small lookup tables
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+VERSION_KEY = 'test1:reference:version'
+HITS_KEY = 'test1:reference:hits'
+MISSES_KEY = 'test1:reference:misses'
+
+
+def get_reference_models():
+    """Models whose list/retrieve responses are cached"""
+    from .models import Unit, Mineral, VehicleType, Scale
+
+    return [Unit, Mineral, VehicleType, Scale]
+
+
+def new_version():
+    # Seeded from the clock so a version lost to eviction never reuses an old number
+    return int(time.time() * 1000)
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, new_version(), None)
+
+
+def invalidate_reference_cache(**kwargs):
+    """
+    Drop every cached reference response once the current transaction commits.
+
+    Entries are keyed by a shared version number, so invalidation is one
+    counter increment; stale entries simply stop being read and expire.
+    Connected to save/delete of the reference models and called from soft
+    delete and restore, whose cascades write with queryset.update().
+    """
+    transaction.on_commit(bump_version)
+
+
+def connect_signals():
+    for model in get_reference_models():
+        post_save.connect(invalidate_reference_cache, sender=model, dispatch_uid=f'reference_cache_save_{model.__name__}')
+        post_delete.connect(invalidate_reference_cache, sender=model, dispatch_uid=f'reference_cache_delete_{model.__name__}')
+
+
+def record(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_stats():
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+        'version': cache.get(VERSION_KEY),
+        'backend': settings.CACHES['default']['BACKEND'],
+    }
+
+
+class ReferenceCacheViewSetMixin:
+    """Serve list and retrieve from the cache, with ETag / If-None-Match support.
+
+    Responses are stored per path + query string under the current version
+    and carry an ETag; a client sending it back gets 304 Not Modified.
+    """
+
+    def get_cache_key(self, request):
+        query = request.GET.urlencode()
+        path_key = hashlib.md5(f'{request.get_host()}{request.path}?{query}'.encode()).hexdigest()
+        return f'test1:reference:{get_version()}:{self.basename}:{path_key}'
+
+    def cached_response(self, request, build_response):
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+
+        if entry is None:
+            record(MISSES_KEY)
+            response = build_response()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            body = json.dumps(response.data, cls=JSONEncoder, sort_keys=True)
+            entry = {
+                'data': response.data,
+                'etag': '"%s"' % hashlib.md5(body.encode()).hexdigest(),
+            }
+            cache.set(key, entry, getattr(settings, 'REFERENCE_CACHE_TIMEOUT', 300))
+            cache_status = 'MISS'
+        else:
+            record(HITS_KEY)
+            cache_status = 'HIT'
+
+        headers = {'ETag': entry['etag'], 'X-Cache': cache_status}
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if entry['etag'] in [tag.strip() for tag in if_none_match.split(',')]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(entry['data'], headers=headers)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(ReferenceCacheViewSetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(ReferenceCacheViewSetMixin, self).retrieve(request, *args, **kwargs))
@@ -1,11 +1,14 @@
 # serializers.py - FIXED VERSION
 from rest_framework import serializers
 from djoser.serializers import UserSerializer as BaseUserSerializer, UserCreateSerializer as BasedUserCreateSerializer
-from .models import Unit, Mineral, VehicleType, Vehicle, Company, Scale, Maktoob, Purchase, Weight, Balance, Momp, Userprofile
+from .models import Unit, Mineral, VehicleType, Vehicle, Company, Scale, Maktoob, Purchase, Weight, Balance, BalanceMovement, Momp, Userprofile
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
 from django.utils import timezone
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .availability import check_ticket
+from .journal import reset_snapshots
 
 User = get_user_model()
 
@@ -204,8 +207,52 @@ class MaktoobSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['deleted_at']
 
-class PurchaseSerializer(serializers.ModelSerializer):
+class ExpandableFieldsMixin:
+    """Inline related objects named in ?expand=a,b instead of their ids.
+    
+    expandable_fields maps an output key to (source path, serializer,
+    prefetch paths). Views call expand_queryset() so every expanded object
+    comes from select_related/prefetch_related rather than a query per row;
+    fields that are not expanded keep their plain id output.
+    """
+    expandable_fields = {}
+    
+    @classmethod
+    def get_expand(cls, request):
+        if request is None:
+            return []
+        requested = request.query_params.get('expand', '').split(',')
+        return [name for name in cls.expandable_fields if name in {item.strip() for item in requested}]
+    
+    @classmethod
+    def expand_queryset(cls, queryset, request):
+        """Join or prefetch everything the requested expansions will read"""
+        for name in cls.get_expand(request):
+            source, _, prefetch = cls.expandable_fields[name]
+            queryset = queryset.select_related(source.replace('.', '__'))
+            if prefetch:
+                queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+    
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        for name in self.get_expand(self.context.get('request')):
+            source, serializer_class, _ = self.expandable_fields[name]
+            related = instance
+            for attr in source.split('.'):
+                related = getattr(related, attr, None) if related is not None else None
+            representation[name] = serializer_class(related, context=self.context).data if related is not None else None
+        return representation
+
+class PurchaseSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     current_balance = serializers.SerializerMethodField(read_only=True)
+    expandable_fields = {
+        'company': ('company', CompanySerializer, ['company__vehicle']),
+        'mineral': ('mineral', MineralSerializer, []),
+        'maktoob': ('maktoob', MaktoobSerializer, []),
+        'scale': ('scale', ScaleSerializer, []),
+        'unit': ('unit', UnitSerializer, []),
+    }
     
     class Meta:
         model = Purchase
@@ -214,6 +261,10 @@ class PurchaseSerializer(serializers.ModelSerializer):
     
     def get_current_balance(self, obj):
         """Get current balance for display"""
+        # List/retrieve querysets annotate the balance to avoid a query per row
+        if hasattr(obj, 'current_balance_amount'):
+            return obj.current_balance_amount or 0
+        
         try:
             if obj.pk and obj.company and obj.mineral:
                 # Get the ONE balance record
@@ -230,9 +281,16 @@ class PurchaseSerializer(serializers.ModelSerializer):
         
         return 0
 
-class WeightSerializer(serializers.ModelSerializer):
+class WeightSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     purchase_mineral_amount = serializers.IntegerField(source='purchase.mineral_amount', read_only=True, allow_null=True)
     current_balance = serializers.SerializerMethodField(read_only=True)
+    expandable_fields = {
+        'company': ('purchase.company', CompanySerializer, ['purchase__company__vehicle']),
+        'mineral': ('mineral', MineralSerializer, []),
+        'scale': ('scale', ScaleSerializer, []),
+        'vehicle': ('vehicle', VehicleSerializer, ['vehicle__vehicle_type', 'vehicle__companies']),
+        'unit': ('unit', UnitSerializer, []),
+    }
     
     class Meta:
         model = Weight
@@ -241,6 +299,10 @@ class WeightSerializer(serializers.ModelSerializer):
     
     def get_current_balance(self, obj):
         """Get current balance for display"""
+        # List/retrieve querysets annotate the balance to avoid a query per row
+        if hasattr(obj, 'current_balance_amount'):
+            return obj.current_balance_amount or 0
+        
         try:
             if obj.pk and obj.purchase and obj.mineral:
                 # Get the ONE balance record
@@ -256,36 +318,81 @@ class WeightSerializer(serializers.ModelSerializer):
             print(f"Error getting current balance: {str(e)}")
         
         return 0
-    
+
+    def validate_bill_number(self, value):
+        """Bill numbers are unique across active weights"""
+        exclude_pk = self.instance.pk if self.instance else None
+        if value and Weight.get_existing_bill_numbers([value], exclude_pk=exclude_pk):
+            raise serializers.ValidationError(f'A weight with bill number {value} already exists.')
+        return value
+
     def validate(self, data):
         """Validate that weight doesn't exceed available balance"""
         # Call parent validation
         data = super().validate(data)
         
         # Check if this is a new weight
-        if not self.instance:  # New weight being created
+        if not self.instance and not self.context.get('skip_balance_check'):
             purchase = data.get('purchase')
             mineral = data.get('mineral')
             mineral_net_weight = data.get('mineral_net_weight', 0)
             
             if purchase and mineral and mineral_net_weight > 0:
-                # Get current balance (ONE record)
-                balance = Balance.objects.filter(
-                    company=purchase.company,
-                    mineral=mineral,
-                    deleted_at__isnull=True
-                ).first()
+                result = check_ticket(purchase.pk, mineral.pk, mineral_net_weight)
                 
-                current_balance = balance.remaining_mineral_amount if balance else 0
+                # The purchase or balance could not be checked at all
+                if 'error' in result:
+                    raise serializers.ValidationError(result['error'])
                 
                 # Check if weight exceeds balance
-                if mineral_net_weight > current_balance:
+                if not result['can_add']:
+                    current_balance = result.get('current_balance', 0)
                     raise serializers.ValidationError({
                         'mineral_net_weight': f'Insufficient mineral balance. Available: {current_balance}, Required: {mineral_net_weight}'
                     })
         
         return data
 
+class WeightTicketSerializer(serializers.ModelSerializer):
+    """Field validation for one ticket of a bulk scale upload.
+    
+    Related objects are plain ids here; the bulk ingestion resolves them and
+    checks balances for the whole batch at once instead of per ticket.
+    """
+    purchase = serializers.IntegerField(required=False, allow_null=True)
+    mineral = serializers.IntegerField(required=False, allow_null=True)
+    vehicle = serializers.IntegerField(required=False, allow_null=True)
+    scale = serializers.IntegerField(required=False, allow_null=True)
+    unit = serializers.IntegerField(required=False, allow_null=True)
+    
+    class Meta:
+        model = Weight
+        fields = [
+            'second_weight', 'mineral_net_weight', 'control_weight',
+            'area', 'discharge_place', 'bill_number',
+            'purchase', 'mineral', 'vehicle', 'scale', 'unit'
+        ]
+
+class PurchaseImportRowSerializer(serializers.ModelSerializer):
+    """Field validation for one spreadsheet row of a purchase import.
+    
+    Companies are referenced by TIN number and the other relations by name,
+    number or id; the import resolves them through preloaded lookups.
+    """
+    TIN_number = serializers.CharField()
+    mineral = serializers.CharField()
+    maktoob_number = serializers.IntegerField(required=False, allow_null=True)
+    scale = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    unit = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    
+    class Meta:
+        model = Purchase
+        fields = [
+            'area', 'mineral_amount', 'unit_price', 'mineral_total_price',
+            'royalty_receipt_number', 'weighing_total_price', 'haq_wazan_receipt_number',
+            'TIN_number', 'mineral', 'maktoob_number', 'scale', 'unit'
+        ]
+
 class BalanceSerializer(serializers.ModelSerializer):
     company_name = serializers.CharField(source='company.company_name', read_only=True)
     mineral_name = serializers.CharField(source='mineral.name', read_only=True)
@@ -303,6 +410,37 @@ class BalanceSerializer(serializers.ModelSerializer):
     
     def get_status(self, obj):
         return obj.get_balance_status()
+    
+    def create(self, validated_data):
+        """Journal the opening amount of a manually created balance"""
+        with transaction.atomic():
+            balance = super().create(validated_data)
+            self.journal_change(None, balance)
+        return balance
+    
+    def update(self, instance, validated_data):
+        """Journal manual edits so they are not reported as drift"""
+        before = (instance.company_id, instance.mineral_id, instance.remaining_mineral_amount)
+        with transaction.atomic():
+            balance = super().update(instance, validated_data)
+            self.journal_change(before, balance)
+        return balance
+    
+    def journal_change(self, before, balance):
+        company_id, mineral_id, amount = before or (balance.company_id, balance.mineral_id, 0)
+        if (company_id, mineral_id) == (balance.company_id, balance.mineral_id):
+            changes = [(company_id, mineral_id, balance.remaining_mineral_amount - amount)]
+        else:
+            # Moved to another company/mineral: take it off the old journal, add it to the new one
+            changes = [(company_id, mineral_id, -amount), (balance.company_id, balance.mineral_id, balance.remaining_mineral_amount)]
+        BalanceMovement.objects.bulk_create([
+            BalanceMovement(**BalanceMovement.describe(*change, 'manual'))
+            for change in changes
+            if change[2]
+        ])
+        if len(changes) > 1:
+            # The row's snapshot still describes its old pair's journal
+            reset_snapshots(Balance.objects.filter(pk=balance.pk))
 
 class MompSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,131 @@
+# summaries.py - daily scale/mineral/company rollups behind the reports
+import time
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+from .models import DailySummary, Purchase, Weight
+
+SUMMARY_TOTALS = [
+    'weight_count', 'net_weight', 'second_weight', 'control_weight',
+    'purchase_count', 'purchased_amount', 'purchased_total_price',
+]
+
+# group_by name -> summary column (or expression) and the name column shown with it
+GROUPINGS = {
+    'day': ('day', None),
+    'month': (TruncMonth('day'), None),
+    'scale': ('scale_id', 'scale__name'),
+    'mineral': ('mineral_id', 'mineral__name'),
+    'company': ('company_id', 'company__company_name'),
+}
+
+
+def rebuild_daily_summaries(date_from=None, date_to=None, batch_size=1000):
+    """
+    Recompute the daily summaries from active purchases and weights.
+
+    Each source table is aggregated once with DailySummary.totals_of, and
+    the summaries of the date range are replaced in one transaction.
+    Returns statistics.
+    """
+    started = time.perf_counter()
+    purchases = Purchase.get_active_objects()
+    weights = Weight.get_active_objects()
+    summaries = DailySummary.objects.all()
+    if date_from:
+        purchases = purchases.filter(create_at__gte=date_from)
+        weights = weights.filter(create_at__gte=date_from)
+        summaries = summaries.filter(day__gte=date_from)
+    if date_to:
+        purchases = purchases.filter(create_at__lte=date_to)
+        weights = weights.filter(create_at__lte=date_to)
+        summaries = summaries.filter(day__lte=date_to)
+
+    rows = {}
+    for queryset in (purchases, weights):
+        for group in DailySummary.totals_of(queryset):
+            key = (group.pop('create_at'), group.pop('scale_id'), group.pop('mineral_id'), group.pop('company_id'))
+            rows.setdefault(key, {}).update({field: value or 0 for field, value in group.items()})
+    aggregated_at = time.perf_counter()
+
+    with transaction.atomic():
+        deleted = summaries.delete()[0]
+        DailySummary.objects.bulk_create(
+            [
+                DailySummary(day=day, scale_id=scale_id, mineral_id=mineral_id, company_id=company_id, **totals)
+                for (day, scale_id, mineral_id, company_id), totals in rows.items()
+            ],
+            batch_size=batch_size,
+        )
+
+    finished = time.perf_counter()
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'summaries_deleted': deleted,
+        'summaries_written': len(rows),
+        'aggregate_ms': round((aggregated_at - started) * 1000, 2),
+        'write_ms': round((finished - aggregated_at) * 1000, 2),
+        'total_ms': round((finished - started) * 1000, 2),
+    }
+
+
+def get_summary_report(group_by, date_from=None, date_to=None, company_id=None, mineral_id=None, scale_id=None):
+    """
+    Report totals grouped by any of day, month, scale, mineral and company.
+
+    One grouped aggregate over the summary rows; the date filters apply to
+    the day of the purchases and weights. Raises ValueError for an unknown
+    grouping.
+    """
+    unknown = [name for name in group_by if name not in GROUPINGS]
+    if unknown:
+        raise ValueError(f"Unknown group_by {', '.join(unknown)}; use {', '.join(GROUPINGS)}")
+
+    summaries = DailySummary.objects.all()
+    if date_from:
+        summaries = summaries.filter(day__gte=date_from)
+    if date_to:
+        summaries = summaries.filter(day__lte=date_to)
+    if company_id:
+        summaries = summaries.filter(company_id=company_id)
+    if mineral_id:
+        summaries = summaries.filter(mineral_id=mineral_id)
+    if scale_id:
+        summaries = summaries.filter(scale_id=scale_id)
+
+    columns = []
+    for name in group_by:
+        column, label = GROUPINGS[name]
+        if isinstance(column, str):
+            columns.append(column)
+        else:
+            summaries = summaries.annotate(**{name: column})
+            columns.append(name)
+        if label:
+            columns.append(label)
+
+    rows = summaries.values(*columns).annotate(
+        **{f'sum_{field}': Sum(field) for field in SUMMARY_TOTALS}
+    ).order_by(*columns)
+
+    return [
+        {
+            **{column: row[column] for column in columns},
+            **{field: row[f'sum_{field}'] or 0 for field in SUMMARY_TOTALS},
+        }
+        for row in rows
+    ]
+
+
+def get_pair_totals():
+    """Purchased and weighed totals and counts per (company_id, mineral_id), from the summaries"""
+    rows = DailySummary.objects.values('company_id', 'mineral_id').annotate(
+        purchased=Sum('purchased_amount'),
+        weighed=Sum('net_weight'),
+        purchases=Sum('purchase_count'),
+        weights=Sum('weight_count'),
+    ).order_by()
+    return {(row['company_id'], row['mineral_id']): row for row in rows}
@@ -1,3 +1,1346 @@
+import csv
+import datetime
+import importlib.util
+import io
+import json
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import Q, Sum
+from django.http import StreamingHttpResponse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Unit, Mineral, Company, Vehicle, Maktoob, Purchase, Weight, Balance, BalanceMovement, BalanceCheckpoint, DailySummary
+from .balances import recalculate_balances
+from .authentication import load_cached_user, user_cache_key
+from .bulk import import_purchases, read_spreadsheet_rows
+from .deleted_counts import count_all
+from .journal import compact_balances, get_balance_drift
+from .checkpoints import build_checkpoints, get_balance_as_of, get_balance_series
+from .recycle import bulk_restore
+from .summaries import rebuild_daily_summaries
+from .serializers import BalanceSerializer
+from .views import CompanyViewSet, MaktoobViewSet, PurchaseViewSet, ScaleViewSet, VehicleViewSet, WeightViewSet
+
+User = get_user_model()
+# Migration modules start with a digit and cannot be imported with a from-import
+open_journal = importlib.import_module('.migrations.0032_balance_movement_journal', __package__).open_journal
+
+
+class BalanceFixtureMixin:
+    """Shared company/mineral/purchase setup for balance related tests"""
+
+    def create_company(self, index):
+        return Company.objects.create(
+            company_name=f'Company {index}',
+            leader_name='Leader',
+            phone='0700000000',
+            licence_number=f'LIC-{index}',
+            TIN_number=f'TIN-{index}',
+        )
+
+    def create_purchase(self, company, mineral, amount=1000):
+        return Purchase.objects.create(
+            area='Area',
+            mineral_amount=amount,
+            unit_price=10,
+            mineral_total_price=amount * 10,
+            royalty_receipt_number=1,
+            weighing_total_price=1,
+            haq_wazan_receipt_number=1,
+            company=company,
+            mineral=mineral,
+        )
+
+    def create_weight(self, purchase, amount=10, bill_number='BILL'):
+        return Weight.objects.create(
+            second_weight=amount + 100,
+            mineral_net_weight=amount,
+            control_weight=100,
+            area='Area',
+            discharge_place='Yard',
+            bill_number=bill_number,
+            purchase=purchase,
+            mineral=purchase.mineral,
+        )
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        unit = Unit.objects.create(name='Ton', weighing_price=1)
+        self.mineral = Mineral.objects.create(name='Coal', unit_price=1, mineral_description='Coal', unit=unit)
+
+
+class BalanceApplyDeltaTests(BalanceFixtureMixin, TestCase):
+    """Balance.apply_delta upserts on (company, mineral), reviving soft-deleted rows"""
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.create_company(0)
+
+    def balance(self):
+        return Balance.objects.get(company=self.company, mineral=self.mineral)
+
+    def test_first_write_creates_the_row(self):
+        Balance.apply_delta(self.company.pk, self.mineral.pk, 250)
+        Balance.apply_delta(self.company.pk, self.mineral.pk, -50)
+
+        balance = self.balance()
+        self.assertEqual(balance.remaining_mineral_amount, 200)
+        self.assertEqual(balance.company_type, self.company.company_type)
+
+    def test_purchase_paths_after_balance_soft_delete(self):
+        purchase = self.create_purchase(self.company, self.mineral, amount=1000)
+        response = self.client.delete(f'/api/balances/{self.balance().pk}/')
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.delete(f'/api/purchases/{purchase.pk}/')
+        self.assertEqual(response.status_code, 204)
+        balance = self.balance()
+        self.assertIsNone(balance.deleted_at)
+        self.assertEqual(balance.remaining_mineral_amount, 0)
+
+        purchase.refresh_from_db()
+        purchase.restore()
+        self.assertEqual(self.balance().remaining_mineral_amount, 1000)
+
+        self.create_purchase(self.company, self.mineral, amount=500)
+        self.assertEqual(self.balance().remaining_mineral_amount, 1500)
+        self.assertEqual(Balance.objects.filter(company=self.company, mineral=self.mineral).count(), 1)
+
+    def test_weight_reverse_and_restore(self):
+        purchase = self.create_purchase(self.company, self.mineral, amount=1000)
+        weight = self.create_weight(purchase, amount=100)
+        self.balance().soft_delete()
+
+        weight.soft_delete()
+        self.assertEqual(self.balance().remaining_mineral_amount, 1000)
+        weight.restore()
+        balance = self.balance()
+        self.assertIsNone(balance.deleted_at)
+        self.assertEqual(balance.remaining_mineral_amount, 900)
+
+
+class RecalculateBalancesTests(BalanceFixtureMixin, TestCase):
+    """The grouped recalculation matches per-pair totals and keeps emptied balances usable"""
+
+    def setUp(self):
+        super().setUp()
+        self.companies = [self.create_company(i) for i in range(3)]
+        self.purchases = [self.create_purchase(company, self.mineral, amount=1000) for company in self.companies]
+        self.create_weight(self.purchases[0], amount=100, bill_number='B0')
+        self.create_weight(self.purchases[1], amount=300, bill_number='B1')
+        # Let the stored balances drift so the rebuild has something to correct
+        Balance.objects.update(remaining_mineral_amount=5)
+
+    def per_pair_totals(self):
+        """What the old company x mineral loop computed, one aggregate per pair"""
+        totals = {}
+        for company in Company.get_active_objects():
+            purchased = Purchase.get_active_objects().filter(
+                company=company, mineral=self.mineral,
+            ).aggregate(total=Sum('mineral_amount'))['total'] or 0
+            weighed = Weight.get_active_objects().filter(
+                purchase__company=company, mineral=self.mineral,
+            ).aggregate(total=Sum('mineral_net_weight'))['total'] or 0
+            totals[company.pk] = purchased - weighed
+        return totals
+
+    def active_balances(self):
+        return dict(Balance.get_active_objects().values_list('company_id', 'remaining_mineral_amount'))
+
+    def test_matches_per_pair_totals(self):
+        stats = recalculate_balances()
+
+        self.assertEqual(self.active_balances(), self.per_pair_totals())
+        self.assertEqual(stats['balances_written'], 3)
+        self.assertEqual(stats['balances_corrected'], 3)
+        self.assertEqual(stats['balances_zeroed'], 0)
+
+    def test_emptied_pair_is_zeroed_not_deleted(self):
+        self.purchases[2].soft_delete()
+        stats = recalculate_balances()
+
+        self.assertEqual(stats['balances_zeroed'], 1)
+        self.assertEqual(self.active_balances(), self.per_pair_totals())
+        self.assertEqual(self.active_balances()[self.companies[2].pk], 0)
+
+        self.create_purchase(self.companies[2], self.mineral, amount=400)
+        self.assertEqual(self.active_balances()[self.companies[2].pk], 400)
+
+    def test_dry_run_command_and_view(self):
+        output = io.StringIO()
+        call_command('recalculate_balances', '--dry-run', stdout=output)
+        self.assertIn('dry_run: True', output.getvalue())
+        self.assertEqual(set(self.active_balances().values()), {5})
+
+        response = self.client.post('/api/recalculate-balances/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['active_balances'], 3)
+        self.assertEqual(self.active_balances(), self.per_pair_totals())
+
+
+class BalanceReportTests(BalanceFixtureMixin, TestCase):
+    """company_report keeps its per-balance list next to the grouped totals"""
+
+    def setUp(self):
+        super().setUp()
+        self.companies = [self.create_company(i) for i in range(2)]
+        for company in self.companies:
+            self.create_purchase(company, self.mineral, amount=700)
+
+    def test_company_report_shape(self):
+        response = self.client.get('/api/balances/company_report/')
+        self.assertEqual(response.status_code, 200)
+
+        report = response.data['report']
+        self.assertEqual([row['company_id'] for row in report], [company.pk for company in self.companies])
+        for row in report:
+            self.assertEqual(row['total_remaining'], 700)
+            self.assertEqual(row['balance_count'], 1)
+            self.assertEqual(
+                set(row['balances'][0]),
+                {'id', 'remaining_amount', 'create_at'},
+            )
+            self.assertEqual(row['balances'][0]['remaining_amount'], 700)
+
+    def test_filters(self):
+        response = self.client.get(f'/api/balances/company_report/?company_id={self.companies[1].pk}')
+        self.assertEqual([row['company_id'] for row in response.data['report']], [self.companies[1].pk])
+
+        response = self.client.get('/api/balances/mineral_report/')
+        [mineral] = response.data['report']
+        self.assertEqual(mineral['total_remaining'], 1400)
+        self.assertEqual(len(mineral['companies']), 2)
+
+    def test_date_range(self):
+        today = timezone.localdate()
+
+        def dated(record, days_ago):
+            moment = timezone.make_aware(datetime.datetime.combine(today - datetime.timedelta(days=days_ago), datetime.time(12)))
+            BalanceMovement.objects.filter(source_model=type(record).__name__, source_id=record.pk).update(created_at=moment)
+
+        purchase = Purchase.objects.get(company=self.companies[0])
+        dated(purchase, 10)
+        dated(self.create_weight(purchase, amount=100, bill_number='B1'), 5)
+        span = f'date_from={today - datetime.timedelta(days=7)}&date_to={today - datetime.timedelta(days=1)}'
+
+        # The second company's purchase is journaled today, outside the range
+        response = self.client.get(f'/api/balances/company_report/?{span}')
+        self.assertEqual(response.status_code, 200)
+        [row] = response.data['report']
+        self.assertEqual(row['company_id'], self.companies[0].pk)
+        self.assertEqual(
+            (row['opening_balance'], row['period_change'], row['total_remaining']),
+            (700, -100, 600),
+        )
+        self.assertEqual(row['balances'][0]['remaining_amount'], 600)
+
+        response = self.client.get(f'/api/balances/mineral_report/?{span}')
+        [mineral] = response.data['report']
+        self.assertEqual(mineral['total_remaining'], 600)
+        self.assertEqual(
+            mineral['companies'],
+            [{'company': 'Company 0', 'company_id': self.companies[0].pk, 'amount': 600, 'opening_balance': 700, 'period_change': -100}],
+        )
+
+        response = self.client.get(f'/api/balances/company_report/?date_from={today}')
+        self.assertEqual([row['company_id'] for row in response.data['report']], [self.companies[1].pk])
+
+        for query in ('date_from=yesterday', f'date_from={today}&date_to={today - datetime.timedelta(days=1)}'):
+            response = self.client.get(f'/api/balances/mineral_report/?{query}')
+            self.assertEqual(response.status_code, 400)
+
+
+class DeletedCountsTests(BalanceFixtureMixin, TestCase):
+    """Recycle bin counts for every model come from one UNION ALL query"""
+
+    MODEL_KEYS = [
+        'companies', 'vehicles', 'maktoobs', 'purchases', 'units', 'minerals',
+        'vehicle_types', 'scales', 'weights', 'balances', 'momps',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        companies = [self.create_company(i) for i in range(3)]
+        purchase = self.create_purchase(companies[0], self.mineral)
+        self.create_weight(purchase, bill_number='B0')
+        self.create_weight(purchase, bill_number='B1').soft_delete()
+        companies[2].soft_delete()
+
+    def count(self, include_active):
+        with CaptureQueriesContext(connection) as context:
+            counts = count_all(include_active=include_active)
+        self.assertEqual(len(context.captured_queries), 1)
+        return counts
+
+    def test_deleted_only(self):
+        counts = self.count(include_active=False)
+
+        self.assertEqual(list(counts), self.MODEL_KEYS)
+        self.assertEqual(counts['companies'], {'count': 1, 'model_name': 'Company'})
+        self.assertEqual(counts['weights'], {'count': 1, 'model_name': 'Weight'})
+        self.assertEqual(counts['purchases']['count'], 0)
+
+    def test_include_active(self):
+        counts = self.count(include_active=True)
+
+        self.assertEqual(counts['companies'], {'count': 1, 'model_name': 'Company', 'active_count': 2})
+        self.assertEqual(counts['weights'], {'count': 1, 'model_name': 'Weight', 'active_count': 1})
+        self.assertEqual(counts['minerals'], {'count': 0, 'model_name': 'Mineral', 'active_count': 1})
+
+    def test_endpoint(self):
+        response = self.client.get('/api/deleted-counts/?include_active=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_deleted'], 2)
+        self.assertEqual(response.data['counts']['units']['active_count'], 1)
+
+
+class SoftDeleteIndexTests(TestCase):
+    """The hot active lookups are planned on the partial indexes"""
+
+    INDEXES = {
+        'test1_purchase': {
+            'purchase_company_active_idx', 'purchase_mineral_active_idx', 'purchase_maktoob_active_idx',
+            'purchase_scale_active_idx', 'purchase_deleted_idx',
+        },
+        'test1_weight': {
+            'weight_purchase_active_idx', 'weight_mineral_active_idx', 'weight_vehicle_active_idx',
+            'weight_scale_active_idx', 'weight_deleted_idx',
+        },
+        'test1_maktoob': {'maktoob_company_active_idx', 'maktoob_deleted_idx'},
+        'test1_vehicle': {'vehicle_type_active_idx', 'vehicle_deleted_idx'},
+    }
+
+    def test_indexes_exist(self):
+        with connection.cursor() as cursor:
+            for table, names in self.INDEXES.items():
+                constraints = connection.introspection.get_constraints(cursor, table)
+                self.assertTrue(names <= set(constraints), table)
+
+    @skipUnless(connection.vendor == 'sqlite', 'plan text is backend specific')
+    def test_query_plans(self):
+        plans = [
+            (Weight.objects.filter(purchase__company_id=1, deleted_at__isnull=True), 'weight_purchase_active_idx'),
+            (Purchase.get_active_objects().filter(company_id=1, mineral_id=1), 'purchase_company_active_idx'),
+            (Weight.get_active_objects().filter(mineral_id=1), 'weight_mineral_active_idx'),
+            (Purchase.get_active_objects().filter(scale_id=1), 'purchase_scale_active_idx'),
+            (Maktoob.get_active_objects().filter(company_id=1), 'maktoob_company_active_idx'),
+            (Vehicle.get_active_objects().filter(vehicle_type_id=1), 'vehicle_type_active_idx'),
+            (Weight.get_deleted_objects(), 'weight_deleted_idx'),
+        ]
+        for queryset, index in plans:
+            self.assertIn(index, queryset.explain())
+
+
+class WeightBulkTests(BalanceFixtureMixin, TestCase):
+    """weights/bulk/ checks balances per batch and moves them once"""
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.create_company(1)
+        self.purchase = self.create_purchase(self.company, self.mineral, amount=1000)
+
+    def ticket(self, amount, bill_number, **overrides):
+        return {
+            'second_weight': amount + 100,
+            'mineral_net_weight': amount,
+            'control_weight': 100,
+            'area': 'Area',
+            'discharge_place': 'Yard',
+            'bill_number': bill_number,
+            'purchase': self.purchase.pk,
+            'mineral': self.mineral.pk,
+            **overrides,
+        }
+
+    def post(self, tickets, mode='atomic'):
+        return self.client.post('/api/weights/bulk/', {'tickets': tickets, 'mode': mode}, format='json')
+
+    def remaining(self):
+        return Balance.objects.get(company=self.company, mineral=self.mineral).remaining_mineral_amount
+
+    def test_atomic_batch_moves_balance_once_per_pair(self):
+        response = self.post([self.ticket(300, 'B1'), self.ticket(200, 'B2')])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created_count'], 2)
+        self.assertEqual(self.remaining(), 500)
+        self.assertEqual(Weight.get_active_objects().count(), 2)
+        self.assertTrue(all(weight.balance_updated for weight in Weight.objects.all()))
+
+    def test_insufficient_balance_counts_earlier_tickets(self):
+        response = self.post([self.ticket(600, 'B1'), self.ticket(600, 'B2')])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.data['results']], ['skipped', 'error'])
+        self.assertIn('mineral_net_weight', response.data['results'][1]['errors'])
+        self.assertFalse(Weight.objects.exists())
+        self.assertEqual(self.remaining(), 1000)
+
+    def test_partial_mode_keeps_valid_tickets(self):
+        response = self.post([self.ticket(600, 'B1'), self.ticket(600, 'B2'), self.ticket(100, 'B3')], mode='partial')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['status'] for result in response.data['results']], ['created', 'error', 'created'])
+        self.assertEqual(response.data['error_count'], 1)
+        self.assertEqual(self.remaining(), 300)
+
+    def test_soft_deleted_purchase_is_rejected(self):
+        other = self.create_purchase(self.create_company(2), self.mineral)
+        other.soft_delete()
+
+        response = self.post([self.ticket(10, 'B1', purchase=other.pk), self.ticket(10, 'B2')], mode='partial')
+
+        self.assertEqual([result['status'] for result in response.data['results']], ['error', 'created'])
+        self.assertIn('purchase', response.data['results'][0]['errors'])
+        self.assertFalse(Weight.objects.filter(purchase=other).exists())
+
+
+class PurchaseImportTests(BalanceFixtureMixin, TestCase):
+    """Spreadsheet purchase import in atomic and partial mode"""
+
+    HEADER = [
+        'area', 'mineral_amount', 'unit_price', 'mineral_total_price', 'royalty_receipt_number',
+        'weighing_total_price', 'haq_wazan_receipt_number', 'TIN_number', 'mineral',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.create_company(1)
+
+    def row(self, amount, area='Area', tin='TIN-1', mineral='Coal'):
+        return [area, amount, 10, amount * 10, 1, 1, 1, tin, mineral]
+
+    def csv_file(self, rows):
+        lines = [','.join(self.HEADER)] + [','.join(str(value) for value in row) for row in rows]
+        return io.BytesIO('\n'.join(lines).encode())
+
+    def remaining(self):
+        balance = Balance.objects.filter(company=self.company, mineral=self.mineral).first()
+        return balance.remaining_mineral_amount if balance else 0
+
+    def test_reads_csv_rows(self):
+        rows = list(read_spreadsheet_rows(self.csv_file([self.row(100), self.row(50, area='')]), 'purchases.csv'))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['TIN_number'], 'TIN-1')
+        self.assertEqual(rows[0]['mineral_amount'], '100')
+        self.assertIsNone(rows[1]['area'])
+
+    @skipUnless(importlib.util.find_spec('openpyxl'), 'openpyxl is not installed')
+    def test_reads_xlsx_rows(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        workbook.active.append(self.HEADER)
+        workbook.active.append(self.row(100))
+        workbook.active.append([None] * len(self.HEADER))
+        file = io.BytesIO()
+        workbook.save(file)
+        file.seek(0)
+
+        rows = list(read_spreadsheet_rows(file, 'purchases.xlsx'))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['mineral_amount'], 100)
+        self.assertEqual(rows[0]['mineral'], 'Coal')
+
+    def test_unsupported_extension(self):
+        file = io.BytesIO(b'x')
+        file.name = 'purchases.txt'
+        response = self.client.post('/api/purchases/import/', {'file': file})
+        self.assertEqual(response.status_code, 400)
+
+    def test_atomic_import_rolls_back_on_invalid_row(self):
+        file = self.csv_file([self.row(100), self.row(50, tin='TIN-404')])
+        file.name = 'purchases.csv'
+
+        response = self.client.post('/api/purchases/import/', {'file': file})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['row'], 3)
+        self.assertFalse(Purchase.objects.exists())
+        self.assertEqual(self.remaining(), 0)
+
+    def test_partial_import_credits_imported_rows(self):
+        file = self.csv_file([self.row(100), self.row(50, tin='TIN-404'), self.row(30)])
+        file.name = 'purchases.csv'
+
+        response = self.client.post('/api/purchases/import/', {'file': file, 'mode': 'partial'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created_count'], 2)
+        self.assertEqual(response.data['error_count'], 1)
+        self.assertEqual(self.remaining(), 130)
+        self.assertEqual(BalanceMovement.objects.filter(source_model='Purchase').count(), 2)
+
+    def test_partial_import_retries_rejected_chunk_row_by_row(self):
+        bulk_create = Purchase.objects.bulk_create
+
+        def reject_bad_rows(purchases, *args, **kwargs):
+            if any(purchase.area == 'BAD' for purchase in purchases):
+                raise DatabaseError('rejected by the database')
+            return bulk_create(purchases, *args, **kwargs)
+
+        rows = [self.row(100), self.row(50, area='BAD'), self.row(30)]
+        with patch.object(Purchase.objects, 'bulk_create', side_effect=reject_bad_rows):
+            stats = import_purchases(
+                read_spreadsheet_rows(self.csv_file(rows), 'purchases.csv'), user=self.user, atomic=False
+            )
+
+        self.assertEqual(stats['created_count'], 2)
+        self.assertEqual(stats['errors'], [{'row': 3, 'errors': {'non_field_errors': ['rejected by the database']}}])
+        self.assertEqual(Purchase.objects.count(), 2)
+        self.assertEqual(self.remaining(), 130)
+
+
+class ExportTests(BalanceFixtureMixin, TestCase):
+    """List exports stream the filtered queryset in export_fields order"""
+
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_company(1)
+        self.second = self.create_company(2)
+        self.purchases = [
+            self.create_purchase(self.first, self.mineral, amount=100),
+            self.create_purchase(self.first, self.mineral, amount=200),
+            self.create_purchase(self.second, self.mineral, amount=300),
+        ]
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_header_and_field_order(self):
+        response = self.client.get('/api/purchases/export/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(self.read(response))))
+        self.assertEqual(rows[0], PurchaseViewSet.export_fields)
+        self.assertEqual(len(rows), 4)
+        first = dict(zip(rows[0], rows[1]))
+        purchase = Purchase.objects.get(pk=first['id'])
+        self.assertEqual(first['company__company_name'], purchase.company.company_name)
+        self.assertEqual(first['mineral_amount'], str(purchase.mineral_amount))
+
+    def test_filters_and_soft_delete_apply(self):
+        self.purchases[0].soft_delete()
+
+        response = self.client.get('/api/purchases/export/', {'company': self.first.pk, 'export_format': 'ndjson'})
+
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.purchases[1].pk])
+        self.assertEqual(list(rows[0]), PurchaseViewSet.export_fields)
+
+    def test_unknown_format(self):
+        response = self.client.get('/api/purchases/export/', {'export_format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_response_streams_rows_lazily(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/purchases/export/')
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertFalse(any('test1_purchase' in query['sql'] for query in context.captured_queries))
+
+        content = iter(response.streaming_content)
+        with CaptureQueriesContext(connection) as context:
+            next(content)
+        self.assertEqual(len(context.captured_queries), 0)
+
+        with CaptureQueriesContext(connection) as context:
+            rows = list(content)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len(context.captured_queries), 1)
+
+
+class CurrentBalanceQueryCountTests(BalanceFixtureMixin, TestCase):
+    """current_balance must not cost one Balance query per listed row"""
+
+    def count_list_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_purchase_list_query_count_is_constant(self):
+        for index in range(2):
+            self.create_purchase(self.create_company(index), self.mineral)
+        small_count, _ = self.count_list_queries('/api/purchases/')
+
+        for index in range(2, 7):
+            self.create_purchase(self.create_company(index), self.mineral)
+        large_count, response = self.count_list_queries('/api/purchases/')
+
+        self.assertEqual(small_count, large_count)
+        balances = {row['company']: row['current_balance'] for row in response.data['results']}
+        self.assertTrue(all(amount == 1000 for amount in balances.values()))
+
+    def test_weight_list_query_count_is_constant(self):
+        purchase = self.create_purchase(self.create_company(0), self.mineral)
+        for index in range(2):
+            self.create_weight(purchase, bill_number=f'B{index}')
+        small_count, _ = self.count_list_queries('/api/weights/')
+
+        for index in range(2, 7):
+            self.create_weight(purchase, bill_number=f'B{index}')
+        large_count, response = self.count_list_queries('/api/weights/')
+
+        self.assertEqual(small_count, large_count)
+        self.assertTrue(all(row['current_balance'] == 930 for row in response.data['results']))
+
+    def test_expanded_purchase_list_query_count_is_constant(self):
+        url = '/api/purchases/?expand=company,mineral,maktoob,scale'
+        self.create_purchase(self.create_company(0), self.mineral)
+        small_count, _ = self.count_list_queries(url)
+
+        for index in range(1, 6):
+            self.create_purchase(self.create_company(index), self.mineral)
+        large_count, response = self.count_list_queries(url)
+
+        self.assertEqual(small_count, large_count)
+        row = response.data['results'][0]
+        self.assertEqual(row['mineral']['name'], 'Coal')
+        self.assertIn('company_name', row['company'])
+        self.assertIsNone(row['maktoob'])
+        self.assertIsInstance(self.client.get('/api/purchases/').data['results'][0]['company'], int)
+
+
+class KeysetPaginationTests(BalanceFixtureMixin, TestCase):
+    """?cursor= pages walk (create_at, id) in both directions without gaps"""
+
+    def setUp(self):
+        super().setUp()
+        purchase = self.create_purchase(self.create_company(0), self.mineral)
+        for index in range(12):
+            weight = self.create_weight(purchase, amount=1, bill_number=f'B{index}')
+            Weight.objects.filter(pk=weight.pk).update(create_at=datetime.date(2024, 1, 1 + index % 3))
+
+        self.expected = list(
+            Weight.objects.order_by('-create_at', '-id').values_list('id', flat=True)
+        )
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_walks_forward_and_back(self):
+        pages = [self.get_page('/api/weights/?cursor=&page_size=5')]
+        self.assertEqual(pages[0]['count'], 12)
+        self.assertIsNone(pages[0]['previous'])
+        while pages[-1]['next']:
+            pages.append(self.get_page(pages[-1]['next']))
+
+        forward = [row['id'] for page in pages for row in page['results']]
+        self.assertEqual(forward, self.expected)
+        self.assertEqual([len(page['results']) for page in pages], [5, 5, 2])
+
+        backward = [pages[-1]]
+        while backward[-1]['previous']:
+            backward.append(self.get_page(backward[-1]['previous']))
+        self.assertEqual(
+            [row['id'] for page in reversed(backward) for row in page['results']],
+            self.expected,
+        )
+
+    def test_count_can_be_skipped(self):
+        with CaptureQueriesContext(connection) as context:
+            page = self.get_page('/api/weights/?cursor=&count=false')
+        self.assertIsNone(page['count'])
+        self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/weights/?cursor=garbage').status_code, 404)
+
+    def test_page_number_mode_unchanged(self):
+        page = self.get_page('/api/weights/?page=2')
+        self.assertEqual(page['count'], 12)
+        self.assertEqual(len(page['results']), 12 - 7)
+
+
+class FieldFilterTests(BalanceFixtureMixin, TestCase):
+    """List endpoints narrow the queryset from query parameters"""
+
+    def test_mineral_and_company_filters(self):
+        other_mineral = Mineral.objects.create(name='Iron', unit_price=1, mineral_description='Iron', unit=self.mineral.unit)
+        first, second = self.create_company(0), self.create_company(1)
+        purchase = self.create_purchase(first, self.mineral)
+        self.create_purchase(second, other_mineral)
+        self.create_weight(purchase, bill_number='B1')
+
+        response = self.client.get(f'/api/purchases/?mineral={other_mineral.pk}')
+        self.assertEqual([row['company'] for row in response.data['results']], [second.pk])
+
+        self.assertEqual(self.client.get(f'/api/weights/?company={first.pk}').data['count'], 1)
+        self.assertEqual(self.client.get(f'/api/weights/?company={second.pk}').data['count'], 0)
+
+    def test_invalid_filter_value(self):
+        response = self.client.get('/api/purchases/?mineral=abc&date_from=yesterday')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['errors']), {'mineral', 'date_from'})
+
+    def test_filters_lead_an_active_index(self):
+        for viewset in (VehicleViewSet, CompanyViewSet, ScaleViewSet, MaktoobViewSet, PurchaseViewSet, WeightViewSet):
+            model = viewset.queryset.model
+            leading = {
+                index.fields[0] for index in model._meta.indexes
+                if index.condition == Q(deleted_at__isnull=True)
+            }
+            for param, path in viewset.filter_fields.items():
+                self.assertIn(path.split('__')[0], leading, f'{model.__name__} ?{param}=')
+
+
+class WeightBillNumberRestoreTests(BalanceFixtureMixin, TestCase):
+    """Restores that would reuse an active bill number are refused with 409"""
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.create_company(1)
+        self.purchase = self.create_purchase(self.company, self.mineral)
+        self.deleted = self.create_weight(self.purchase, amount=10, bill_number='B1')
+        self.deleted.soft_delete()
+        self.active = self.create_weight(self.purchase, amount=20, bill_number='B1')
+
+    def remaining(self):
+        return Balance.objects.get(company=self.company, mineral=self.mineral).remaining_mineral_amount
+
+    def test_restore_conflict(self):
+        response = self.client.post(f'/api/weights/{self.deleted.pk}/restore/')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['bill_numbers'], ['B1'])
+        self.assertTrue(Weight.objects.get(pk=self.deleted.pk).is_deleted)
+        self.assertEqual(self.remaining(), 980)
+
+    def test_bulk_restore_conflict_restores_nothing(self):
+        other = self.create_weight(self.purchase, amount=5, bill_number='B2')
+        other.soft_delete()
+
+        response = self.client.post(
+            '/api/bulk-restore/', {'model': 'weights', 'ids': [self.deleted.pk, other.pk]}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Weight.get_deleted_objects().count(), 2)
+        self.assertEqual(self.remaining(), 980)
+
+    def test_cascade_restore_conflict(self):
+        self.active.soft_delete()
+        self.purchase.soft_delete()
+        self.create_weight(self.create_purchase(self.create_company(2), self.mineral), bill_number='B1')
+
+        response = self.client.post(f'/api/purchases/{self.purchase.pk}/restore/')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(Purchase.objects.get(pk=self.purchase.pk).is_deleted)
+
+    def test_restore_after_renumbering(self):
+        self.active.bill_number = 'B1-new'
+        self.active.save()
+
+        response = self.client.post(f'/api/weights/{self.deleted.pk}/restore/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.remaining(), 970)
+
+
+class MineralTotalsTests(BalanceFixtureMixin, TestCase):
+    """minerals/totals/ aggregates every mineral in a fixed number of queries"""
+
+    def test_totals_per_mineral(self):
+        other_mineral = Mineral.objects.create(name='Iron', unit_price=1, mineral_description='Iron', unit=self.mineral.unit)
+        first, second = self.create_company(0), self.create_company(1)
+        purchase = self.create_purchase(first, self.mineral, amount=500)
+        self.create_purchase(second, self.mineral, amount=300)
+        self.create_weight(purchase, amount=120, bill_number='B1')
+
+        response = self.client.get('/api/minerals/totals/')
+        self.assertEqual(response.status_code, 200)
+        totals = {row['mineral_name']: row for row in response.data['minerals']}
+        self.assertEqual(totals['Coal']['purchased_amount'], 800)
+        self.assertEqual(totals['Coal']['weighed_net_weight'], 120)
+        self.assertEqual(totals['Coal']['remaining_balance'], 680)
+        self.assertEqual(totals['Coal']['company_count'], 2)
+        self.assertEqual(totals['Iron']['purchase_count'], 0)
+
+        filtered = self.client.get(f'/api/minerals/totals/?company_id={second.pk}').data
+        self.assertEqual(filtered['grand_totals']['remaining_balance'], 300)
+        self.assertEqual(filtered['grand_totals']['weight_count'], 0)
+
+
+class AvailabilityTests(BalanceFixtureMixin, TestCase):
+    """weights/check-available/ resolves purchase -> company -> balance in one query"""
+
+    def test_single_and_batch_checks(self):
+        purchase = self.create_purchase(self.create_company(0), self.mineral, amount=100)
+        url = '/api/weights/check-available/'
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, {'purchase': purchase.pk, 'mineral': self.mineral.pk, 'mineral_net_weight': 60}, format='json')
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertTrue(response.data['can_add'])
+        self.assertEqual(response.data['remaining_after'], 40)
+
+        tickets = [{'purchase': purchase.pk, 'mineral': self.mineral.pk, 'mineral_net_weight': 60}] * 2
+        response = self.client.post(url, {'tickets': tickets}, format='json')
+        self.assertEqual([result['can_add'] for result in response.data['results']], [True, False])
+        self.assertFalse(response.data['can_add_all'])
+
+        response = self.client.post(url, {'purchase': purchase.pk + 1, 'mineral': self.mineral.pk}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_company_mineral_balance(self):
+        company = self.create_company(0)
+        url = f'/api/company-mineral-balance/{company.pk}/{self.mineral.pk}/'
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['balance']['remaining_mineral_amount'], 0)
+        self.assertFalse(Balance.objects.exists())
+
+        self.create_weight(self.create_purchase(company, self.mineral, amount=100), amount=30)
+        response = self.client.get(url)
+        self.assertEqual(response.data['balance']['remaining_mineral_amount'], 70)
+        self.assertEqual(response.data['summary']['calculated_balance'], 70)
+        self.assertEqual(set(response.data['balance']), set(BalanceSerializer.Meta.fields))
+
+    def test_weight_without_balance_reports_the_reason(self):
+        other_mineral = Mineral.objects.create(name='Iron', unit_price=1, mineral_description='Iron', unit=self.mineral.unit)
+        purchase = self.create_purchase(self.create_company(0), self.mineral, amount=100)
+        data = {
+            'second_weight': 110, 'mineral_net_weight': 10, 'control_weight': 100, 'area': 'Area',
+            'discharge_place': 'Yard', 'bill_number': 'B1', 'purchase': purchase.pk, 'mineral': other_mineral.pk,
+        }
+
+        response = self.client.post('/api/weights/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['non_field_errors'], ['No active balance for this company and mineral'])
+
+        response = self.client.post('/api/validate-weight/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], 'No active balance for this company and mineral')
+
+
+class ReferenceCacheTests(BalanceFixtureMixin, TestCase):
+    """Reference lists are served from cache until a write invalidates them"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_hit_etag_and_invalidation(self):
+        first = self.client.get('/api/minerals/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/minerals/')['X-Cache'], 'HIT')
+
+        not_modified = self.client.get('/api/minerals/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mineral.soft_delete()
+        response = self.client.get('/api/minerals/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 0)
+
+
+class CompanyVehicleCascadeTests(BalanceFixtureMixin, TestCase):
+    """Company soft delete handles its fleet in a fixed number of queries"""
+
+    def create_fleet(self, company, size, shared_with=None):
+        vehicles = [
+            Vehicle.objects.create(car_name='Truck', plate_number=f'{company.pk}-{index}', driver_name='Driver', empty_weight=1000)
+            for index in range(size)
+        ]
+        company.vehicle.add(*vehicles)
+        if shared_with is not None:
+            shared_with.vehicle.add(vehicles[0])
+        return vehicles
+
+    def delete_queries(self, company):
+        with CaptureQueriesContext(connection) as context:
+            company.soft_delete()
+        return len(context.captured_queries)
+
+    def test_soft_delete_query_count_is_constant(self):
+        small, large = self.create_company(0), self.create_company(1)
+        self.create_fleet(small, 2)
+        self.create_fleet(large, 20)
+        self.assertEqual(self.delete_queries(small), self.delete_queries(large))
+
+    def test_shared_vehicles_stay_active(self):
+        company, partner = self.create_company(0), self.create_company(1)
+        shared, own = self.create_fleet(company, 2, shared_with=partner)
+        purchase = self.create_purchase(partner, self.mineral)
+        weight = self.create_weight(purchase, bill_number='B1')
+        Weight.objects.filter(pk=weight.pk).update(vehicle=own)
+
+        company.soft_delete()
+
+        shared.refresh_from_db()
+        own.refresh_from_db()
+        self.assertIsNone(shared.deleted_at)
+        self.assertIsNotNone(own.deleted_at)
+        self.assertIsNotNone(Weight.objects.get(pk=weight.pk).deleted_at)
+        self.assertEqual(sorted(company.get_tracked_vehicle_ids()), sorted([shared.pk, own.pk]))
+        self.assertFalse(company.vehicle.exists())
+
+    def restore_queries(self, company):
+        with CaptureQueriesContext(connection) as context:
+            restored = company.restore_with_vehicles()
+        return len(context.captured_queries), restored
+
+    def test_restore_query_count_is_constant(self):
+        small, large = self.create_company(0), self.create_company(1)
+        self.create_fleet(small, 2)
+        self.create_fleet(large, 20)
+        small.soft_delete()
+        large.soft_delete()
+
+        small_queries, small_restored = self.restore_queries(small)
+        large_queries, large_restored = self.restore_queries(large)
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual((len(small_restored), len(large_restored)), (2, 20))
+
+    def test_restore_relinks_fleet_and_weights(self):
+        company, partner = self.create_company(0), self.create_company(1)
+        shared, own = self.create_fleet(company, 2, shared_with=partner)
+        purchase = self.create_purchase(partner, self.mineral)
+        weight = self.create_weight(purchase, bill_number='B1')
+        Weight.objects.filter(pk=weight.pk).update(vehicle=own)
+        company.soft_delete()
+
+        restored = company.restore_with_vehicles()
+
+        self.assertEqual([vehicle['id'] for vehicle in restored], [own.pk])
+        self.assertEqual(set(company.vehicle.values_list('id', flat=True)), {shared.pk, own.pk})
+        self.assertIsNone(Vehicle.objects.get(pk=own.pk).deleted_at)
+        self.assertIsNone(Weight.objects.get(pk=weight.pk).deleted_at)
+        self.assertEqual(company.get_tracked_vehicle_ids(), [])
+
+
+class RecycleBinBulkTests(BalanceFixtureMixin, TestCase):
+    """bulk_restore / bulk_permanent_delete work per model, not per record"""
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.create_company(0)
+        self.purchase = self.create_purchase(self.company, self.mineral, amount=1000)
+
+    def balance(self):
+        return Balance.objects.get(company=self.company, mineral=self.mineral).remaining_mineral_amount
+
+    def delete_weights(self, count, start=0):
+        weights = [
+            self.create_weight(self.purchase, amount=10, bill_number=f'B{index}')
+            for index in range(start, start + count)
+        ]
+        for weight in weights:
+            weight.soft_delete()
+        return [weight.pk for weight in weights]
+
+    def post(self, url, ids, model='weights'):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, {'model': model, 'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.data
+
+    def test_restore_applies_one_summed_delta(self):
+        small_ids = self.delete_weights(2)
+        small_queries, _ = self.post('/api/bulk-restore/', small_ids)
+        large_ids = self.delete_weights(15, start=2)
+        large_queries, data = self.post('/api/bulk-restore/', large_ids)
+
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(data['restored_count'], 15)
+        self.assertEqual(self.balance(), 1000 - 17 * 10)
+        self.assertFalse(Weight.objects.filter(balance_updated=False).exists())
+        self.assertEqual(get_balance_drift(), [])
+
+    def test_restore_purchase_readds_balance_and_weights(self):
+        self.create_weight(self.purchase, amount=100)
+        self.purchase.soft_delete()
+        self.assertEqual(self.balance(), -100)
+
+        _, data = self.post('/api/bulk-restore/', [self.purchase.pk], model='purchases')
+
+        self.assertEqual(self.balance(), 900)
+        self.assertEqual(data['stats']['cascaded'], {'Weight': 1})
+        self.assertFalse(Weight.objects.filter(deleted_at__isnull=False).exists())
+
+    def test_permanent_delete_leaves_balance(self):
+        ids = self.delete_weights(3)
+        _, data = self.post('/api/bulk-permanent-delete/', ids + [self.purchase.pk])
+
+        self.assertEqual(data['deleted_count'], 3)
+        self.assertFalse(Weight.objects.exists())
+        self.assertEqual(self.balance(), 1000)
+
+
+class BalanceJournalTests(BalanceFixtureMixin, TestCase):
+    """Every balance change is journaled; snapshots and drift come from the journal"""
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.create_company(0)
+
+    def balance(self):
+        return Balance.objects.get(company=self.company, mineral=self.mineral)
+
+    def test_mutations_are_journaled(self):
+        purchase = self.create_purchase(self.company, self.mineral, amount=1000)
+        weight = self.create_weight(purchase, amount=300)
+        weight.soft_delete()
+        weight.restore()
+
+        movements = list(BalanceMovement.objects.order_by('id').values_list('source_model', 'source_id', 'delta'))
+        self.assertEqual(movements, [
+            ('Purchase', purchase.pk, 1000),
+            ('Weight', weight.pk, -300),
+            ('Weight', weight.pk, 300),
+            ('Weight', weight.pk, -300),
+        ])
+        self.assertEqual(self.balance().remaining_mineral_amount, 700)
+        self.assertEqual(get_balance_drift(), [])
+
+    def test_drift_and_compaction(self):
+        purchase = self.create_purchase(self.company, self.mineral, amount=1000)
+        self.create_weight(purchase, amount=100)
+
+        stats = compact_balances()
+        balance = self.balance()
+        self.assertEqual(stats['balances_compacted'], 1)
+        self.assertEqual((balance.snapshot_amount, balance.snapshot_movement_id), (900, BalanceMovement.objects.latest('id').pk))
+
+        Balance.objects.filter(pk=balance.pk).update(remaining_mineral_amount=950)
+        drift = get_balance_drift()
+        self.assertEqual([(row['id'], row['journal_amount'], row['drift']) for row in drift], [(balance.pk, 900, 50)])
+
+    def test_manual_edits_are_journaled(self):
+        self.create_purchase(self.company, self.mineral, amount=1000)
+        compact_balances()
+        balance = self.balance()
+        other = self.create_company(1)
+
+        response = self.client.patch(f'/api/balances/{balance.pk}/', {'remaining_mineral_amount': 800}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_balance_drift(), [])
+
+        response = self.client.patch(f'/api/balances/{balance.pk}/', {'company': other.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_balance_drift(), [])
+        today = timezone.localdate()
+        self.assertEqual(get_balance_as_of(other.pk, self.mineral.pk, today)['balance'], 800)
+        self.assertEqual(get_balance_as_of(self.company.pk, self.mineral.pk, today)['balance'], 0)
+
+        self.create_purchase(other, self.mineral, amount=50)
+        self.assertEqual(Balance.objects.get(pk=balance.pk).remaining_mineral_amount, 850)
+        self.assertEqual(get_balance_drift(), [])
+
+    def test_journal_seeded_from_existing_records(self):
+        purchase = self.create_purchase(self.company, self.mineral, amount=100)
+        weight = self.create_weight(purchase, amount=30, bill_number='B1')
+        self.create_weight(purchase, amount=20, bill_number='B2').soft_delete()
+        Purchase.objects.filter(pk=purchase.pk).update(create_at=datetime.date(2024, 1, 10))
+        Weight.objects.filter(pk=weight.pk).update(create_at=datetime.date(2024, 2, 5))
+        # A manual edit the records do not explain
+        Balance.objects.filter(company=self.company).update(remaining_mineral_amount=75, update_at=datetime.date(2024, 3, 1))
+        BalanceMovement.objects.all().delete()
+
+        open_journal(django_apps, None)
+
+        movements = list(BalanceMovement.objects.order_by('created_at').values_list(
+            'source_model', 'source_id', 'delta', 'created_at',
+        ))
+        day = lambda *args: timezone.make_aware(datetime.datetime(*args))
+        self.assertEqual(movements, [
+            ('Purchase', purchase.pk, 100, day(2024, 1, 10)),
+            ('Weight', weight.pk, -30, day(2024, 2, 5)),
+            ('opening', None, 5, day(2024, 3, 1)),
+        ])
+        self.assertEqual(self.balance().snapshot_amount, 75)
+        self.assertEqual(get_balance_drift(), [])
+
+    def test_admin_is_read_only(self):
+        self.create_purchase(self.company, self.mineral, amount=100)
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='secret')
+        self.client.force_login(admin)
+
+        for model in (BalanceMovement, DailySummary):
+            prefix = f'/admin/test1/{model._meta.model_name}'
+            pk = model.objects.values_list('pk', flat=True).first()
+            self.assertEqual(self.client.get(f'{prefix}/').status_code, 200)
+            self.assertEqual(self.client.get(f'{prefix}/add/').status_code, 403)
+            self.assertEqual(self.client.get(f'{prefix}/{pk}/delete/').status_code, 403)
+
+
+class BalanceTransactionHistoryTests(BalanceFixtureMixin, TestCase):
+    """balance_transactions pages a UNION ALL feed with running totals"""
+
+    def test_feed_pages_with_running_balance(self):
+        company = self.create_company(0)
+        other_mineral = Mineral.objects.create(name='Iron', unit_price=1, mineral_description='Iron')
+        purchase = self.create_purchase(company, self.mineral, amount=1000)
+        self.create_purchase(company, other_mineral, amount=500)
+        for index in range(3):
+            self.create_weight(purchase, amount=100, bill_number=f'B{index}')
+
+        url = f'/api/balance-transactions/{company.pk}/?page_size=2'
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data['transactions'])
+            url = response.data['next']
+
+        rows = [row for page in pages for row in page]
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(response.data['total_transactions'], 5)
+        coal = [row['running_balance'] for row in rows if row['mineral_id'] == self.mineral.pk]
+        self.assertEqual(coal, [700, 800, 900, 1000])
+        self.assertEqual(rows[0]['type'], 'WEIGHT')
+
+        response = self.client.get(f'/api/balance-transactions/{company.pk}/?mineral={other_mineral.pk}')
+        self.assertEqual([row['amount'] for row in response.data['transactions']], [500])
+        self.assertEqual(response.data['calculated_balances'][0]['current_balance'], 500)
+
+    def test_page_reads_only_its_rows(self):
+        company = self.create_company(0)
+        purchase = self.create_purchase(company, self.mineral, amount=1000)
+        for index in range(5):
+            self.create_weight(purchase, amount=10, bill_number=f'B{index}')
+        first = self.client.get(f'/api/balance-transactions/{company.pk}/?page_size=2')
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(first.data['next'])
+        self.assertEqual([row['running_balance'] for row in response.data['transactions']], [970, 980])
+        # One page query, limited per table; the totals come from the daily summaries
+        feed = [query['sql'] for query in context.captured_queries if 'test1_weight' in query['sql']]
+        self.assertEqual(len(feed), 1)
+        self.assertEqual(feed[0].count('LIMIT'), 3)
+        self.assertNotIn(' OVER ', feed[0])
+
+        response = self.client.get(f'/api/balance-transactions/{company.pk}/?cursor=bm90IGpzb24=')
+        self.assertEqual(response.status_code, 400)
+
+
+class BalanceAsOfTests(BalanceFixtureMixin, TestCase):
+    """Point-in-time balances from the movement journal and checkpoints"""
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.create_company(0)
+        self.today = timezone.localdate()
+        self.purchase = self.dated(self.create_purchase(self.company, self.mineral, amount=1000), 10)
+        self.dated(self.create_weight(self.purchase, amount=100, bill_number='B1'), 8)
+        self.late_weight = self.dated(self.create_weight(self.purchase, amount=200, bill_number='B2'), 3)
+
+    def dated(self, record, days_ago):
+        """Move the record's journal movements to noon, days_ago days back"""
+        day = self.today - datetime.timedelta(days=days_ago)
+        moment = timezone.make_aware(datetime.datetime.combine(day, datetime.time(12)))
+        BalanceMovement.objects.filter(source_model=type(record).__name__, source_id=record.pk).update(created_at=moment)
+        return record
+
+    def balance_on(self, days_ago):
+        day = self.today - datetime.timedelta(days=days_ago)
+        return get_balance_as_of(self.company.pk, self.mineral.pk, day)
+
+    def test_as_of_with_and_without_checkpoints(self):
+        expected = {11: 0, 9: 1000, 5: 900, 0: 700}
+        self.assertEqual({days: self.balance_on(days)['balance'] for days in expected}, expected)
+
+        build_checkpoints(self.today - datetime.timedelta(days=6))
+        self.assertEqual({days: self.balance_on(days)['balance'] for days in expected}, expected)
+        self.assertEqual(self.balance_on(0)['checkpoint_day'], self.today - datetime.timedelta(days=6))
+        self.assertEqual(BalanceCheckpoint.objects.get().amount, 900)
+
+    def test_later_changes_keep_checkpoints(self):
+        build_checkpoints(self.today - datetime.timedelta(days=6))
+        build_checkpoints(self.today - datetime.timedelta(days=1))
+
+        self.late_weight.soft_delete()
+
+        self.assertEqual(BalanceCheckpoint.objects.count(), 2)
+        self.assertEqual(self.balance_on(1)['balance'], 700)
+        self.assertEqual(self.balance_on(0)['balance'], 900)
+        self.assertEqual(self.balance_on(0)['balance'], Balance.objects.get().remaining_mineral_amount)
+
+    def test_daily_series(self):
+        series = get_balance_series(
+            self.company.pk, self.mineral.pk,
+            self.today - datetime.timedelta(days=9), self.today - datetime.timedelta(days=2),
+        )
+        self.assertEqual(series['opening_balance'], 1000)
+        self.assertEqual(len(series['days']), 8)
+        self.assertEqual([day['balance'] for day in series['days']], [1000, 900, 900, 900, 900, 900, 700, 700])
+        self.assertEqual(series['days'][6]['debited'], 200)
+
+        response = self.client.get(f'/api/balances/as-of/?as_of={self.today}&company_id={self.company.pk}')
+        self.assertEqual(response.data['total_balance'], 700)
+
+    def test_history_from_before_the_journal(self):
+        # Records dated by their own create_at, journaled only when 0032 ran
+        for record, days_ago in ((self.purchase, 10), (self.late_weight, 3)):
+            type(record).objects.filter(pk=record.pk).update(create_at=self.today - datetime.timedelta(days=days_ago))
+        Weight.objects.exclude(pk=self.late_weight.pk).update(create_at=self.today - datetime.timedelta(days=8))
+        BalanceMovement.objects.all().delete()
+
+        open_journal(django_apps, None)
+
+        expected = {11: 0, 10: 1000, 5: 900, 0: 700}
+        self.assertEqual({days: self.balance_on(days)['balance'] for days in expected}, expected)
+        build_checkpoints(self.today - datetime.timedelta(days=6))
+        self.assertEqual({days: self.balance_on(days)['balance'] for days in expected}, expected)
+
+
+class DailySummaryTests(BalanceFixtureMixin, TestCase):
+    """Daily summaries follow every purchase and weight write and match a rebuild"""
+
+    def setUp(self):
+        super().setUp()
+        self.company = self.create_company(0)
+        self.purchase = self.create_purchase(self.company, self.mineral, amount=1000)
+        self.weights = [self.create_weight(self.purchase, amount=10, bill_number=f'B{i}') for i in range(3)]
+
+    def summaries(self):
+        return list(DailySummary.objects.order_by('id').values(
+            'day', 'scale_id', 'mineral_id', 'company_id', 'weight_count', 'net_weight',
+            'second_weight', 'control_weight', 'purchase_count', 'purchased_amount', 'purchased_total_price',
+        ))
+
+    def assert_matches_rebuild(self):
+        incremental = self.summaries()
+        rebuild_daily_summaries()
+        key = lambda row: (row['day'], row['scale_id'] or 0, row['mineral_id'] or 0, row['company_id'] or 0)
+        self.assertEqual(sorted(incremental, key=key), sorted(self.summaries(), key=key))
+        return incremental
+
+    def test_create_and_soft_delete(self):
+        [summary] = self.assert_matches_rebuild()
+        self.assertEqual(
+            (summary['weight_count'], summary['net_weight'], summary['second_weight'], summary['purchase_count']),
+            (3, 30, 330, 1),
+        )
+
+        self.weights[0].soft_delete()
+        [summary] = self.assert_matches_rebuild()
+        self.assertEqual((summary['weight_count'], summary['net_weight']), (2, 20))
+
+        self.purchase.soft_delete()
+        self.assertEqual(self.assert_matches_rebuild(), [])
+
+    def test_restore_paths(self):
+        self.company.soft_delete()
+        self.assertEqual(self.assert_matches_rebuild(), [])
+
+        self.company.restore()
+        [summary] = self.assert_matches_rebuild()
+        self.assertEqual((summary['weight_count'], summary['purchase_count']), (3, 1))
+
+        self.purchase.refresh_from_db()
+        self.purchase.soft_delete()
+        bulk_restore(Purchase, [self.purchase.pk])
+        [summary] = self.assert_matches_rebuild()
+        self.assertEqual((summary['weight_count'], summary['purchase_count']), (3, 1))
+
+    def test_edit_moves_between_companies(self):
+        other = self.create_company(1)
+        self.purchase.company = other
+        self.purchase.save()
+
+        [summary] = self.assert_matches_rebuild()
+        self.assertEqual((summary['company_id'], summary['weight_count']), (other.pk, 3))
+
+    def test_report(self):
+        response = self.client.get('/api/daily-summary/?group_by=mineral,company')
+        self.assertEqual(response.status_code, 200)
+        [row] = response.data['rows']
+        self.assertEqual(row['mineral__name'], 'Coal')
+        self.assertEqual((row['net_weight'], row['purchased_amount']), (30, 1000))
+
+        response = self.client.get('/api/daily-summary/?group_by=vehicle')
+        self.assertEqual(response.status_code, 400)
+
+
+class HealthCheckTests(TestCase):
+    """The health check reports the database round trip and connection settings"""
+
+    def test_database_block(self):
+        response = APIClient().get('/api/health/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'healthy')
+        self.assertEqual(response.data['database']['connection_mode'], 'persistent')
+        self.assertIn('conn_max_age', response.data['database'])
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    """Authenticated requests reuse the cached token user until the user is saved"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='jwt', email='jwt@example.com', password='secret')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/deleted-counts/')
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in context.captured_queries if 'test1_user' in query['sql']]
+
+    def test_user_loaded_once_then_invalidated(self):
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/api/deleted-counts/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_cache_holds_no_password_hash(self):
+        self.user_queries()
+        entry = cache.get(user_cache_key(self.user.pk))
+        self.assertNotIn('password', entry['fields'])
+        self.assertNotIn(self.user.password, repr(entry))
+
+    def test_queryset_update_invalidates(self):
+        self.user_queries()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.get('/api/deleted-counts/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_revokes_cached_token(self):
+        with patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True):
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+            self.user_queries()
+            self.assertEqual(self.user_queries(), [])
+
+            User.objects.filter(pk=self.user.pk).update(password=make_password('changed'))
+            response = self.client.get('/api/deleted-counts/')
+            self.assertEqual(response.status_code, 401)
+
+    def test_saving_cached_user_keeps_password(self):
+        self.user_queries()
+        user = load_cached_user(cache.get(user_cache_key(self.user.pk)))
+        user.first_name = 'Cached'
+        user.save()
 
-# Create your tests here.
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Cached')
+        self.assertTrue(self.user.check_password('secret'))
@@ -35,6 +35,7 @@ urlpatterns = [
     
     # Deleted records management
     path('deleted-counts/', views.get_all_deleted_counts, name='deleted-counts'),
+    path('reference-cache-stats/', views.reference_cache_stats, name='reference-cache-stats'),
     path('bulk-restore/', views.bulk_restore, name='bulk-restore'),
     path('bulk-permanent-delete/', views.bulk_permanent_delete, name='bulk-permanent-delete'),
     
@@ -45,6 +46,9 @@ urlpatterns = [
     # Balance management endpoints
     path('balance-transactions/<int:company_id>/', views.balance_transactions, name='balance-transactions'),
     path('recalculate-balances/', views.recalculate_balances, name='recalculate-balances'),
+    path('balance-drift/', views.balance_drift, name='balance-drift'),
+    path('compact-balances/', views.compact_balances, name='compact-balances'),
+    path('daily-summary/', views.daily_summary_report, name='daily-summary'),
     path('current-balance/<int:company_id>/<int:mineral_id>/', views.get_current_balance, name='get-current-balance'),
     
     # Debug endpoints
@@ -1,5 +1,5 @@
 # views.py - FIXED VERSION
-from .models import Unit, Mineral, VehicleType, Vehicle, Company, Scale, Maktoob, Purchase, Weight, Balance, Momp, Userprofile, DeletedRelationship
+from .models import Unit, Mineral, VehicleType, Vehicle, Company, Scale, Maktoob, Purchase, Weight, Balance, Momp, Userprofile, DeletedRelationship, BillNumberConflict
 from .serializers import UserSerializer, UserCreateSerializer, UnitSerializer, MineralSerializer, VehicleTypeSerializer, VehicleSerializer, ScaleSerializer, CompanySerializer, MaktoobSerializer, PurchaseSerializer, WeightSerializer, BalanceSerializer, MompSerializer, UserProfileSerializer
 from django.contrib.auth import get_user_model
 from rest_framework.viewsets import ModelViewSet
@@ -15,19 +15,37 @@ from rest_framework import status
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser
 from rest_framework.filters import OrderingFilter
 from rest_framework import filters
-from django.db import transaction
+from django.conf import settings
+from django.db import connection, transaction
+import datetime
+import time
 import traceback
 from django.utils import timezone
-from django.db.models import Sum, F
+from django.db.models import Sum, F, Count
 import traceback
 import logging
 from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.utils.urls import replace_query_param
 
 # Add these imports at the top
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .serializers import CustomTokenObtainPairSerializer
+from . import balances as balance_service
+from . import journal as balance_journal
+from . import history as transaction_history
+from . import checkpoints as balance_checkpoints
+from . import summaries as daily_summaries
+from .deleted_counts import get_deleted_counts, invalidate_deleted_counts
+from .bulk import ingest_weight_tickets, import_purchases, read_spreadsheet_rows
+from .exports import ExportViewSetMixin
+from .pagination import ListPagination
+from .filters import FieldFilterBackend
+from .availability import check_ticket, check_tickets, to_int
+from .reference_cache import ReferenceCacheViewSetMixin, get_stats as get_reference_cache_stats
+from . import recycle as recycle_bin
 
 User = get_user_model()
 
@@ -154,6 +172,12 @@ class SoftDeleteViewSetMixin:
                 'message': f'{self.queryset.model.__name__} restored successfully',
                 'id': instance.id
             })
+        except BillNumberConflict as e:
+            return Response({
+                'status': 'error',
+                'message': str(e),
+                'bill_numbers': e.bill_numbers
+            }, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             logger.error(f"Error restoring {self.queryset.model.__name__}: {str(e)}")
             logger.error(traceback.format_exc())
@@ -177,6 +201,7 @@ class SoftDeleteViewSetMixin:
             with transaction.atomic():
                 # Perform hard delete
                 instance.delete()
+                invalidate_deleted_counts()
             return Response({
                 'status': 'success',
                 'message': f'{self.queryset.model.__name__} permanently deleted',
@@ -256,17 +281,52 @@ class UserProfileViewSet(ModelViewSet):
             serializer.save()
             return Response(serializer.data)
 
-class UnitViewSet(SoftDeleteViewSetMixin, ModelViewSet):
+class UnitViewSet(ReferenceCacheViewSetMixin, SoftDeleteViewSetMixin, ModelViewSet):
     queryset = Unit.objects.all()
     serializer_class = UnitSerializer
     permission_classes = [IsAuthenticated]
 
-class MineralViewSet(SoftDeleteViewSetMixin, ModelViewSet):
+class MineralViewSet(ReferenceCacheViewSetMixin, SoftDeleteViewSetMixin, ModelViewSet):
     queryset = Mineral.objects.all()
     serializer_class = MineralSerializer
     permission_classes = [IsAuthenticated]
 
-class VehicleTypeViewSet(SoftDeleteViewSetMixin, ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def totals(self, request):
+        """Purchased, weighed and remaining totals for all minerals in one response
+        
+        Optional filters: company_id, scale_id, date_from, date_to (YYYY-MM-DD).
+        """
+        filters = {}
+        try:
+            for param in ('company_id', 'scale_id'):
+                if request.query_params.get(param):
+                    filters[param] = int(request.query_params[param])
+            for param in ('date_from', 'date_to'):
+                if request.query_params.get(param):
+                    filters[param] = datetime.date.fromisoformat(request.query_params[param])
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'company_id and scale_id must be ids, date_from and date_to YYYY-MM-DD dates'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        minerals = balance_service.get_mineral_totals(**filters)
+        return Response({
+            'status': 'success',
+            'filters': {key: str(value) for key, value in filters.items()},
+            'minerals': minerals,
+            'grand_totals': {
+                key: sum(row[key] for row in minerals)
+                for key in (
+                    'purchased_amount', 'purchased_total_price', 'purchase_count',
+                    'weighed_net_weight', 'weighed_second_weight', 'weight_count',
+                    'remaining_balance', 'balance_count',
+                )
+            }
+        })
+
+class VehicleTypeViewSet(ReferenceCacheViewSetMixin, SoftDeleteViewSetMixin, ModelViewSet):
     queryset = VehicleType.objects.all()
     serializer_class = VehicleTypeSerializer
     permission_classes = [IsAuthenticated]
@@ -275,6 +335,9 @@ class VehicleViewSet(SoftDeleteViewSetMixin, ModelViewSet):
     queryset = Vehicle.objects.all()
     serializer_class = VehicleSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [FieldFilterBackend]
+    filter_fields = {'vehicle_type': 'vehicle_type', 'status': 'status'}
+    date_filter_field = 'create_at'
     
     def get_queryset(self):
         # Get active vehicles with vehicle_type prefetched
@@ -290,6 +353,9 @@ class CompanyViewSet(SoftDeleteViewSetMixin, ModelViewSet):
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [FieldFilterBackend]
+    filter_fields = {'status': 'status', 'company_type': 'company_type'}
+    date_filter_field = 'create_at'
     
     def get_queryset(self):
         # Get active companies by default
@@ -337,48 +403,7 @@ class CompanyViewSet(SoftDeleteViewSetMixin, ModelViewSet):
                     'message': 'Company not found or not deleted'
                 }, status=status.HTTP_404_NOT_FOUND)
             
-            restored_vehicles = []
-            
-            with transaction.atomic():
-                # Get tracked relationships
-                deleted_relationships = DeletedRelationship.objects.filter(
-                    model_name='Company',
-                    model_id=company.id,
-                    related_model='Vehicle',
-                )
-                
-                for relationship in deleted_relationships:
-                    try:
-                        vehicle = Vehicle.objects.get(id=relationship.related_id)
-                        
-                        # Add vehicle back to company
-                        company.vehicle.add(vehicle)
-                        
-                        # If vehicle is deleted, restore it
-                        if vehicle.is_deleted:
-                            # Check if this vehicle should be restored
-                            # (only restore if no other active companies exist)
-                            other_active_companies = vehicle.companies.filter(
-                                deleted_at__isnull=True
-                            ).exclude(id=company.id).count()
-                            
-                            if other_active_companies == 0:
-                                vehicle.restore()
-                                restored_vehicles.append({
-                                    'id': vehicle.id,
-                                    'name': vehicle.car_name,
-                                    'plate_number': vehicle.plate_number
-                                })
-                        
-                        # Delete the tracking record
-                        relationship.delete()
-                        
-                    except Vehicle.DoesNotExist:
-                        # Vehicle was hard deleted, skip it
-                        pass
-                
-                # Now restore the company
-                company.restore()
+            restored_vehicles = company.restore_with_vehicles()
             
             return Response({
                 'status': 'success',
@@ -388,6 +413,12 @@ class CompanyViewSet(SoftDeleteViewSetMixin, ModelViewSet):
                 'restored_vehicles': restored_vehicles,
                 'restored_vehicle_count': len(restored_vehicles)
             })
+        except BillNumberConflict as e:
+            return Response({
+                'status': 'error',
+                'message': str(e),
+                'bill_numbers': e.bill_numbers
+            }, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             logger.error(f"Error restoring company with vehicles: {str(e)}")
             return Response({
@@ -442,10 +473,13 @@ class CompanyViewSet(SoftDeleteViewSetMixin, ModelViewSet):
                 'message': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class ScaleViewSet(SoftDeleteViewSetMixin, ModelViewSet):
+class ScaleViewSet(ReferenceCacheViewSetMixin, SoftDeleteViewSetMixin, ModelViewSet):
     queryset = Scale.objects.all()
     serializer_class = ScaleSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [FieldFilterBackend]
+    filter_fields = {'status': 'status'}
+    date_filter_field = 'create_at'
     
     def perform_destroy(self, instance):
         """Override destroy to use soft delete"""
@@ -455,6 +489,10 @@ class MaktoobViewSet(SoftDeleteViewSetMixin, ModelViewSet):
     queryset = Maktoob.objects.all()
     serializer_class = MaktoobSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ListPagination
+    filter_backends = [FieldFilterBackend]
+    filter_fields = {'company': 'company'}
+    date_filter_field = 'create_at'
     
     def get_queryset(self):
         if self.action == 'deleted':
@@ -465,10 +503,20 @@ class MaktoobViewSet(SoftDeleteViewSetMixin, ModelViewSet):
         """Override destroy to use soft delete"""
         instance.soft_delete()
 
-class PurchaseViewSet(SoftDeleteViewSetMixin, ModelViewSet):
+class PurchaseViewSet(ExportViewSetMixin, SoftDeleteViewSetMixin, ModelViewSet):
     queryset = Purchase.objects.all()
     serializer_class = PurchaseSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ListPagination
+    filter_backends = [FieldFilterBackend]
+    filter_fields = {'company': 'company', 'mineral': 'mineral', 'maktoob': 'maktoob', 'scale': 'scale'}
+    date_filter_field = 'create_at'
+    export_fields = [
+        'id', 'create_at', 'update_at', 'company_id', 'company__company_name', 'company__TIN_number',
+        'mineral_id', 'mineral__name', 'maktoob_id', 'scale_id', 'scale__name', 'unit_id', 'area',
+        'mineral_amount', 'unit_price', 'mineral_total_price', 'royalty_receipt_number',
+        'weighing_total_price', 'haq_wazan_receipt_number', 'user_id',
+    ]
     
     def get_queryset(self):
         # Get active purchases with related data
@@ -476,18 +524,90 @@ class PurchaseViewSet(SoftDeleteViewSetMixin, ModelViewSet):
             return Purchase.get_deleted_objects().select_related(
                 'company', 'maktoob', 'mineral', 'user', 'scale', 'unit'
             )
-        return Purchase.get_active_objects().select_related(
+        queryset = Purchase.get_active_objects().select_related(
             'company', 'maktoob', 'mineral', 'user', 'scale', 'unit'
+        ).annotate(
+            current_balance_amount=balance_service.current_balance_subquery()
         )
+        # ?expand=company,mineral,... inlines related objects from the same joins
+        return PurchaseSerializer.expand_queryset(queryset, self.request)
     
     def perform_destroy(self, instance):
         """Override destroy to use soft delete"""
         instance.soft_delete()
+    
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        """Import purchases from an uploaded .csv or .xlsx file
+        
+        The first row must hold the column names: area, mineral_amount,
+        unit_price, mineral_total_price, royalty_receipt_number,
+        weighing_total_price, haq_wazan_receipt_number, TIN_number, mineral
+        and optionally maktoob_number, scale and unit. Send mode=partial to
+        skip invalid rows instead of rejecting the whole file.
+        """
+        upload = request.FILES.get('file')
+        mode = request.data.get('mode', 'atomic')
+        
+        if not upload:
+            return Response({
+                'status': 'error',
+                'message': 'A file is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if mode not in ('atomic', 'partial'):
+            return Response({
+                'status': 'error',
+                'message': 'mode must be "atomic" or "partial"'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            result = import_purchases(
+                read_spreadsheet_rows(upload, upload.name),
+                user=request.user,
+                atomic=(mode == 'atomic'),
+            )
+        except ValueError as e:
+            return Response({
+                'status': 'error',
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error importing purchases: {str(e)}")
+            logger.error(traceback.format_exc())
+            return Response({
+                'status': 'error',
+                'message': f'Failed to import purchases: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        rejected = mode == 'atomic' and result['error_count'] > 0
+        return Response({
+            'status': 'error' if rejected else 'success',
+            'message': (
+                f"Import rejected: {result['error_count']} invalid rows" if rejected
+                else f"Imported {result['created_count']} of {result['rows']} rows"
+            ),
+            'mode': mode,
+            **result
+        }, status=status.HTTP_400_BAD_REQUEST if rejected else status.HTTP_201_CREATED)
 
-class WeightViewSet(SoftDeleteViewSetMixin, ModelViewSet):
+class WeightViewSet(ExportViewSetMixin, SoftDeleteViewSetMixin, ModelViewSet):
     queryset = Weight.objects.all().order_by('-id')
     serializer_class = WeightSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ListPagination
+    filter_backends = [FieldFilterBackend]
+    filter_fields = {
+        'company': 'purchase__company', 'purchase': 'purchase', 'mineral': 'mineral',
+        'vehicle': 'vehicle', 'scale': 'scale',
+    }
+    date_filter_field = 'create_at'
+    export_fields = [
+        'id', 'create_at', 'update_at', 'bill_number', 'purchase_id', 'purchase__company_id',
+        'purchase__company__company_name', 'mineral_id', 'mineral__name', 'vehicle_id',
+        'vehicle__plate_number', 'scale_id', 'scale__name', 'unit_id', 'second_weight',
+        'mineral_net_weight', 'control_weight', 'area', 'discharge_place', 'user_id',
+    ]
     
     def get_queryset(self):
         # Get active weights with related data
@@ -495,9 +615,13 @@ class WeightViewSet(SoftDeleteViewSetMixin, ModelViewSet):
             return Weight.get_deleted_objects().select_related(
                 'vehicle', 'scale', 'mineral', 'unit', 'purchase', 'user'
             )
-        return Weight.get_active_objects().select_related(
+        queryset = Weight.get_active_objects().select_related(
             'vehicle', 'scale', 'mineral', 'unit', 'purchase', 'user'
+        ).annotate(
+            current_balance_amount=balance_service.current_balance_subquery('purchase__company')
         )
+        # ?expand=company,vehicle,... inlines related objects from the same joins
+        return WeightSerializer.expand_queryset(queryset, self.request)
     
     def perform_destroy(self, instance):
         """Override destroy to use soft delete"""
@@ -513,55 +637,156 @@ class WeightViewSet(SoftDeleteViewSetMixin, ModelViewSet):
                 'message': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
     
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """Create a batch of scale tickets in one request
+        
+        Body: {"tickets": [...], "mode": "atomic" | "partial"}. In atomic mode
+        (default) any invalid ticket rejects the whole batch; in partial mode
+        valid tickets are saved and invalid ones are reported per row.
+        """
+        tickets = request.data.get('tickets')
+        mode = request.data.get('mode', 'atomic')
+        
+        if not isinstance(tickets, list) or not tickets:
+            return Response({
+                'status': 'error',
+                'message': 'tickets must be a non-empty list'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if mode not in ('atomic', 'partial'):
+            return Response({
+                'status': 'error',
+                'message': 'mode must be "atomic" or "partial"'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        max_tickets = getattr(settings, 'WEIGHT_BULK_MAX_TICKETS', 1000)
+        if len(tickets) > max_tickets:
+            return Response({
+                'status': 'error',
+                'message': f'At most {max_tickets} tickets can be uploaded at once'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            result = ingest_weight_tickets(tickets, user=request.user, atomic=(mode == 'atomic'))
+        except Exception as e:
+            logger.error(f"Error in bulk weight upload: {str(e)}")
+            logger.error(traceback.format_exc())
+            return Response({
+                'status': 'error',
+                'message': f'Failed to upload tickets: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        rejected = mode == 'atomic' and result['error_count'] > 0
+        return Response({
+            'status': 'error' if rejected else 'success',
+            'message': (
+                f"Batch rejected: {result['error_count']} invalid tickets" if rejected
+                else f"Created {result['created_count']} of {len(tickets)} tickets"
+            ),
+            'mode': mode,
+            **result
+        }, status=status.HTTP_400_BAD_REQUEST if rejected else status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], url_path='bill-number-exists')
+    def bill_number_exists(self, request):
+        """Check whether an active weight already uses ?bill_number="""
+        bill_number = request.query_params.get('bill_number', '').strip()
+        if not bill_number:
+            return Response({
+                'status': 'error',
+                'message': 'bill_number is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        exclude_pk = request.query_params.get('exclude')
+        try:
+            exclude_pk = int(exclude_pk) if exclude_pk else None
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'exclude must be a weight id'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'status': 'success',
+            'bill_number': bill_number,
+            'exists': bool(Weight.get_existing_bill_numbers([bill_number], exclude_pk=exclude_pk))
+        })
+
+    @action(detail=False, methods=['post'], url_path='bill-numbers-check')
+    def bill_numbers_check(self, request):
+        """Return which of {"bill_numbers": [...]} are already used, in one query"""
+        bill_numbers = request.data.get('bill_numbers')
+        if not isinstance(bill_numbers, list):
+            return Response({
+                'status': 'error',
+                'message': 'bill_numbers must be a list'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        max_bill_numbers = getattr(settings, 'WEIGHT_BULK_MAX_TICKETS', 1000)
+        if len(bill_numbers) > max_bill_numbers:
+            return Response({
+                'status': 'error',
+                'message': f'At most {max_bill_numbers} bill numbers can be checked at once'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        bill_numbers = [str(bill_number).strip() for bill_number in bill_numbers if bill_number not in (None, '')]
+        existing = Weight.get_existing_bill_numbers(bill_numbers)
+        return Response({
+            'status': 'success',
+            'existing': sorted(existing),
+            'results': {bill_number: bill_number in existing for bill_number in bill_numbers}
+        })
+
+    @action(detail=False, methods=['post'], url_path='check-available')
     def check_available(self, request):
-        """Check if weight can be added without exceeding balance"""
+        """Check if weight can be added without exceeding balance
+        
+        Body: {"purchase", "mineral", "mineral_net_weight"}, or
+        {"tickets": [...]} to check many tickets at once against a running
+        balance.
+        """
         try:
-            purchase_id = request.data.get('purchase')
-            mineral_id = request.data.get('mineral')
-            weight_amount = int(request.data.get('mineral_net_weight', 0))
-            
-            if not purchase_id or not mineral_id:
+            tickets = request.data.get('tickets')
+            if tickets is not None:
+                if not isinstance(tickets, list):
+                    return Response({
+                        'status': 'error',
+                        'message': 'tickets must be a list'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                
+                max_tickets = getattr(settings, 'WEIGHT_BULK_MAX_TICKETS', 1000)
+                if len(tickets) > max_tickets:
+                    return Response({
+                        'status': 'error',
+                        'message': f'At most {max_tickets} tickets can be checked at once'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                
+                results = check_tickets(tickets)
                 return Response({
-                    'status': 'error',
-                    'message': 'Purchase and mineral are required'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            purchase = Purchase.objects.get(id=purchase_id)
-            mineral = Mineral.objects.get(id=mineral_id)
-            
-            # Get current balance
-            balance = Balance.objects.filter(
-                company=purchase.company,
-                mineral=mineral,
-                deleted_at__isnull=True
-            ).first()
+                    'status': 'success',
+                    'can_add_all': all(result['can_add'] for result in results),
+                    'results': results
+                })
             
-            current_balance = balance.remaining_mineral_amount if balance else 0
+            result = check_ticket(
+                request.data.get('purchase'),
+                request.data.get('mineral'),
+                request.data.get('mineral_net_weight', 0),
+            )
             
-            # Check if weight can be added
-            can_add = weight_amount <= current_balance
-            remaining_after = current_balance - weight_amount
+            if 'error' in result:
+                return Response({
+                    'status': 'error',
+                    'message': result['error']
+                }, status=status.HTTP_404_NOT_FOUND if result['error'] == 'Purchase not found' else status.HTTP_400_BAD_REQUEST)
             
             return Response({
                 'status': 'success',
-                'can_add': can_add,
-                'current_balance': current_balance,
-                'requested_weight': weight_amount,
-                'remaining_after': remaining_after if can_add else current_balance,
-                'message': f'Can add weight: {can_add}. Available: {current_balance}, Required: {weight_amount}'
+                **result,
+                'message': f"Can add weight: {result['can_add']}. Available: {result['current_balance']}, Required: {result['requested_weight']}"
             })
             
-        except Purchase.DoesNotExist:
-            return Response({
-                'status': 'error',
-                'message': 'Purchase not found'
-            }, status=status.HTTP_404_NOT_FOUND)
-        except Mineral.DoesNotExist:
-            return Response({
-                'status': 'error',
-                'message': 'Mineral not found'
-            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             logger.error(f"Error checking available weight: {str(e)}")
             return Response({
@@ -569,20 +794,24 @@ class WeightViewSet(SoftDeleteViewSetMixin, ModelViewSet):
                 'message': f'Failed to check: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class BalanceViewSet(SoftDeleteViewSetMixin, ModelViewSet):
+class BalanceViewSet(ExportViewSetMixin, SoftDeleteViewSetMixin, ModelViewSet):
     queryset = Balance.objects.all()
     serializer_class = BalanceSerializer
     permission_classes = [IsAuthenticated]
+    export_fields = [
+        'id', 'company_id', 'company__company_name', 'company_type', 'mineral_id', 'mineral__name',
+        'remaining_mineral_amount', 'count_90days', 'create_at', 'update_at',
+    ]
     
     def get_queryset(self):
         # Get active balances with related data
         if self.action == 'deleted':
             return Balance.get_deleted_objects().select_related(
-                'purchase', 'company', 'mineral'
+                'company', 'mineral'
             )
         
         queryset = Balance.get_active_objects().select_related(
-            'purchase', 'company', 'mineral'
+            'company', 'mineral'
         )
         
         # Add filtering options
@@ -600,94 +829,174 @@ class BalanceViewSet(SoftDeleteViewSetMixin, ModelViewSet):
         """Override destroy to use soft delete"""
         instance.soft_delete()
     
-    @action(detail=False, methods=['get'])
-    def company_report(self, request):
-        """Get balance report by company"""
+    def get_report_queryset(self, request, periods=None):
+        """Active balances narrowed by the optional report filters and date range periods"""
+        queryset = Balance.get_active_objects()
+        
         company_id = request.query_params.get('company_id')
+        mineral_id = request.query_params.get('mineral_id')
+        company_type = request.query_params.get('company_type')
         
         if company_id:
-            balances = Balance.get_active_objects().filter(
-                company_id=company_id
-            ).select_related('company', 'mineral')
-        else:
-            balances = Balance.get_active_objects().select_related('company', 'mineral')
+            queryset = queryset.filter(company_id=company_id)
+        if mineral_id:
+            queryset = queryset.filter(mineral_id=mineral_id)
+        if company_type:
+            queryset = queryset.filter(company_type=company_type)
+        if periods is not None:
+            # Pairs without movements in the range are dropped by the report loop
+            queryset = queryset.filter(company_id__in={company_id for company_id, _ in periods})
         
-        # Group by company and mineral
-        report = {}
-        for balance in balances:
-            company_name = balance.company.company_name if balance.company else 'Unknown'
-            mineral_name = balance.mineral.name if balance.mineral else 'Unknown'
-            
-            key = f"{company_name} - {mineral_name}"
-            
-            if key not in report:
-                report[key] = {
-                    'company': company_name,
-                    'company_id': balance.company.id if balance.company else None,
-                    'mineral': mineral_name,
-                    'mineral_id': balance.mineral.id if balance.mineral else None,
-                    'total_remaining': 0,
-                    'balances': []
-                }
-            
-            report[key]['total_remaining'] += balance.remaining_mineral_amount
-            report[key]['balances'].append({
-                'id': balance.id,
-                'remaining_amount': balance.remaining_mineral_amount,
-                'purchase_id': balance.purchase.id if balance.purchase else None,
-                'create_at': balance.create_at
+        return queryset
+    
+    def get_report_periods(self, request):
+        """
+        Journal figures of the reports' ?date_from= / ?date_to= range (inclusive).
+        
+        None without either date; date_to defaults to today. A range lists only
+        the pairs with balance movements in it, reporting their balance at the
+        end of date_to with the opening balance and the change over the range.
+        Raises ValueError for malformed or reversed dates.
+        """
+        date_from = request.query_params.get('date_from')
+        date_to = request.query_params.get('date_to')
+        if not date_from and not date_to:
+            return None
+        
+        date_from = datetime.date.fromisoformat(date_from) if date_from else None
+        date_to = datetime.date.fromisoformat(date_to) if date_to else timezone.localdate()
+        if date_from and date_from > date_to:
+            raise ValueError('date_from is after date_to')
+        
+        return balance_checkpoints.get_period_balances(
+            date_from, date_to,
+            to_int(request.query_params.get('company_id')),
+            to_int(request.query_params.get('mineral_id')),
+        )
+    
+    def invalid_range(self, error):
+        return Response({
+            'status': 'error',
+            'message': f'date_from and date_to must be YYYY-MM-DD dates in order: {error}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'], url_path='as-of')
+    def as_of(self, request):
+        """Balances at the end of ?as_of=YYYY-MM-DD, optionally narrowed by company_id / mineral_id"""
+        try:
+            day = datetime.date.fromisoformat(request.query_params.get('as_of', ''))
+            company_id = int(request.query_params['company_id']) if request.query_params.get('company_id') else None
+            mineral_id = int(request.query_params['mineral_id']) if request.query_params.get('mineral_id') else None
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'as_of must be a YYYY-MM-DD date, company_id and mineral_id ids'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        balances = list(balance_checkpoints.get_balances_as_of(day, company_id, mineral_id).values())
+        return Response({
+            'status': 'success',
+            'as_of': day,
+            'count': len(balances),
+            'total_balance': sum(row['balance'] for row in balances),
+            'balances': balances
+        })
+    
+    @action(detail=False, methods=['get'])
+    def company_report(self, request):
+        """Get balance report by company"""
+        try:
+            periods = self.get_report_periods(request)
+        except ValueError as e:
+            return self.invalid_range(e)
+        
+        queryset = self.get_report_queryset(request, periods)
+        rows = queryset.values(
+            'company_id', 'company__company_name', 'mineral_id', 'mineral__name'
+        ).annotate(
+            total_remaining=Sum('remaining_mineral_amount'),
+            balance_count=Count('id'),
+        ).order_by('company__company_name', 'mineral__name')
+        
+        # The per-balance entries the report has always listed, in one more query
+        balances = {}
+        for balance in queryset.values('id', 'company_id', 'mineral_id', 'remaining_mineral_amount', 'create_at').order_by('id'):
+            key = (balance['company_id'], balance['mineral_id'])
+            balances.setdefault(key, []).append({
+                'id': balance['id'],
+                'remaining_amount': periods[key]['closing_balance'] if periods and key in periods else balance['remaining_mineral_amount'],
+                'create_at': balance['create_at']
             })
         
+        report = []
+        for row in rows:
+            key = (row['company_id'], row['mineral_id'])
+            entry = {
+                'company': row['company__company_name'],
+                'company_id': row['company_id'],
+                'mineral': row['mineral__name'],
+                'mineral_id': row['mineral_id'],
+                'total_remaining': row['total_remaining'] or 0,
+                'balance_count': row['balance_count'],
+                'balances': balances.get(key, []),
+            }
+            if periods is not None:
+                if key not in periods:
+                    continue
+                # company_id + mineral_id is unique, so the pair's figures are the row's
+                entry['total_remaining'] = periods[key]['closing_balance']
+                entry['opening_balance'] = periods[key]['opening_balance']
+                entry['period_change'] = periods[key]['period_change']
+            report.append(entry)
+        
         return Response({
             'status': 'success',
-            'report': list(report.values())
+            'report': report
         })
     
     @action(detail=False, methods=['get'])
     def mineral_report(self, request):
         """Get balance report by mineral"""
-        mineral_id = request.query_params.get('mineral_id')
-        
-        if mineral_id:
-            balances = Balance.get_active_objects().filter(
-                mineral_id=mineral_id
-            ).select_related('company', 'mineral')
-        else:
-            balances = Balance.get_active_objects().select_related('company', 'mineral')
-        
-        # Group by mineral
-        report = {}
-        for balance in balances:
-            mineral_name = balance.mineral.name if balance.mineral else 'Unknown'
-            
-            if mineral_name not in report:
-                report[mineral_name] = {
-                    'mineral': mineral_name,
-                    'mineral_id': balance.mineral.id if balance.mineral else None,
+        try:
+            periods = self.get_report_periods(request)
+        except ValueError as e:
+            return self.invalid_range(e)
+        
+        rows = self.get_report_queryset(request, periods).values(
+            'mineral_id', 'mineral__name', 'company_id', 'company__company_name'
+        ).annotate(
+            amount=Sum('remaining_mineral_amount')
+        ).order_by('mineral__name', 'mineral_id', 'company__company_name')
+        
+        # Rows arrive grouped and sorted by mineral, so one pass builds the report
+        report = []
+        for row in rows:
+            key = (row['company_id'], row['mineral_id'])
+            if periods is not None and key not in periods:
+                continue
+            if not report or report[-1]['mineral_id'] != row['mineral_id']:
+                report.append({
+                    'mineral': row['mineral__name'],
+                    'mineral_id': row['mineral_id'],
                     'total_remaining': 0,
                     'companies': []
-                }
-            
-            report[mineral_name]['total_remaining'] += balance.remaining_mineral_amount
-            
-            # Check if company already in list
-            company_exists = False
-            for company_data in report[mineral_name]['companies']:
-                if company_data['company_id'] == balance.company.id:
-                    company_data['amount'] += balance.remaining_mineral_amount
-                    company_exists = True
-                    break
-            
-            if not company_exists and balance.company:
-                report[mineral_name]['companies'].append({
-                    'company': balance.company.company_name,
-                    'company_id': balance.company.id,
-                    'amount': balance.remaining_mineral_amount
                 })
+            
+            company = {
+                'company': row['company__company_name'],
+                'company_id': row['company_id'],
+                'amount': row['amount'] or 0
+            }
+            if periods is not None:
+                company['amount'] = periods[key]['closing_balance']
+                company['opening_balance'] = periods[key]['opening_balance']
+                company['period_change'] = periods[key]['period_change']
+            report[-1]['total_remaining'] += company['amount']
+            report[-1]['companies'].append(company)
         
         return Response({
             'status': 'success',
-            'report': list(report.values())
+            'report': report
         })
     
     @action(detail=False, methods=['get'])
@@ -721,32 +1030,22 @@ class BalanceViewSet(SoftDeleteViewSetMixin, ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Get total balance for this company and mineral
-            balances = Balance.get_active_objects().filter(
-                company_id=company_id,
-                mineral_id=mineral_id
-            )
-            
-            total_available = sum(balance.remaining_mineral_amount for balance in balances)
-            
-            # Get company and mineral info
             company = Company.objects.get(id=company_id)
             mineral = Mineral.objects.get(id=mineral_id)
+            balance = Balance.get_active_objects().filter(company=company, mineral=mineral).first()
             
             return Response({
                 'status': 'success',
                 'company': company.company_name,
                 'mineral': mineral.name,
-                'total_available': total_available,
-                'balance_count': balances.count(),
+                'total_available': balance.remaining_mineral_amount if balance else 0,
+                'balance_count': 1 if balance else 0,
                 'balances': [
                     {
                         'id': balance.id,
-                        'remaining': balance.remaining_mineral_amount,
-                        'purchase_id': balance.purchase.id if balance.purchase else None
+                        'remaining': balance.remaining_mineral_amount
                     }
-                    for balance in balances
-                ]
+                ] if balance else []
             })
             
         except (Company.DoesNotExist, Mineral.DoesNotExist) as e:
@@ -903,60 +1202,23 @@ def check_company_relationships(request, pk):
             'message': f'Error: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def reference_cache_stats(request):
+    """Hit/miss counters of the units/minerals/vehicle-types/scales response cache"""
+    return Response({
+        'status': 'success',
+        **get_reference_cache_stats()
+    })
+
 # New endpoints for deleted records management
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_all_deleted_counts(request):
     """Get counts of all deleted records for each model"""
     try:
-        from django.db.models import Count
-        
-        counts = {
-            'companies': {
-                'count': Company.get_deleted_objects().count(),
-                'model_name': 'Company'
-            },
-            'vehicles': {
-                'count': Vehicle.get_deleted_objects().count(),
-                'model_name': 'Vehicle'
-            },
-            'maktoobs': {
-                'count': Maktoob.get_deleted_objects().count(),
-                'model_name': 'Maktoob'
-            },
-            'purchases': {
-                'count': Purchase.get_deleted_objects().count(),
-                'model_name': 'Purchase'
-            },
-            'units': {
-                'count': Unit.get_deleted_objects().count(),
-                'model_name': 'Unit'
-            },
-            'minerals': {
-                'count': Mineral.get_deleted_objects().count(),
-                'model_name': 'Mineral'
-            },
-            'vehicle_types': {
-                'count': VehicleType.get_deleted_objects().count(),
-                'model_name': 'Vehicle Type'
-            },
-            'scales': {
-                'count': Scale.get_deleted_objects().count(),
-                'model_name': 'Scale'
-            },
-            'weights': {
-                'count': Weight.get_deleted_objects().count(),
-                'model_name': 'Weight'
-            },
-            'balances': {
-                'count': Balance.get_deleted_objects().count(),
-                'model_name': 'Balance'
-            },
-            'momps': {
-                'count': Momp.get_deleted_objects().count(),
-                'model_name': 'MOMP'
-            },
-        }
+        include_active = request.query_params.get('include_active', '').lower() in ('1', 'true', 'yes')
+        counts = get_deleted_counts(include_active=include_active)
         
         total_deleted = sum(item['count'] for item in counts.values())
         
@@ -988,44 +1250,29 @@ def bulk_restore(request):
                 'message': 'Model name and record IDs are required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Map model names to actual models
-        model_map = {
-            'companies': Company,
-            'vehicles': Vehicle,
-            'maktoobs': Maktoob,
-            'purchases': Purchase,
-            'units': Unit,
-            'minerals': Mineral,
-            'vehicle-types': VehicleType,
-            'scales': Scale,
-            'weights': Weight,
-            'balances': Balance,
-            'momps': Momp,
-        }
-        
-        model_class = model_map.get(model_name)
+        model_class = recycle_bin.MODEL_MAP.get(model_name)
         if not model_class:
             return Response({
                 'status': 'error',
                 'message': f'Invalid model name: {model_name}'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get deleted records
-        deleted_records = model_class.get_deleted_objects().filter(id__in=record_ids)
-        
-        restored_count = 0
-        with transaction.atomic():
-            for record in deleted_records:
-                record.restore()
-                restored_count += 1
+        stats = recycle_bin.bulk_restore(model_class, record_ids)
         
         return Response({
             'status': 'success',
-            'message': f'Successfully restored {restored_count} records',
-            'restored_count': restored_count,
-            'total_requested': len(record_ids)
+            'message': f'Successfully restored {stats["restored_count"]} records',
+            'restored_count': stats['restored_count'],
+            'total_requested': len(record_ids),
+            'stats': stats
         })
         
+    except BillNumberConflict as e:
+        return Response({
+            'status': 'error',
+            'message': str(e),
+            'bill_numbers': e.bill_numbers
+        }, status=status.HTTP_409_CONFLICT)
     except Exception as e:
         logger.error(f"Error in bulk restore: {str(e)}")
         return Response({
@@ -1047,42 +1294,21 @@ def bulk_permanent_delete(request):
                 'message': 'Model name and record IDs are required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Map model names to actual models
-        model_map = {
-            'companies': Company,
-            'vehicles': Vehicle,
-            'maktoobs': Maktoob,
-            'purchases': Purchase,
-            'units': Unit,
-            'minerals': Mineral,
-            'vehicle-types': VehicleType,
-            'scales': Scale,
-            'weights': Weight,
-            'balances': Balance,
-            'momps': Momp,
-        }
-        
-        model_class = model_map.get(model_name)
+        model_class = recycle_bin.MODEL_MAP.get(model_name)
         if not model_class:
             return Response({
                 'status': 'error',
                 'message': f'Invalid model name: {model_name}'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get deleted records
-        deleted_records = model_class.get_deleted_objects().filter(id__in=record_ids)
-        
-        deleted_count = 0
-        with transaction.atomic():
-            for record in deleted_records:
-                record.delete()  # This performs hard delete
-                deleted_count += 1
+        stats = recycle_bin.bulk_permanent_delete(model_class, record_ids)
         
         return Response({
             'status': 'success',
-            'message': f'Successfully permanently deleted {deleted_count} records',
-            'deleted_count': deleted_count,
-            'total_requested': len(record_ids)
+            'message': f'Successfully permanently deleted {stats["deleted_count"]} records',
+            'deleted_count': stats['deleted_count'],
+            'total_requested': len(record_ids),
+            'stats': stats
         })
         
     except Exception as e:
@@ -1098,11 +1324,28 @@ from django.utils import timezone
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def health_check(request):
-    """Health check endpoint"""
+    """Health check endpoint, including a round trip to the database"""
+    started = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Exception as e:
+        logger.error(f"Database health check failed: {str(e)}")
+        return Response({
+            'status': 'unhealthy',
+            'timestamp': timezone.now().isoformat(),
+            'message': 'Database is unreachable'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    
     return Response({
         'status': 'healthy',
         'timestamp': timezone.now().isoformat(),
-        'message': 'Django backend is running'
+        'message': 'Django backend is running',
+        'database': {
+            'connection_mode': getattr(settings, 'DB_CONN_MODE', 'persistent'),
+            'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE'),
+            'round_trip_ms': round((time.perf_counter() - started) * 1000, 2),
+        }
     })
 
 # Test endpoint to create some deleted records for testing
@@ -1194,46 +1437,20 @@ def test_restore_company_with_vehicles(request, pk):
                 'message': 'Company not found or not deleted'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # Get tracked relationships before restoration
-        tracked_relationships = DeletedRelationship.objects.filter(
-            model_name='Company',
-            model_id=company.id,
-            related_model='Vehicle',
-        )
-        
-        tracked_vehicle_ids = [r.related_id for r in tracked_relationships]
+        tracked_vehicle_ids = company.get_tracked_vehicle_ids()
         
         # Get vehicle status before restoration
-        vehicles_before = []
-        for vehicle_id in tracked_vehicle_ids:
-            try:
-                vehicle = Vehicle.objects.get(id=vehicle_id)
-                vehicles_before.append({
-                    'id': vehicle.id,
-                    'name': vehicle.car_name,
-                    'is_deleted': vehicle.is_deleted,
-                })
-            except Vehicle.DoesNotExist:
-                pass
+        vehicles_before = [
+            {
+                'id': vehicle['id'],
+                'name': vehicle['car_name'],
+                'is_deleted': vehicle['deleted_at'] is not None,
+            }
+            for vehicle in Vehicle.objects.filter(id__in=tracked_vehicle_ids).values('id', 'car_name', 'deleted_at')
+        ]
         
         # Restore company with vehicles
-        restored_vehicles = []
-        
-        with transaction.atomic():
-            # Restore the company (this will trigger cascade_restore)
-            company.restore()
-            
-            # Check which vehicles were restored
-            for vehicle_id in tracked_vehicle_ids:
-                try:
-                    vehicle = Vehicle.objects.get(id=vehicle_id)
-                    if not vehicle.is_deleted:
-                        restored_vehicles.append({
-                            'id': vehicle.id,
-                            'name': vehicle.car_name,
-                        })
-                except Vehicle.DoesNotExist:
-                    pass
+        restored_vehicles = company.restore_with_vehicles()
         
         return Response({
             'status': 'success',
@@ -1256,88 +1473,66 @@ def test_restore_company_with_vehicles(request, pk):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def balance_transactions(request, company_id):
-    """Get all transactions (purchases and weights) affecting a company's balance"""
+    """
+    Page through the transactions (purchases and weights) affecting a company's balance.
+    
+    Newest first, ?page_size= rows per page (max 500), optional ?mineral=;
+    follow "next" (or pass ?cursor=) for older rows.
+    """
     try:
         company = Company.objects.get(id=company_id)
+        mineral_id = to_int(request.query_params.get('mineral'))
+        page_size = min(max(to_int(request.query_params.get('page_size')) or 50, 1), 500)
         
-        # Get all purchases for this company
-        purchases = Purchase.get_active_objects().filter(
-            company=company
-        ).select_related('mineral')
-        
-        # Get all weights for this company (through purchases)
-        weights = Weight.get_active_objects().filter(
-            purchase__company=company
-        ).select_related('purchase', 'mineral')
+        cursor = request.query_params.get('cursor')
+        try:
+            cursor = transaction_history.decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid cursor'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get current balances for all minerals
-        balances = Balance.get_active_objects().filter(
-            company=company
-        ).select_related('mineral')
+        totals = transaction_history.get_history_totals(company.id, mineral_id=mineral_id)
+        rows, has_more, carried = transaction_history.get_transaction_history(
+            company.id, mineral_id=mineral_id, cursor=cursor, page_size=page_size,
+            balances={row['mineral_id']: row['current_balance'] for row in totals['minerals']},
+        )
         
         transactions = []
-        
-        # Add purchases as positive transactions
-        for purchase in purchases:
-            transactions.append({
-                'type': 'PURCHASE',
-                'id': purchase.id,
-                'date': purchase.create_at,
-                'mineral': purchase.mineral.name if purchase.mineral else 'Unknown',
-                'mineral_id': purchase.mineral.id if purchase.mineral else None,
-                'amount': purchase.mineral_amount,
-                'action': 'ADDED',
-                'description': f'Purchase from {purchase.area}',
-                'reference': f'Purchase #{purchase.id}'
-            })
-        
-        # Add weights as negative transactions
-        for weight in weights:
+        for row in rows:
+            is_purchase = row['entry_kind'] == transaction_history.PURCHASE
             transactions.append({
-                'type': 'WEIGHT',
-                'id': weight.id,
-                'date': weight.create_at,
-                'mineral': weight.mineral.name if weight.mineral else 'Unknown',
-                'mineral_id': weight.mineral.id if weight.mineral else None,
-                'amount': weight.mineral_net_weight,
-                'action': 'SUBTRACTED',
-                'description': f'Weight transfer: {weight.transfor_type}',
-                'reference': f'Weight #{weight.id}'
+                'type': 'PURCHASE' if is_purchase else 'WEIGHT',
+                'id': row['entry_id'],
+                'date': row['entry_date'],
+                'mineral': row['entry_mineral_name'] or 'Unknown',
+                'mineral_id': row['entry_mineral_id'],
+                'amount': row['entry_amount'],
+                'action': 'ADDED' if is_purchase else 'SUBTRACTED',
+                'description': f"Purchase from {row['entry_detail']}" if is_purchase else f"Weight bill {row['entry_detail']}",
+                'reference': f"{'Purchase' if is_purchase else 'Weight'} #{row['entry_id']}",
+                'running_balance': row['running_balance'],
             })
         
-        # Sort transactions by date (newest first)
-        transactions.sort(key=lambda x: x['date'], reverse=True)
-        
-        # Calculate current balance for each mineral
-        mineral_balances = {}
-        for transaction in transactions:
-            mineral = transaction['mineral']
-            amount = transaction['amount']
-            
-            if mineral not in mineral_balances:
-                mineral_balances[mineral] = {
-                    'mineral_name': mineral,
-                    'mineral_id': transaction['mineral_id'],
-                    'current_balance': 0,
-                    'total_added': 0,
-                    'total_subtracted': 0
-                }
-            
-            if transaction['action'] == 'ADDED':
-                mineral_balances[mineral]['current_balance'] += amount
-                mineral_balances[mineral]['total_added'] += amount
-            else:
-                mineral_balances[mineral]['current_balance'] -= amount
-                mineral_balances[mineral]['total_subtracted'] += amount
+        next_link = None
+        if has_more:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), 'cursor', transaction_history.encode_cursor(rows[-1], carried)
+            )
         
         # Add actual balance from database
-        actual_balances = []
-        for balance in balances:
-            actual_balances.append({
+        balances = Balance.get_active_objects().filter(company=company).select_related('mineral')
+        if mineral_id:
+            balances = balances.filter(mineral_id=mineral_id)
+        actual_balances = [
+            {
                 'mineral': balance.mineral.name if balance.mineral else 'Unknown',
                 'remaining': balance.remaining_mineral_amount,
                 'status': balance.get_balance_status()
-            })
+            }
+            for balance in balances
+        ]
         
         return Response({
             'status': 'success',
@@ -1345,12 +1540,13 @@ def balance_transactions(request, company_id):
                 'id': company.id,
                 'name': company.company_name
             },
-            'calculated_balances': list(mineral_balances.values()),
+            'calculated_balances': totals['minerals'],
             'actual_balances': actual_balances,
             'transactions': transactions,
-            'total_transactions': len(transactions),
-            'total_purchases': purchases.count(),
-            'total_weights': weights.count()
+            'next': next_link,
+            'total_transactions': totals['total_purchases'] + totals['total_weights'],
+            'total_purchases': totals['total_purchases'],
+            'total_weights': totals['total_weights']
         })
         
     except Company.DoesNotExist:
@@ -1368,69 +1564,18 @@ def balance_transactions(request, company_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def recalculate_balances(request):
-    """Recalculate all balances from scratch (useful for fixing data issues) - SINGLE FUNCTION"""
+    """Recalculate all balances from scratch (useful for fixing data issues)"""
     try:
-        with transaction.atomic():
-            # Get all companies and minerals
-            companies = Company.get_active_objects().all()
-            minerals = Mineral.get_active_objects().all()
-            
-            # Clear all existing balances (soft delete)
-            Balance.get_active_objects().update(deleted_at=timezone.now())
-            
-            # Create new balances based on purchases and weights
-            for company in companies:
-                for mineral in minerals:
-                    # Calculate total purchases for this company+mineral
-                    total_purchases = Purchase.get_active_objects().filter(
-                        company=company,
-                        mineral=mineral
-                    ).aggregate(total=Sum('mineral_amount'))['total'] or 0
-                    
-                    # Calculate total weights for this company+mineral
-                    total_weights = Weight.get_active_objects().filter(
-                        purchase__company=company,
-                        mineral=mineral
-                    ).aggregate(total=Sum('mineral_net_weight'))['total'] or 0
-                    
-                    # Calculate net balance
-                    net_balance = total_purchases - total_weights
-                    
-                    # Only create balance if there are transactions
-                    if total_purchases > 0 or total_weights > 0:
-                        # Get the most recent purchase for reference
-                        recent_purchase = Purchase.get_active_objects().filter(
-                            company=company,
-                            mineral=mineral
-                        ).order_by('-create_at').first()
-                        
-                        Balance.objects.create(
-                            remaining_mineral_amount=net_balance,
-                            company_type=company.company_type,
-                            count_90days=90,
-                            purchase=recent_purchase,
-                            company=company,
-                            mineral=mineral
-                        )
-                        
-                        # Update balance_updated flags for purchases
-                        Purchase.get_active_objects().filter(
-                            company=company,
-                            mineral=mineral
-                        ).update(balance_updated=True)
-                        
-                        # Update balance_updated flags for weights
-                        Weight.get_active_objects().filter(
-                            purchase__company=company,
-                            mineral=mineral
-                        ).update(balance_updated=True)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        stats = balance_service.recalculate_balances(dry_run=dry_run)
         
         return Response({
             'status': 'success',
             'message': 'Balances recalculated successfully',
-            'companies_processed': companies.count(),
-            'minerals_processed': minerals.count(),
-            'active_balances': Balance.get_active_objects().count()
+            'companies_processed': Company.get_active_objects().count(),
+            'minerals_processed': Mineral.get_active_objects().count(),
+            'active_balances': Balance.get_active_objects().count(),
+            'stats': stats
         })
         
     except Exception as e:
@@ -1440,14 +1585,130 @@ def recalculate_balances(request):
             'message': f'Failed to recalculate balances: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def balance_drift(request):
+    """List balances whose amount disagrees with their snapshot plus the movement journal"""
+    try:
+        drift = balance_journal.get_balance_drift(
+            company_id=to_int(request.query_params.get('company')),
+            mineral_id=to_int(request.query_params.get('mineral')),
+        )
+        
+        return Response({
+            'status': 'success',
+            'drift_count': len(drift),
+            'balances': drift
+        })
+        
+    except Exception as e:
+        logger.error(f"Error checking balance drift: {str(e)}")
+        return Response({
+            'status': 'error',
+            'message': f'Failed to check balance drift: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def compact_balances(request):
+    """Fold the movement journal into the balance snapshots"""
+    try:
+        stats = balance_journal.compact_balances()
+        
+        return Response({
+            'status': 'success',
+            'message': 'Balance snapshots compacted successfully',
+            'stats': stats
+        })
+        
+    except Exception as e:
+        logger.error(f"Error compacting balances: {str(e)}")
+        return Response({
+            'status': 'error',
+            'message': f'Failed to compact balances: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def daily_summary_report(request):
+    """Weight and purchase totals from the daily summaries
+    
+    group_by: comma-separated day, month, scale, mineral, company (default month,mineral).
+    Optional filters: date_from, date_to (YYYY-MM-DD), company_id, mineral_id, scale_id.
+    """
+    group_by = [name.strip() for name in request.query_params.get('group_by', 'month,mineral').split(',') if name.strip()]
+    try:
+        date_from, date_to = (
+            datetime.date.fromisoformat(request.query_params[param]) if request.query_params.get(param) else None
+            for param in ('date_from', 'date_to')
+        )
+        rows = daily_summaries.get_summary_report(
+            group_by,
+            date_from=date_from,
+            date_to=date_to,
+            company_id=to_int(request.query_params.get('company_id')),
+            mineral_id=to_int(request.query_params.get('mineral_id')),
+            scale_id=to_int(request.query_params.get('scale_id')),
+        )
+    except ValueError as e:
+        return Response({
+            'status': 'error',
+            'message': f'Invalid report parameters: {str(e)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        return Response({
+            'status': 'success',
+            'group_by': group_by,
+            'count': len(rows),
+            'rows': rows,
+            'totals': {
+                field: sum(row[field] for row in rows)
+                for field in daily_summaries.SUMMARY_TOTALS
+            }
+        })
+        
+    except Exception as e:
+        logger.error(f"Error building daily summary report: {str(e)}")
+        return Response({
+            'status': 'error',
+            'message': f'Failed to build report: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_current_balance(request, company_id, mineral_id):
-    """Get current balance for a specific company and mineral"""
+    """
+    Get current balance for a specific company and mineral.
+    
+    ?as_of=YYYY-MM-DD adds the balance at the end of that day;
+    ?date_from=&date_to= adds the daily closing balances over that range.
+    """
     try:
         company = Company.objects.get(id=company_id)
         mineral = Mineral.objects.get(id=mineral_id)
         
+        try:
+            as_of, date_from, date_to = (
+                datetime.date.fromisoformat(request.query_params[param]) if request.query_params.get(param) else None
+                for param in ('as_of', 'date_from', 'date_to')
+            )
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'as_of, date_from and date_to must be YYYY-MM-DD dates'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if bool(date_from) != bool(date_to) or (date_from and date_from > date_to):
+            return Response({
+                'status': 'error',
+                'message': 'date_from and date_to must be given together, date_from first'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if date_from and (date_to - date_from).days > 366:
+            return Response({
+                'status': 'error',
+                'message': 'A balance series covers at most 367 days'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
         # Get all active balances for this company and mineral
         balances = Balance.get_active_objects().filter(
             company=company,
@@ -1493,10 +1754,12 @@ def get_current_balance(request, company_id, mineral_id):
                     'id': w.id,
                     'amount': w.mineral_net_weight,
                     'date': w.create_at,
-                    'type': w.transfor_type
+                    'bill_number': w.bill_number
                 }
                 for w in recent_weights
-            ]
+            ],
+            **({'as_of': balance_checkpoints.get_balance_as_of(company.id, mineral.id, as_of)} if as_of else {}),
+            **({'series': balance_checkpoints.get_balance_series(company.id, mineral.id, date_from, date_to)} if date_from else {})
         })
         
     except (Company.DoesNotExist, Mineral.DoesNotExist) as e:
@@ -1578,22 +1841,12 @@ def debug_balance_system(request, company_id=None, mineral_id=None):
             }
             
         else:
-            # All balances
+            # All balances, checked against the daily summaries instead of the tickets
+            pair_totals = daily_summaries.get_pair_totals()
             balances = Balance.get_active_objects().select_related('company', 'mineral')
             for balance in balances:
-                # Calculate expected balance
-                purchases = Purchase.get_active_objects().filter(
-                    company=balance.company,
-                    mineral=balance.mineral
-                )
-                weights = Weight.get_active_objects().filter(
-                    purchase__company=balance.company,
-                    mineral=balance.mineral
-                )
-                
-                total_purchases = sum(p.mineral_amount for p in purchases)
-                total_weights = sum(w.mineral_net_weight for w in weights)
-                calculated_balance = total_purchases - total_weights
+                totals = pair_totals.get((balance.company_id, balance.mineral_id), {})
+                calculated_balance = (totals.get('purchased') or 0) - (totals.get('weighed') or 0)
                 
                 debug_info['balances'].append({
                     'id': balance.id,
@@ -1602,8 +1855,8 @@ def debug_balance_system(request, company_id=None, mineral_id=None):
                     'actual_balance': balance.remaining_mineral_amount,
                     'calculated_balance': calculated_balance,
                     'match': calculated_balance == balance.remaining_mineral_amount,
-                    'purchase_count': purchases.count(),
-                    'weight_count': weights.count()
+                    'purchase_count': totals.get('purchases') or 0,
+                    'weight_count': totals.get('weights') or 0
                 })
         
         return Response({
@@ -1623,51 +1876,50 @@ def debug_balance_system(request, company_id=None, mineral_id=None):
 def validate_weight_addition(request):
     """Validate if a weight can be added without exceeding balance"""
     try:
-        serializer = WeightSerializer(data=request.data)
-        
-        if serializer.is_valid():
-            # Extract validated data
-            data = serializer.validated_data
-            purchase = data.get('purchase')
-            mineral = data.get('mineral')
-            mineral_net_weight = data.get('mineral_net_weight', 0)
-            
-            if purchase and mineral:
-                # Get current balance
-                balance = Balance.objects.filter(
-                    company=purchase.company,
-                    mineral=mineral,
-                    deleted_at__isnull=True
-                ).first()
-                
-                current_balance = balance.remaining_mineral_amount if balance else 0
-                
-                if mineral_net_weight <= current_balance:
-                    return Response({
-                        'status': 'success',
-                        'message': 'Weight can be added',
-                        'current_balance': current_balance,
-                        'remaining_after': current_balance - mineral_net_weight
-                    })
-                else:
-                    return Response({
-                        'status': 'error',
-                        'message': f'Insufficient balance. Available: {current_balance}, Required: {mineral_net_weight}',
-                        'current_balance': current_balance,
-                        'required': mineral_net_weight,
-                        'deficit': mineral_net_weight - current_balance
-                    }, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                return Response({
-                    'status': 'error',
-                    'message': 'Purchase and mineral are required'
-                }, status=status.HTTP_400_BAD_REQUEST)
-        else:
+        if not request.data.get('purchase') or not request.data.get('mineral'):
+            return Response({
+                'status': 'error',
+                'message': 'Purchase and mineral are required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        result = check_ticket(
+            request.data.get('purchase'),
+            request.data.get('mineral'),
+            request.data.get('mineral_net_weight', 0),
+        )
+        
+        if 'error' in result:
+            return Response({
+                'status': 'error',
+                'message': result['error']
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not result['can_add']:
+            current_balance = result['current_balance']
+            mineral_net_weight = result['requested_weight']
+            return Response({
+                'status': 'error',
+                'message': f'Insufficient balance. Available: {current_balance}, Required: {mineral_net_weight}',
+                'current_balance': current_balance,
+                'required': mineral_net_weight,
+                'deficit': mineral_net_weight - current_balance
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Field and relation checks; the balance part was answered above
+        serializer = WeightSerializer(data=request.data, context={'skip_balance_check': True})
+        if not serializer.is_valid():
             return Response({
                 'status': 'error',
                 'message': 'Invalid data',
                 'errors': serializer.errors
             }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'status': 'success',
+            'message': 'Weight can be added',
+            'current_balance': result['current_balance'],
+            'remaining_after': result['remaining_after']
+        })
             
     except Exception as e:
         logger.error(f"Error validating weight addition: {str(e)}")
@@ -1913,43 +2165,39 @@ def monitor_balance_updates(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_company_mineral_balance(request, company_id, mineral_id):
-    """Get the single balance record for a company-mineral combination"""
+    """Get the balance of a company-mineral combination with its purchase/weight summary"""
     try:
         company = Company.objects.get(id=company_id)
         mineral = Mineral.objects.get(id=mineral_id)
         
-        # Get the ONE balance record for this company-mineral
-        balance = Balance.objects.filter(
-            company=company,
-            mineral=mineral,
-            deleted_at__isnull=True
-        ).first()
-        
+        # The balance row the weight checks read; reported as zero, without
+        # writing one, until the first purchase creates it
+        balance = Balance.get_active_objects().filter(company=company, mineral=mineral).first()
         if not balance:
-            # Create a new balance with zero amount if it doesn't exist
-            balance = Balance.objects.create(
+            balance = Balance(
                 remaining_mineral_amount=0,
                 company_type=company.company_type,
                 company=company,
                 mineral=mineral
             )
         
-        # Get related purchases and weights for this balance
+        # Totals come from aggregates; only the five most recent rows are loaded
         purchases = Purchase.get_active_objects().filter(
             company=company,
             mineral=mineral
-        ).order_by('-create_at')
-        
+        )
         weights = Weight.get_active_objects().filter(
             purchase__company=company,
             mineral=mineral
-        ).order_by('-create_at')
-        
-        serializer = BalanceSerializer(balance)
+        )
+        purchase_totals = purchases.aggregate(count=Count('id'), amount=Sum('mineral_amount'))
+        weight_totals = weights.aggregate(count=Count('id'), amount=Sum('mineral_net_weight'))
+        purchase_amount = purchase_totals['amount'] or 0
+        weight_amount = weight_totals['amount'] or 0
         
         return Response({
             'status': 'success',
-            'balance': serializer.data,
+            'balance': BalanceSerializer(balance).data,
             'company': {
                 'id': company.id,
                 'name': company.company_name
@@ -1959,29 +2207,29 @@ def get_company_mineral_balance(request, company_id, mineral_id):
                 'name': mineral.name
             },
             'summary': {
-                'total_purchases': purchases.count(),
-                'total_weights': weights.count(),
-                'purchase_amount': sum(p.mineral_amount for p in purchases),
-                'weight_amount': sum(w.mineral_net_weight for w in weights),
-                'calculated_balance': sum(p.mineral_amount for p in purchases) - sum(w.mineral_net_weight for w in weights)
+                'total_purchases': purchase_totals['count'],
+                'total_weights': weight_totals['count'],
+                'purchase_amount': purchase_amount,
+                'weight_amount': weight_amount,
+                'calculated_balance': purchase_amount - weight_amount
             },
             'recent_purchases': [
                 {
-                    'id': p.id,
-                    'amount': p.mineral_amount,
-                    'date': p.create_at,
-                    'area': p.area
+                    'id': p['id'],
+                    'amount': p['mineral_amount'],
+                    'date': p['create_at'],
+                    'area': p['area']
                 }
-                for p in purchases[:5]
+                for p in purchases.order_by('-create_at', '-id').values('id', 'mineral_amount', 'create_at', 'area')[:5]
             ],
             'recent_weights': [
                 {
-                    'id': w.id,
-                    'amount': w.mineral_net_weight,
-                    'date': w.create_at,
-                    'type': w.transfor_type
+                    'id': w['id'],
+                    'amount': w['mineral_net_weight'],
+                    'date': w['create_at'],
+                    'bill_number': w['bill_number']
                 }
-                for w in weights[:5]
+                for w in weights.order_by('-create_at', '-id').values('id', 'mineral_net_weight', 'create_at', 'bill_number')[:5]
             ]
         })
         
@@ -2029,18 +2277,19 @@ def fix_duplicate_balances(request):
                     
                     # Keep the first one
                     first_balance = balances.first()
-                    
-                    # Update first balance with total
-                    first_balance.remaining_mineral_amount = total_remaining
-                    first_balance.save()
+                    kept = Balance.objects.filter(id=first_balance.id)
                     
                     # Soft delete other balances
-                    other_balances = balances.exclude(id=first_balance.id)
-                    other_balances.update(deleted_at=timezone.now())
+                    merged_count = balances.exclude(id=first_balance.id).update(deleted_at=timezone.now())
+                    
+                    # Update first balance with total; the pair's journal already
+                    # holds every duplicate's movements, so only the snapshot moves
+                    kept.update(remaining_mineral_amount=total_remaining, update_at=timezone.now().date())
+                    balance_journal.reset_snapshots(kept)
                     
-                    fixed_count += other_balances.count()
+                    fixed_count += merged_count
                     
-                    print(f"Fixed {other_balances.count()} duplicate balances for company {company_id}, mineral {mineral_id}")
+                    print(f"Fixed {merged_count} duplicate balances for company {company_id}, mineral {mineral_id}")
         
         return Response({
             'status': 'success',
@@ -214,274 +214,63 @@ const MineralReport = () => {
     }
   }, [getAxiosConfig]);
 
-  // ** Function to calculate total net weight per mineral - FIXED with better filtering
-  const calculateTotalNetWeightPerMineral = useCallback(
-    async (mineralId, mineralName) => {
-      try {
-        const config = getAxiosConfig();
-        let allWeights = [];
-        let nextUrl = `${API_URL}/weights/?mineral=${mineralId}`;
-        let totalNetWeight = 0;
-        let totalSecondWeight = 0;
-        let weightCount = 0;
-
-        console.log(
-          `🔍 FETCHING WEIGHTS for Mineral ID: ${mineralId} (${mineralName}) from: ${nextUrl}`,
-        );
-
-        // Handle pagination to get all weights
-        while (nextUrl) {
-          const response = await axios.get(nextUrl, config);
-
-          if (response.status === 200) {
-            const data = response.data;
-            const weights = data.results || data;
-            const validWeights = Array.isArray(weights) ? weights : [weights];
-
-            // Filter to ensure we only get weights for this mineral ID
-            const filteredWeights = validWeights.filter((w) => {
-              const wMineralId = w.mineral ? parseInt(w.mineral) : null;
-              return wMineralId === parseInt(mineralId);
-            });
-
-            console.log(
-              `  Found ${filteredWeights.length} weights for mineral ${mineralId} (out of ${validWeights.length} total)`,
-            );
-
-            // Calculate net weight for this page
-            filteredWeights.forEach((weight) => {
-              const netWeight = parseFloat(weight.mineral_net_weight) || 0;
-              const secondWeight = parseFloat(weight.second_weight) || 0;
-
-              // Add to totals
-              totalNetWeight += netWeight;
-              totalSecondWeight += secondWeight;
-              weightCount += 1;
-
-              // Store weight data
-              allWeights.push({
-                id: weight.id,
-                vehicle: weight.vehicle,
-                vehicle_name: weight.vehicle_name,
-                scale: weight.scale,
-                scale_name: weight.scale_name,
-                mineral_net_weight: netWeight,
-                second_weight: secondWeight,
-                create_at: weight.create_at,
-                purchase: weight.purchase,
-                total_weight: netWeight + secondWeight,
-                mineral_id: weight.mineral,
-              });
-            });
-
-            // Check for next page
-            nextUrl = data.next || null;
-          } else {
-            break;
-          }
-        }
-
-        // Calculate average net weight
-        const avgNetWeight = weightCount > 0 ? totalNetWeight / weightCount : 0;
-
-        // Get unique vehicles and scales
-        const vehicles = [...new Set(allWeights.map((w) => w.vehicle))].filter(
-          (id) => id,
-        );
-        const scales = [...new Set(allWeights.map((w) => w.scale))].filter(
-          (id) => id,
-        );
-
-        // Get latest date
-        const latestDate =
-          allWeights.length > 0
-            ? allWeights.reduce((latest, w) => {
-                if (!latest || new Date(w.create_at) > new Date(latest)) {
-                  return w.create_at;
-                }
-                return latest;
-              }, null)
-            : null;
-
-        console.log(
-          `✅ WEIGHTS for ${mineralName}: ${weightCount} records, total: ${totalNetWeight}`,
-        );
-
-        if (weightCount > 0) {
-          showSuccess(
-            `Loaded ${weightCount} weight records for ${
-              mineralName || `Mineral ${mineralId}`
-            }`,
-          );
-        }
-
-        return {
-          count: weightCount,
-          totalNetWeight: totalNetWeight,
-          totalSecondWeight: totalSecondWeight,
-          totalCombinedWeight: totalNetWeight + totalSecondWeight,
-          avgNetWeight: avgNetWeight,
-          vehicles: vehicles,
-          scales: scales,
-          latestDate: latestDate,
-          weights: allWeights,
-        };
-      } catch (error) {
-        showError(
-          `Failed to fetch weight data for ${
-            mineralName || `Mineral ${mineralId}`
-          }: ${error.message}`,
-        );
-        console.error(
-          `Error calculating net weight for mineral ${mineralId}:`,
-          error.message,
-        );
-        return {
-          count: 0,
-          totalNetWeight: 0,
-          totalSecondWeight: 0,
-          totalCombinedWeight: 0,
-          avgNetWeight: 0,
-          vehicles: [],
-          scales: [],
-          latestDate: null,
-          weights: [],
-        };
-      }
-    },
-    [getAxiosConfig],
-  );
-
-  // ** Fetch Purchase Statistics for each mineral - FIXED with better filtering
-  const fetchPurchaseStats = useCallback(
-    async (mineralId, mineralName) => {
-      try {
-        const config = getAxiosConfig();
-        let allPurchases = [];
-        let nextUrl = `${API_URL}/purchases/?mineral=${mineralId}`;
-        let totalAmount = 0;
-        let totalValue = 0;
-        let purchaseCount = 0;
-
-        console.log(
-          `🔍 FETCHING PURCHASES for Mineral ID: ${mineralId} (${mineralName}) from: ${nextUrl}`,
-        );
-
-        // Handle pagination
-        while (nextUrl) {
-          const response = await axios.get(nextUrl, config);
-
-          if (response.status === 200) {
-            const data = response.data;
-            const purchases = data.results || data;
-            const validPurchases = Array.isArray(purchases)
-              ? purchases
-              : [purchases];
-
-            // Filter to ensure we only get purchases for this mineral ID
-            const filteredPurchases = validPurchases.filter((p) => {
-              const pMineralId = p.mineral ? parseInt(p.mineral) : null;
-              return pMineralId === parseInt(mineralId);
-            });
-
-            console.log(
-              `  Found ${filteredPurchases.length} purchases for mineral ${mineralId} (out of ${validPurchases.length} total)`,
-            );
-
-            // Calculate totals for this page
-            filteredPurchases.forEach((purchase) => {
-              const amount = parseFloat(purchase.mineral_amount) || 0;
-              const unitPrice = parseFloat(purchase.unit_price) || 0;
-              const totalPrice = parseFloat(purchase.mineral_total_price) || 0;
-
-              totalAmount += amount;
-              totalValue += totalPrice;
-              purchaseCount += 1;
-
-              allPurchases.push({
-                id: purchase.id,
-                company: purchase.company,
-                company_name: purchase.company_name,
-                mineral_amount: amount,
-                unit_price: unitPrice,
-                mineral_total_price: totalPrice,
-                create_at: purchase.create_at,
-                maktoob: purchase.maktoob,
-                calculated_total: amount * unitPrice,
-                mineral_id: purchase.mineral,
-              });
-            });
-
-            // Check for next page
-            nextUrl = data.next || null;
-          } else {
-            break;
-          }
-        }
-
-        // Calculate average unit price
-        const avgUnitPrice =
-          purchaseCount > 0
-            ? allPurchases.reduce((sum, p) => sum + p.unit_price, 0) /
-              purchaseCount
-            : 0;
-
-        console.log(
-          `✅ PURCHASES for ${mineralName}: ${purchaseCount} records, total amount: ${totalAmount}`,
-        );
-
-        if (purchaseCount > 0) {
-          showSuccess(
-            `Loaded ${purchaseCount} purchase records for ${
-              mineralName || `Mineral ${mineralId}`
-            }`,
-          );
-        }
+  // ** Map one row of /minerals/totals/ onto the per-mineral stats shape used by the table
+  const buildMineralStats = (mineral, totals) => {
+    const purchaseStats = {
+      count: totals?.purchase_count || 0,
+      totalAmount: totals?.purchased_amount || 0,
+      totalValue: parseFloat(totals?.purchased_total_price) || 0,
+      avgUnitPrice: parseFloat(totals?.avg_unit_price) || 0,
+      companyCount: totals?.company_count || 0,
+      latestDate: totals?.latest_purchase_date || null,
+      purchases: [],
+    };
+    const weightCount = totals?.weight_count || 0;
+    const totalNetWeight = totals?.weighed_net_weight || 0;
+    const totalSecondWeight = totals?.weighed_second_weight || 0;
+    const weightStats = {
+      count: weightCount,
+      totalNetWeight: totalNetWeight,
+      totalSecondWeight: totalSecondWeight,
+      totalCombinedWeight: totalNetWeight + totalSecondWeight,
+      avgNetWeight: weightCount > 0 ? totalNetWeight / weightCount : 0,
+      vehicleCount: totals?.vehicle_count || 0,
+      scaleCount: totals?.scale_count || 0,
+      latestDate: totals?.latest_weight_date || null,
+      weights: [],
+    };
+    const balanceStats = {
+      count: totals?.balance_count || 0,
+      totalRemaining: totals?.remaining_balance || 0,
+      avgRemaining: totals?.balance_count
+        ? totals.remaining_balance / totals.balance_count
+        : 0,
+      positiveBalances: totals?.positive_balances || 0,
+      zeroBalances: totals?.zero_balances || 0,
+      negativeBalances: totals?.negative_balances || 0,
+      balances: [],
+    };
 
-        const stats = {
-          count: purchaseCount,
-          totalAmount: totalAmount,
-          totalValue: totalValue,
-          avgUnitPrice: avgUnitPrice,
-          companies: [...new Set(allPurchases.map((p) => p.company))].filter(
-            (id) => id,
-          ),
-          latestDate:
-            purchaseCount > 0
-              ? allPurchases.reduce((latest, p) => {
-                  if (!latest || new Date(p.create_at) > new Date(latest)) {
-                    return p.create_at;
-                  }
-                  return latest;
-                }, null)
-              : null,
-          purchases: allPurchases,
-        };
+    let status = "inactive";
+    if (purchaseStats.count > 0 && weightStats.count > 0) {
+      status = "active";
+    } else if (purchaseStats.count > 0) {
+      status = "pending";
+    }
 
-        return stats;
-      } catch (error) {
-        showError(
-          `Failed to fetch purchase data for ${
-            mineralName || `Mineral ${mineralId}`
-          }: ${error.message}`,
-        );
-        console.error(
-          `Error fetching purchase stats for mineral ${mineralId}:`,
-          error.message,
-        );
-        return {
-          count: 0,
-          totalAmount: 0,
-          totalValue: 0,
-          avgUnitPrice: 0,
-          companies: [],
-          latestDate: null,
-          purchases: [],
-        };
-      }
-    },
-    [getAxiosConfig],
-  );
+    return {
+      ...mineral,
+      purchase_stats: purchaseStats,
+      weight_stats: weightStats,
+      balance_stats: balanceStats,
+      overall_status: status,
+      total_companies: purchaseStats.companyCount,
+      total_vehicles: weightStats.vehicleCount,
+      total_scales: weightStats.scaleCount,
+      total_net_weight: weightStats.totalNetWeight,
+      total_mineral_amount: purchaseStats.totalAmount,
+    };
+  };
 
   // ** Main function to fetch mineral data with all related statistics
   const fetchMineralData = useCallback(async () => {
@@ -510,106 +299,18 @@ const MineralReport = () => {
             .join(", ")}`,
         );
 
-        // Fetch additional statistics for EACH mineral separately
-        const enrichedMinerals = await Promise.all(
-          minerals.map(async (mineral) => {
-            try {
-              console.log(
-                `\n--- PROCESSING MINERAL ${mineral.id} - ${mineral.name} ---`,
-              );
-
-              // Pass both mineral ID and name to each function
-              const [purchaseStats, weightStats, balanceStats] =
-                await Promise.all([
-                  fetchPurchaseStats(mineral.id, mineral.name),
-                  calculateTotalNetWeightPerMineral(mineral.id, mineral.name),
-                ]);
-
-              // Calculate overall status for this specific mineral only
-              let status = "inactive";
-              if (purchaseStats.count > 0 && weightStats.count > 0) {
-                status = "active";
-              } else if (purchaseStats.count > 0) {
-                status = "pending";
-              }
-
-              // Log the mineral data with its ID to verify per-mineral calculation
-              console.log(
-                `\n📊 FINAL STATS FOR ${mineral.name.toUpperCase()} (ID: ${
-                  mineral.id
-                }):`,
-              );
-              console.log(
-                `  - Purchase Amount: ${purchaseStats.totalAmount} (${purchaseStats.count} purchases)`,
-              );
-              console.log(
-                `  - Net Weight: ${weightStats.totalNetWeight} (${weightStats.count} weights)`,
-              );
-              console.log(`  - Status: ${status}`);
-              console.log(`  - Companies: ${purchaseStats.companies.length}`);
-              console.log(`  - Vehicles: ${weightStats.vehicles.length}`);
-
-              return {
-                ...mineral,
-                purchase_stats: purchaseStats,
-                weight_stats: weightStats,
-                balance_stats: balanceStats,
-                overall_status: status,
-                total_companies: purchaseStats.companies.length,
-                total_vehicles: weightStats.vehicles.length,
-                total_scales: weightStats.scales.length,
-                total_net_weight: weightStats.totalNetWeight,
-                total_mineral_amount: purchaseStats.totalAmount,
-              };
-            } catch (error) {
-              showError(
-                `Error processing mineral ${mineral.id} - ${mineral.name}: ${error.message}`,
-              );
-              console.error(
-                `Error enriching mineral ${mineral.id} (${mineral.name}):`,
-                error,
-              );
-              return {
-                ...mineral,
-                purchase_stats: {
-                  count: 0,
-                  totalAmount: 0,
-                  totalValue: 0,
-                  avgUnitPrice: 0,
-                  companies: [],
-                  latestDate: null,
-                  purchases: [],
-                },
-                weight_stats: {
-                  count: 0,
-                  totalNetWeight: 0,
-                  totalSecondWeight: 0,
-                  totalCombinedWeight: 0,
-                  avgNetWeight: 0,
-                  vehicles: [],
-                  scales: [],
-                  latestDate: null,
-                  weights: [],
-                },
-                balance_stats: {
-                  count: 0,
-                  totalRemaining: 0,
-                  avgRemaining: 0,
-                  companies: [],
-                  positiveBalances: 0,
-                  zeroBalances: 0,
-                  negativeBalances: 0,
-                  balances: [],
-                },
-                overall_status: "inactive",
-                total_companies: 0,
-                total_vehicles: 0,
-                total_scales: 0,
-                total_net_weight: 0,
-                total_mineral_amount: 0,
-              };
-            }
-          }),
+        // Purchase, weight and balance totals for every mineral in one request
+        const totalsResponse = await axios.get(
+          `${API_URL}/minerals/totals/`,
+          config,
+        );
+        const totalsById = {};
+        (totalsResponse.data?.minerals || []).forEach((row) => {
+          totalsById[row.mineral_id] = row;
+        });
+
+        const enrichedMinerals = minerals.map((mineral) =>
+          buildMineralStats(mineral, totalsById[mineral.id]),
         );
 
         console.log("\n========== FINAL MINERAL DATA ==========");
@@ -689,7 +390,7 @@ const MineralReport = () => {
     } finally {
       setLoading(false);
     }
-  }, [getAxiosConfig, fetchPurchaseStats, calculateTotalNetWeightPerMineral]);
+  }, [getAxiosConfig]);
 
   // ** Calculate overall statistics - aggregates all minerals for summary cards only
   const calculateOverallStats = (minerals) => {
@@ -857,7 +558,7 @@ const MineralReport = () => {
       item.weight_stats?.avgNetWeight || 0,
       item.balance_stats?.totalRemaining || 0,
       item.total_companies || 0,
-      item.weight_stats?.vehicles?.length || 0,
+      item.total_vehicles || 0,
       item.create_at || "",
     ]);
 
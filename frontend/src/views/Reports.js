@@ -160,52 +160,18 @@ const WeightTable = () => {
     return types;
   }, []);
 
-  // ** Fetch all existing bill numbers for validation
-  const fetchAllBillNumbers = useCallback(async () => {
-    try {
+  // ** Check a bill number against the active weights on the server
+  const billNumberExists = useCallback(
+    async (billNumber) => {
       const config = getAxiosConfig();
-      let allWeights = [];
-      let nextUrl = `${API_URL}/weights/`;
-
-      while (nextUrl) {
-        try {
-          const response = await axios.get(nextUrl, config);
-
-          let data = [];
-          if (response.data && response.data.results) {
-            data = response.data.results;
-            nextUrl = response.data.next;
-          } else if (Array.isArray(response.data)) {
-            data = response.data;
-            nextUrl = null;
-          } else {
-            data = [];
-            nextUrl = null;
-          }
-
-          allWeights = [...allWeights, ...data];
-
-          if (!response.data.next) {
-            break;
-          }
-        } catch (error) {
-          console.error("Error fetching weights page:", error);
-          break;
-        }
-      }
-
-      // Extract all bill numbers
-      const billNumbers = allWeights
-        .filter((w) => w.bill_number)
-        .map((w) => w.bill_number.toString());
-
-      setExistingBillNumbers(billNumbers);
-      return billNumbers;
-    } catch (error) {
-      console.error("Error fetching bill numbers:", error);
-      return [];
-    }
-  }, [getAxiosConfig]);
+      const response = await axios.get(`${API_URL}/weights/bill-number-exists/`, {
+        ...config,
+        params: { bill_number: billNumber },
+      });
+      return Boolean(response.data && response.data.exists);
+    },
+    [getAxiosConfig],
+  );
 
   // ** Fetch dropdown data - UPDATED to fetch all purchases
   const fetchDropdownData = useCallback(async () => {
@@ -250,7 +216,8 @@ const WeightTable = () => {
       // ** CRITICAL FIX: Fetch purchases with ALL details including company and mineral
       try {
         let allPurchases = [];
-        let nextUrl = `${API_URL}/purchases/?page_size=1000`;
+        // company, mineral and maktoob come back inlined instead of as ids
+        let nextUrl = `${API_URL}/purchases/?page_size=1000&expand=company,mineral,maktoob`;
 
         // Loop through pagination to get all purchases
         while (nextUrl) {
@@ -268,56 +235,7 @@ const WeightTable = () => {
             nextUrl = null;
           }
 
-          // Process each purchase to ensure company data is complete
-          const processedPurchases = await Promise.all(
-            purchasesData.map(async (purchase) => {
-              // If company is just an ID, fetch the full company data
-              if (purchase.company && typeof purchase.company === 'number') {
-                try {
-                  const companyRes = await axios.get(
-                    `${API_URL}/companies/${purchase.company}/`,
-                    config
-                  );
-                  purchase.company = companyRes.data;
-                } catch (error) {
-                  console.error(`Error fetching company ${purchase.company}:`, error);
-                  // Keep as ID if fetch fails
-                }
-              }
-
-              // If mineral is just an ID, fetch the full mineral data
-              if (purchase.mineral && typeof purchase.mineral === 'number') {
-                try {
-                  const mineralRes = await axios.get(
-                    `${API_URL}/minerals/${purchase.mineral}/`,
-                    config
-                  );
-                  purchase.mineral = mineralRes.data;
-                } catch (error) {
-                  console.error(`Error fetching mineral ${purchase.mineral}:`, error);
-                  // Keep as ID if fetch fails
-                }
-              }
-
-              // If maktoob is just an ID, fetch the full maktoob data
-              if (purchase.maktoob && typeof purchase.maktoob === 'number') {
-                try {
-                  const maktoobRes = await axios.get(
-                    `${API_URL}/maktoobs/${purchase.maktoob}/`,
-                    config
-                  );
-                  purchase.maktoob = maktoobRes.data;
-                } catch (error) {
-                  console.error(`Error fetching maktoob ${purchase.maktoob}:`, error);
-                  // Keep as ID if fetch fails
-                }
-              }
-
-              return purchase;
-            })
-          );
-
-          allPurchases = [...allPurchases, ...processedPurchases];
+          allPurchases = [...allPurchases, ...purchasesData];
 
           if (!purchasesRes.data.next) {
             break;
@@ -438,29 +356,20 @@ const WeightTable = () => {
       try {
         const config = getAxiosConfig();
 
-        // First, get the purchase to find the company
-        const purchaseRes = await axios.get(
-          `${API_URL}/purchases/${purchaseId}/`,
-          config,
-        );
-        const purchaseData = purchaseRes.data;
-        const companyId = purchaseData.company?.id || purchaseData.company;
-
-        if (!companyId) {
-          return {
-            isValid: false,
-            message: "No company associated with this purchase",
-            debug: { purchaseId, mineralId, companyId: null },
-          };
-        }
-
-        // Get the balance for this company and mineral
-        const balanceRes = await axios.get(
-          `${API_URL}/company-mineral-balance/${companyId}/${mineralId}/`,
+        // Purchase -> company -> balance is resolved server-side in one call
+        const checkRes = await axios.post(
+          `${API_URL}/weights/check-available/`,
+          {
+            purchase: purchaseId,
+            mineral: mineralId,
+            mineral_net_weight: netWeight || 0,
+          },
           config,
         );
+        const checkData = checkRes.data;
+        const companyId = checkData.company;
 
-        const balance = balanceRes.data.balance?.remaining_mineral_amount || 0;
+        const balance = checkData.current_balance || 0;
         setAvailableBalance(balance);
 
         // Debug info
@@ -468,7 +377,7 @@ const WeightTable = () => {
           purchaseId: purchaseId,
           mineralId: mineralId,
           purchaseCompany: companyId,
-          purchaseMineralAmount: purchaseData.mineral_amount || 0,
+          purchaseMineralAmount: checkData.purchase_mineral_amount || 0,
           balanceAvailable: balance,
           netWeight: netWeight,
         };
@@ -684,9 +593,6 @@ const WeightTable = () => {
         // Fetch dropdown data first
         await fetchDropdownData();
 
-        // Fetch all existing bill numbers for validation
-        await fetchAllBillNumbers();
-
         // Now fetch weights with current page
         await fetchWeights(currentPage + 1);
       } catch (error) {
@@ -837,7 +743,10 @@ const WeightTable = () => {
 
     try {
       // Validate bill number uniqueness
-      if (existingBillNumbers.includes(weightData.bill_number)) {
+      if (
+        existingBillNumbers.includes(weightData.bill_number) ||
+        (await billNumberExists(weightData.bill_number))
+      ) {
         toast.error(
           t("This Bill Number already exists. Please use a different number."),
         );